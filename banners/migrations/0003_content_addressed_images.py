@@ -0,0 +1,19 @@
+# Generated by Django 5.0 on 2026-10-18 03:31
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banners', '0002_banner_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='banner',
+            name='image',
+            field=models.ImageField(storage=core.storage.content_addressed_storage, upload_to='banners/'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 # banners/models.py
 
 from django.db import models
+from core.storage import content_addressed_storage
 from orders.models import Coupon  # Adjust the import according to your project
 
 class Banner(models.Model):
@@ -8,10 +9,11 @@ class Banner(models.Model):
     subtitle = models.TextField(blank=True, null=True)
     discount_text = models.CharField(max_length=50, blank=True, null=True)
     coupon = models.ForeignKey(Coupon, blank=True, null=True, on_delete=models.SET_NULL)
-    image = models.ImageField(upload_to="banners/")
+    image = models.ImageField(upload_to="banners/", storage=content_addressed_storage)
     is_active = models.BooleanField(default=True)
     order = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["order"]
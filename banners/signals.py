@@ -0,0 +1,23 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.cache import invalidate_tags
+from core.storage import track_media
+from orders.models import Coupon
+from .models import Banner
+
+track_media(Banner, 'image')
+
+
+@receiver([post_save, post_delete], sender=Banner)
+def invalidate_cached_banners(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_tags('banners')
+
+
+@receiver(post_save, sender=Coupon)
+def touch_coupon_banners(sender, instance, raw=False, **kwargs):
+    # Banners embed the coupon code; keep their validators honest.
+    if not raw:
+        Banner.objects.filter(coupon=instance).update(updated_at=timezone.now())
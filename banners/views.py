@@ -4,13 +4,26 @@ from .serializers import BannerSerializer
 from rest_framework.permissions import IsAdminUser
 from rest_framework.filters import OrderingFilter
 from django_filters.rest_framework import DjangoFilterBackend
+from core.cache import CachedResponseMixin
+from core.conditional import ConditionalGetMixin, latest_change
 
-class BannerViewSet(ModelViewSet):
+class BannerViewSet(ConditionalGetMixin, CachedResponseMixin, ModelViewSet):
     queryset = Banner.objects.all()
     serializer_class = BannerSerializer
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ['is_active', 'coupon']
     ordering_fields = ['order', 'created_at']
+    cache_namespace = 'banners'
+
+    def get_response_cache_tags(self):
+        # Banners embed their coupon.
+        return ['banners', 'coupons']
+
+    def get_validators(self):
+        # Coupon edits touch their banners, so updated_at covers coupon_code too.
+        if self.action == 'list':
+            return latest_change(Banner.objects.all())
+        return None
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
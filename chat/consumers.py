@@ -1,5 +1,4 @@
 import json
-import logging
 from urllib.parse import parse_qs
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from channels.generic.websocket import AsyncWebsocketConsumer
@@ -15,9 +14,10 @@ from asgiref.sync import sync_to_async
 from django.core.serializers.json import DjangoJSONEncoder
 from rest_framework.test import APIRequestFactory
 from rest_framework.request import Request
+from core.logs import get_logger
 
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 User = get_user_model()
 
 class ChatConsumer(AsyncWebsocketConsumer):
@@ -28,7 +28,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
             token = query_params.get('token', [None])[0]
             
             if not token:
-                logger.warning("No token provided in WebSocket connection")
+                logger.warning("chat.ws.missing_token")
                 await self.send(text_data=json.dumps({
                     'type': 'error',
                     'message': 'Authentication token is required'
@@ -40,7 +40,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
             try:
                 validated_token = await database_sync_to_async(jwt_auth.get_validated_token)(token)
             except (InvalidToken, TokenError) as e:
-                logger.warning(f"Invalid token: {str(e)}")
+                logger.warning("chat.ws.invalid_token", error=str(e))
                 await self.send(text_data=json.dumps({
                     'type': 'error',
                     'message': 'Invalid or expired token'
@@ -50,7 +50,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
             user = await database_sync_to_async(jwt_auth.get_user)(validated_token)
             if not user.is_authenticated:
-                logger.warning(f"User not authenticated for token: {token}")
+                logger.warning("chat.ws.unauthenticated")
                 await self.send(text_data=json.dumps({
                     'type': 'error',
                     'message': 'User authentication failed'
@@ -68,7 +68,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 product_id = int(product_id)
                 user_id = int(user_id)
             except (ValueError, AttributeError):
-                logger.warning(f"Invalid room name format: {room_name}")
+                logger.warning("chat.ws.invalid_room_name", room_name=room_name)
                 await self.send(text_data=json.dumps({
                     'type': 'error',
                     'message': 'Invalid room name format'
@@ -78,7 +78,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
             # Validate user access
             if user.id != user_id and not (user.is_staff or getattr(user, 'role', None) == "admin"):
-                logger.warning(f"User {user.username} not authorized for room {room_name}")
+                logger.warning("chat.ws.room_forbidden", user_id=user.id, room_name=room_name)
                 await self.send(text_data=json.dumps({
                     'type': 'error',
                     'message': 'You are not authorized to access this chat'
@@ -89,7 +89,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
             # Get or create chat room
             product = await self.get_product(product_id)
             if not product:
-                logger.warning(f"Product {product_id} not found")
+                logger.warning("chat.ws.product_not_found", product_id=product_id)
                 await self.send(text_data=json.dumps({
                     'type': 'error',
                     'message': 'Product not found'
@@ -100,7 +100,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.room = await self.get_or_create_chat_room(product_id, user_id)
 
             if not self.room:
-                logger.error(f"Failed to get or create chat room for product {product_id} and user {user.id}")
+                logger.error("chat.ws.room_unavailable", product_id=product_id, user_id=user.id)
                 await self.send(text_data=json.dumps({
                     'type': 'error',
                     'message': 'Unable to initialize chat room'
@@ -131,7 +131,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
             await self.send_message_history()
 
         except Exception as e:
-            logger.error(f"Connection error: {str(e)}", exc_info=True)
+            logger.error("chat.ws.connect_failed", exc_info=True, error=str(e))
             await self.send(text_data=json.dumps({
                 'type': 'error',
                 'message': 'An unexpected error occurred during connection'
@@ -148,7 +148,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
     async def receive(self, text_data):
         try:
             data = json.loads(text_data)
-            logger.info(f"Received message data: {data}")
+            logger.debug("chat.ws.message_received", message_type=data.get('type'))
             
             if data.get('type') == 'ping':
                 await self.send(json.dumps({'type': 'pong'}))
@@ -156,7 +156,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 
             if data.get('type') in ['chat.message', 'chat_message']:
                 if not await self.is_participant():
-                    logger.warning(f"User {self.user.username} not a participant in room {self.room.id}")
+                    logger.warning("chat.ws.not_participant", user_id=self.user.id, room_id=self.room.id)
                     await self.send(json.dumps({
                         'type': 'error',
                         'message': 'You are not a participant in this chat'
@@ -184,7 +184,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 'message': 'Invalid JSON format'
             }))
         except Exception as e:
-            logger.error(f"Message processing error: {str(e)}", exc_info=True)
+            logger.error("chat.ws.message_failed", exc_info=True, error=str(e))
             await self.close(code=4000)
 
     async def chat_message(self, event):
@@ -282,7 +282,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
                     Q(is_staff=True) | Q(role='admin')
                 ).exclude(id=self.user.id).first()
                 if not admin_user:
-                    logger.error("No admin available")
+                    logger.error("chat.no_admin_available")
                     return None
 
             # Determine customer
@@ -301,7 +301,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
             )
 
         except Exception as e:
-            logger.error(f"Error creating chat room: {str(e)}", exc_info=True)
+            logger.error("chat.room_create_failed", exc_info=True, error=str(e))
             return None
 
 
@@ -353,7 +353,7 @@ class AdminChatConsumer(AsyncWebsocketConsumer):
             token = query_params.get('token', [None])[0]
             
             if not token:
-                logger.warning("No token provided in WebSocket connection")
+                logger.warning("chat.ws.missing_token")
                 await self.send(text_data=json.dumps({
                     'type': 'error',
                     'message': 'Authentication token is required'
@@ -365,7 +365,7 @@ class AdminChatConsumer(AsyncWebsocketConsumer):
             try:
                 validated_token = await database_sync_to_async(jwt_auth.get_validated_token)(token)
             except (InvalidToken, TokenError) as e:
-                logger.warning(f"Invalid token: {str(e)}")
+                logger.warning("chat.ws.invalid_token", error=str(e))
                 await self.send(text_data=json.dumps({
                     'type': 'error',
                     'message': 'Invalid or expired token'
@@ -375,7 +375,7 @@ class AdminChatConsumer(AsyncWebsocketConsumer):
 
             user = await database_sync_to_async(jwt_auth.get_user)(validated_token)
             if not user.is_authenticated:
-                logger.warning(f"User not authenticated for token: {token}")
+                logger.warning("chat.ws.unauthenticated")
                 await self.send(text_data=json.dumps({
                     'type': 'error',
                     'message': 'User authentication failed'
@@ -384,7 +384,7 @@ class AdminChatConsumer(AsyncWebsocketConsumer):
                 return
 
             if not (user.is_staff or getattr(user, 'role', None) == "admin"):
-                logger.warning(f"User {user.username} lacks admin privileges")
+                logger.warning("chat.admin_ws.forbidden", user_id=user.id)
                 await self.send(text_data=json.dumps({
                     'type': 'error',
                     'message': 'You must be an administrator to access this page'
@@ -406,7 +406,7 @@ class AdminChatConsumer(AsyncWebsocketConsumer):
             await self.send_active_chats()
 
         except Exception as e:
-            logger.error(f"Admin connection error: {str(e)}", exc_info=True)
+            logger.error("chat.admin_ws.connect_failed", exc_info=True, error=str(e))
             await self.send(text_data=json.dumps({
                 'type': 'error',
                 'message': 'An unexpected error occurred during connection'
@@ -437,7 +437,7 @@ class AdminChatConsumer(AsyncWebsocketConsumer):
 
 
         except Exception as e:
-            logger.error(f"Admin receive error: {str(e)}", exc_info=True)
+            logger.error("chat.admin_ws.receive_failed", exc_info=True, error=str(e))
             await self.close(code=4000)
 
     async def handle_chat_message(self, room_id, content):
@@ -457,7 +457,7 @@ class AdminChatConsumer(AsyncWebsocketConsumer):
             }))
             return
 
-        logger.info(f"Admin {self.user.username} sending message to room {room_id}: {content}")
+        logger.debug("chat.admin_ws.sending", admin_id=self.user.id, room_id=room_id)
         message = await self.create_message(room, content)
         group_name = await database_sync_to_async(lambda: room.websocket_group_name)()
         
@@ -538,7 +538,7 @@ class AdminChatConsumer(AsyncWebsocketConsumer):
             }))
             return
 
-        logger.info(f"Admin {self.user.username} (ID: {self.user.id}) joined room {room.id}")
+        logger.info("chat.admin_ws.joined", admin_id=self.user.id, room_id=room.id)
         group_name = await database_sync_to_async(lambda: room.websocket_group_name)()
         await self.channel_layer.group_add(group_name, self.channel_name)
 
@@ -636,7 +636,7 @@ class AdminChatConsumer(AsyncWebsocketConsumer):
         group_name = await database_sync_to_async(lambda: room.websocket_group_name)()
         await self.channel_layer.group_discard(group_name, self.channel_name)
 
-        logger.info(f"Admin {self.user.username} left room {room.id}")
+        logger.info("chat.admin_ws.left", admin_id=self.user.id, room_id=room.id)
 
         await self.send(json.dumps({
             'type': 'chat_room_left',
@@ -688,7 +688,7 @@ class AdminChatConsumer(AsyncWebsocketConsumer):
 
     @database_sync_to_async
     def create_message(self, room, content):
-        logger.info(f"Creating message for room {room.id} by admin {self.user.username}")
+        logger.debug("chat.admin_ws.message_created", admin_id=self.user.id, room_id=room.id)
         message = Message.objects.create(
             room=room,
             sender=self.user,
@@ -1,4 +1,3 @@
-import logging
 from django.utils import timezone
 from django.db.models import Q, Count
 from rest_framework import generics, permissions, status
@@ -6,8 +5,9 @@ from rest_framework.response import Response
 from .models import ChatRoom, Message
 from .serializers import ChatRoomSerializer, MessageSerializer, ChatCreateSerializer
 from rest_framework.exceptions import ValidationError 
+from core.logs import get_logger, lazy
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 class ChatRoomListView(generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -33,15 +33,15 @@ class ChatRoomListView(generics.ListCreateAPIView):
             )
         )
         
-        logger.debug(f"User {self.request.user} accessed {queryset.count()} chat rooms")
+        logger.debug("chat.rooms_listed", user_id=self.request.user.id, rooms=lazy(queryset.count))
         return queryset
 
     def perform_create(self, serializer):
         try:
             serializer.save(customer=self.request.user)
-            logger.info(f"New chat room created: {serializer.instance.id}")
+            logger.info("chat.room_created", room_id=serializer.instance.id)
         except Exception as e:
-            logger.error(f"Chat creation failed: {str(e)}", exc_info=True)
+            logger.error("chat.room_create_failed", exc_info=True, error=str(e))
             raise ValidationError(str(e))
 
 class ChatRoomDetailView(generics.RetrieveAPIView):
@@ -71,7 +71,7 @@ class MessageListView(generics.ListCreateAPIView):
         if self.request.user.is_staff or getattr(self.request.user, 'role', None) == 'admin':
             # Admins can access messages in any room
             if not ChatRoom.objects.filter(id=room_id).exists():
-                logger.warning(f"Room {room_id} not found for admin {self.request.user}")
+                logger.warning("chat.room_not_found", room_id=room_id, user_id=self.request.user.id)
                 return Message.objects.none()
         else:
             # Non-admins can only access their own rooms
@@ -79,7 +79,7 @@ class MessageListView(generics.ListCreateAPIView):
                 Q(id=room_id) & 
                 (Q(customer=self.request.user) | Q(assigned_to=self.request.user))
             ).exists():
-                logger.warning(f"Unauthorized access attempt to room {room_id} by user {self.request.user}")
+                logger.warning("chat.room_access_denied", room_id=room_id, user_id=self.request.user.id)
                 return Message.objects.none()
         
         return Message.objects.filter(
@@ -112,10 +112,10 @@ class MessageListView(generics.ListCreateAPIView):
             room.last_message = timezone.now()
             room.save()
             
-            logger.info(f"New message {message.id} created in room {room_id}")
+            logger.debug("chat.message_created", message_id=message.id, room_id=room_id)
             
         except ChatRoom.DoesNotExist:
-            logger.error(f"Chat room access denied for user {self.request.user}")
+            logger.error("chat.room_access_denied", room_id=room_id, user_id=self.request.user.id)
             raise ValidationError({
                 "detail": "You don't have permission to post in this chat",
                 "code": "no_chat_permission"
@@ -147,11 +147,11 @@ class MarkMessagesReadView(generics.UpdateAPIView):
                 read_timestamp=timezone.now()
             )
             
-            logger.info(f"User {request.user} marked {updated} messages as read in room {room_id}")
+            logger.debug("chat.messages_read", user_id=request.user.id, room_id=room_id, count=updated)
             return Response(status=status.HTTP_204_NO_CONTENT)
             
         except ChatRoom.DoesNotExist:
-            logger.warning(f"Invalid room access attempt: user {request.user}, room {room_id}")
+            logger.warning("chat.room_access_denied", room_id=room_id, user_id=request.user.id)
             return Response(
                 {
                     "detail": "Chat room not found or access denied",
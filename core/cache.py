@@ -0,0 +1,128 @@
+"""
+Tag-invalidated response cache for anonymous catalog reads.
+
+Each cached response records the version of every tag it depends on (for
+example "products" or "product:42"). Writes bump those versions through
+invalidate_tags(), which makes every entry carrying an older version a miss.
+Versions are read before the response is computed, so a write that lands
+while a response is being built still invalidates it.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+RESPONSE_CACHE_TIMEOUT = getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+
+KEY_PREFIX = 'response-cache'
+
+# Namespaces reported by the cache stats endpoint.
+NAMESPACES = ('products', 'categories', 'banners', 'coupons')
+
+
+def tag_key(tag):
+    return f"{KEY_PREFIX}:tag:{tag}"
+
+
+def stats_key(namespace, outcome):
+    return f"{KEY_PREFIX}:stats:{namespace}:{outcome}"
+
+
+def response_cache_key(request, namespace):
+    params = sorted((key, sorted(values)) for key, values in request.query_params.lists())
+    raw = json.dumps([request.get_host(), request.path, params])
+    return f"{KEY_PREFIX}:{namespace}:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+
+def incr(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        if cache.add(key, 1, None):
+            return 1
+        return cache.incr(key)
+
+
+def invalidate_tags(*tags):
+    for tag in set(tags):
+        try:
+            cache.incr(tag_key(tag))
+        except ValueError:
+            # Unknown (or evicted) tag: start from a value never handed out before.
+            cache.set(tag_key(tag), time.time_ns(), None)
+
+
+def get_tag_versions(tags):
+    keys = {tag: tag_key(tag) for tag in tags}
+    versions = cache.get_many(keys.values())
+    result = {}
+    for tag, key in keys.items():
+        version = versions.get(key)
+        if version is None:
+            cache.add(key, time.time_ns(), None)
+            version = cache.get(key)
+        result[tag] = version
+    return result
+
+
+def is_cacheable(request):
+    return request.method == 'GET' and not request.user.is_authenticated
+
+
+def cached_response(request, namespace, tags, compute):
+    """
+    Serve `compute()` through the response cache. Only anonymous GETs are
+    cached; the entry is dropped as soon as any of `tags` is invalidated.
+    """
+    if not is_cacheable(request):
+        return compute()
+
+    key = response_cache_key(request, namespace)
+    entry = cache.get(key)
+    if entry is not None and get_tag_versions(entry['tags']) == entry['tags']:
+        incr(stats_key(namespace, 'hits'))
+        response = Response(entry['data'], status=entry['status'])
+        response['X-Cache'] = 'HIT'
+        return response
+
+    incr(stats_key(namespace, 'misses'))
+    versions = get_tag_versions(tags)
+    response = compute()
+    if response.status_code == 200:
+        cache.set(key, {'tags': versions, 'data': response.data, 'status': response.status_code},
+                  RESPONSE_CACHE_TIMEOUT)
+    response['X-Cache'] = 'MISS'
+    return response
+
+
+class CachedResponseMixin:
+    """
+    Cache anonymous list/retrieve responses of a viewset. Subclasses set
+    `cache_namespace` and describe what a response depends on in
+    get_response_cache_tags().
+    """
+    cache_namespace = None
+
+    def get_response_cache_tags(self):
+        return [self.cache_namespace]
+
+    def serve_cached(self, request, compute):
+        return cached_response(request, self.cache_namespace, self.get_response_cache_tags(), compute)
+
+    def list(self, request, *args, **kwargs):
+        return self.serve_cached(request, lambda: super(CachedResponseMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.serve_cached(request, lambda: super(CachedResponseMixin, self).retrieve(request, *args, **kwargs))
+
+
+def get_stats(namespaces):
+    keys = {(ns, outcome): stats_key(ns, outcome) for ns in namespaces for outcome in ('hits', 'misses')}
+    values = cache.get_many(keys.values())
+    return {
+        ns: {outcome: values.get(keys[(ns, outcome)], 0) for outcome in ('hits', 'misses')}
+        for ns in namespaces
+    }
@@ -0,0 +1,65 @@
+"""
+Conditional GET support (ETag / Last-Modified) for read-heavy endpoints.
+
+Validators come from a cheap query (an updated_at, or max(updated_at) plus a
+row count for lists), so If-None-Match and If-Modified-Since can be answered
+with 304 Not Modified before the full queryset is loaded or serialized.
+"""
+import hashlib
+import json
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(request, version):
+    """
+    Strong ETag for `version` as rendered for this request: the query string
+    and negotiated media type select different representations.
+    """
+    params = sorted((key, sorted(values)) for key, values in request.query_params.lists())
+    media_type = getattr(request, 'accepted_media_type', '')
+    raw = json.dumps([version, params, media_type], default=str)
+    return quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+
+
+class ConditionalGetMixin:
+    """
+    Add ETag/Last-Modified to list/retrieve responses of a viewset and answer
+    matching conditional requests with 304. Subclasses implement
+    get_validators(), returning `(version, last_modified)` or None when the
+    action has no validator (or the object does not exist).
+    """
+
+    def get_validators(self):
+        return None
+
+    def conditional_response(self, request, compute):
+        validators = self.get_validators() if request.method in ('GET', 'HEAD') else None
+        if validators is None:
+            return compute()
+
+        version, last_modified = validators
+        etag = make_etag(request, version)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = compute()
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(request, lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs))
+
+
+def latest_change(queryset):
+    """(max updated_at, row count) of a queryset, as a list validator."""
+    totals = queryset.order_by().aggregate(updated=Max('updated_at'), count=Count('pk'))
+    return (totals['updated'], totals['count']), totals['updated']
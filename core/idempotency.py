@@ -0,0 +1,125 @@
+"""
+Idempotency-Key support for mutating endpoints.
+
+A client that may retry a request (checkout on a flaky mobile network)
+sends an Idempotency-Key header. The first request with a key claims an
+IdempotencyKey row, runs, and stores its response there; retries with the
+same key get that response back with an Idempotent-Replayed header instead
+of running the view again. While the first request is still running,
+retries get 409, and a key reused with a different method, path or body
+gets 422. Keys are scoped to the user and kept for IDEMPOTENCY_KEY_TTL
+seconds; `manage.py purge_idempotency_keys` deletes expired ones.
+
+Server errors (5xx) and exceptions are not stored, so the client can retry
+them for real.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .logs import get_logger
+from .models import IdempotencyKey
+
+logger = get_logger(__name__)
+
+HEADER = 'Idempotency-Key'
+KEY_TTL = timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 3600))
+# A key still marked in progress after this long belongs to a request whose worker died.
+IN_PROGRESS_TIMEOUT = timedelta(seconds=getattr(settings, 'IDEMPOTENCY_IN_PROGRESS_TIMEOUT', 60))
+
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+
+def fingerprint(request):
+    raw = json.dumps([request.method, request.path, request.data], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def claim(user, key, request_fingerprint, now):
+    """Returns (row, created): a new in-progress row for this request, or the live row already holding the key."""
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(
+                    user=user, key=key, fingerprint=request_fingerprint, expires_at=now + KEY_TTL,
+                ), True
+        except IntegrityError:
+            existing = IdempotencyKey.objects.filter(user=user, key=key).first()
+            if existing is None:
+                continue
+            stale = existing.expires_at <= now or (
+                existing.status_code is None and existing.created_at <= now - IN_PROGRESS_TIMEOUT
+            )
+            if not stale:
+                return existing, False
+            IdempotencyKey.objects.filter(pk=existing.pk, created_at=existing.created_at).delete()
+    return None, False
+
+
+def idempotent_response(request, compute):
+    """Run `compute` once per Idempotency-Key, replaying its response to retries."""
+    key = request.headers.get(HEADER)
+    if not key or not request.user.is_authenticated:
+        return compute()
+    if len(key) > MAX_KEY_LENGTH:
+        return Response(
+            {"detail": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters."}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    request_fingerprint = fingerprint(request)
+    row, created = claim(request.user, key, request_fingerprint, timezone.now())
+    if not created:
+        if row is not None and row.fingerprint != request_fingerprint:
+            return Response(
+                {"detail": f"This {HEADER} was already used for a different request."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        if row is None or row.status_code is None:
+            response = Response(
+                {"detail": f"A request with this {HEADER} is still being processed."}, status=status.HTTP_409_CONFLICT
+            )
+            response['Retry-After'] = '1'
+            return response
+        logger.debug("idempotency.replayed", key=key, user_id=request.user.pk, status=row.status_code)
+        return Response(row.response_body, status=row.status_code, headers={'Idempotent-Replayed': 'true'})
+
+    try:
+        response = compute()
+    except Exception:
+        IdempotencyKey.objects.filter(pk=row.pk).delete()
+        raise
+    if response.status_code >= 500:
+        IdempotencyKey.objects.filter(pk=row.pk).delete()
+    else:
+        IdempotencyKey.objects.filter(pk=row.pk).update(
+            status_code=response.status_code, response_body=getattr(response, 'data', None),
+        )
+    return response
+
+
+def idempotent(view):
+    """Decorate a DRF view function or method with idempotent_response()."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        request = next(arg for arg in args if isinstance(arg, Request))
+        return idempotent_response(request, lambda: view(*args, **kwargs))
+    return wrapper
+
+
+def purge_expired(batch_size=1000, now=None):
+    """Delete expired keys, batch_size per statement. Returns the number deleted."""
+    now = now or timezone.now()
+    purged = 0
+    while True:
+        batch = list(IdempotencyKey.objects.filter(expires_at__lte=now).values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return purged
+        purged += IdempotencyKey.objects.filter(pk__in=batch).delete()[0]
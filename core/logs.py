@@ -0,0 +1,123 @@
+"""
+Structured, lazily evaluated logging for request and consumer hot paths.
+
+    logger = get_logger(__name__)
+    logger.info("order.total_calculated", order_id=order.order_id, total=order.total_price)
+    logger.debug("cart.listed", items=lazy(lambda: queryset.count()))
+
+An event costs one isEnabledFor() check when its level is off. DEBUG/INFO
+events are sampled at LOG_SAMPLE_RATE; warnings and errors are always kept.
+`lazy()` values are resolved only for events that are actually emitted, and
+message formatting happens on the QueueLogHandler's background thread.
+"""
+import json
+import logging
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+from django.conf import settings
+
+
+class LazyField:
+    __slots__ = ('func',)
+
+    def __init__(self, func):
+        self.func = func
+
+
+def lazy(func):
+    """A log field computed only if the event is emitted."""
+    return LazyField(func)
+
+
+class EventFields:
+    """Renders `key=value` pairs when the record is formatted, not when it is created."""
+    __slots__ = ('fields',)
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def __str__(self):
+        return ' '.join(f'{key}={json.dumps(value, default=str)}' for key, value in self.fields.items())
+
+
+class EventLogger:
+    def __init__(self, name):
+        self.logger = logging.getLogger(name)
+
+    def debug(self, event, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event, exc_info=False, **fields):
+        self._log(logging.ERROR, event, fields, exc_info=exc_info)
+
+    def exception(self, event, **fields):
+        self._log(logging.ERROR, event, fields, exc_info=True)
+
+    def _log(self, level, event, fields, exc_info=False):
+        if not self.logger.isEnabledFor(level):
+            return
+        if level < logging.WARNING:
+            rate = getattr(settings, 'LOG_SAMPLE_RATE', 1.0)
+            if rate < 1.0 and random.random() >= rate:
+                return
+        # Resolve lazy fields here: they may touch the DB connection of this thread.
+        for key, value in fields.items():
+            if isinstance(value, LazyField):
+                fields[key] = value.func()
+        if fields:
+            msg, args = '%s %s', (event, EventFields(fields))
+        else:
+            msg, args = '%s', (event,)
+        self.logger.log(
+            level, msg, *args, exc_info=exc_info, stacklevel=3,
+            extra={'event': event, 'fields': fields},
+        )
+
+
+def get_logger(name):
+    return EventLogger(name)
+
+
+class QueueLogHandler(QueueHandler):
+    """
+    Hand records to a background thread that formats and writes them, so
+    the request thread never blocks on I/O. Records are dropped, not
+    waited on, when the queue is full.
+    """
+
+    def __init__(self, maxsize=10000, stream=None):
+        super().__init__(queue.Queue(maxsize))
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self.dropped = 0
+        self.listener = QueueListener(self.queue, self.target, respect_handler_level=False)
+        self.listener.start()
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # The queue never leaves the process, so skip the eager formatting
+        # QueueHandler does to make records picklable.
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        # logging.shutdown() closes handlers at exit: flush what is queued.
+        if self.listener._thread is not None:
+            self.listener.stop()
+        super().close()
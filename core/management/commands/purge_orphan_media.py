@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.storage import purge_orphans
+
+
+class Command(BaseCommand):
+    help = "Delete content-addressed media blobs, and their renditions, that no row has used for the grace period."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        purged = purge_orphans(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Done: {purged} media blobs purged."))
@@ -0,0 +1,223 @@
+"""
+Content-addressed media storage.
+
+Uploads are stored under their upload_to directory by the SHA-256 of their
+bytes (product_images/3f/3fa9...c2.jpg) instead of by the client's file name
+plus one of Django's random suffixes. Uploading a picture that is already
+stored writes nothing and returns the existing blob, and since a name can
+never point at different bytes, media URLs may be cached as immutable.
+
+Only the file fields that opt in with storage=content_addressed_storage
+are stored this way, and each of them must be registered with track_media():
+blobs are shared, so those fields count the rows referencing them. When a
+row stops using a blob (it is deleted or its file is replaced) the blob is
+removed after the commit, unless another tracked row still references it,
+it is one of the names kept for good (placeholders), or it was uploaded
+again within MEDIA_BLOB_GRACE_PERIOD seconds: that upload's row may not be
+committed yet. Blobs kept that way are left to `manage.py purge_orphan_media`,
+which deletes every stored blob that has had no reference for longer than
+the grace period. Deleting a blob sends blob_deleted, so derived files
+(renditions) can go with it.
+"""
+import hashlib
+import os
+import posixpath
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, storages
+from django.core.files.utils import validate_file_name
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .logs import get_logger
+
+logger = get_logger(__name__)
+
+# Sent with the name of each blob collect() or purge_orphans() deletes.
+blob_deleted = Signal()
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hashed_name(name, digest):
+    """`name`'s directory, two levels of fan-out, the digest and the lower-cased extension."""
+    directory, filename = posixpath.split(name)
+    extension = posixpath.splitext(filename)[1].lower()
+    return posixpath.join(directory, digest[:2], digest + extension)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        validate_file_name(name, allow_relative_path=True)
+        name = hashed_name(name, content_hash(content))
+        if max_length is not None and len(name) > max_length:
+            raise SuspiciousFileOperation(f'Storage name "{name}" is longer than {max_length} characters.')
+        if self.exists(name):
+            # Mark the blob as just uploaded, so collect() leaves it to this upload's row.
+            os.utime(self.path(name))
+            return name
+        saved = self._save(name, content)
+        if saved != name:
+            # The same bytes were written concurrently; keep the first copy.
+            self.delete(saved)
+        return name
+
+
+def content_addressed_storage():
+    """Storage of the tracked file fields (a callable, so migrations do not pin the backend)."""
+    return storages['content_addressed']
+
+
+# (model, field name) pairs whose files are counted, see track_media().
+tracked_fields = []
+
+# Shared names, such as placeholders, that are never deleted.
+kept_names = set()
+
+
+def grace_period():
+    return timedelta(seconds=getattr(settings, 'MEDIA_BLOB_GRACE_PERIOD', 300))
+
+
+def references(name):
+    """Whether any tracked row still uses the blob `name`."""
+    return any(
+        model._base_manager.filter(**{field_name: name}).exists()
+        for model, field_name in tracked_fields
+    )
+
+
+def recently_uploaded(storage, name):
+    try:
+        return storage.get_modified_time(name) > timezone.now() - grace_period()
+    except FileNotFoundError:
+        return False
+
+
+def delete_blob(storage, name):
+    storage.delete(name)
+    logger.info("media.blob_deleted", name=name)
+    blob_deleted.send(sender=type(storage), name=name)
+
+
+def collect(names):
+    storage = content_addressed_storage()
+    for name in names:
+        if name in kept_names or references(name):
+            continue
+        if recently_uploaded(storage, name):
+            logger.info("media.blob_kept", name=name)
+            continue
+        delete_blob(storage, name)
+
+
+def stored_names(storage):
+    """Names of the blobs stored under the upload directories of the tracked fields."""
+    directories = {model._meta.get_field(field_name).upload_to.rstrip('/') for model, field_name in tracked_fields}
+    for directory in sorted(directories):
+        try:
+            fan_outs, _ = storage.listdir(directory)
+        except FileNotFoundError:
+            continue
+        for fan_out in sorted(fan_outs):
+            for filename in sorted(storage.listdir(posixpath.join(directory, fan_out))[1]):
+                yield posixpath.join(directory, fan_out, filename)
+
+
+def referenced(names):
+    """The names among `names` that a tracked row still uses."""
+    found = set()
+    for model, field_name in tracked_fields:
+        found.update(
+            model._base_manager.filter(**{f'{field_name}__in': names}).values_list(field_name, flat=True)
+        )
+    return found
+
+
+def purge_orphans(batch_size=500):
+    """
+    Delete the stored blobs no tracked row references that were last
+    uploaded more than the grace period ago, looking references up one
+    batch of names at a time. Return how many were deleted.
+    """
+    storage = content_addressed_storage()
+    deleted = 0
+    names = stored_names(storage)
+    while True:
+        batch = [name for _, name in zip(range(batch_size), names)]
+        if not batch:
+            return deleted
+        candidates = [
+            name for name in batch
+            if name not in kept_names and not recently_uploaded(storage, name)
+        ]
+        for name in set(candidates) - referenced(candidates):
+            delete_blob(storage, name)
+            deleted += 1
+
+
+def release_media(names, using=None):
+    """Delete the blobs among `names` that nothing references once the transaction commits."""
+    names = {name for name in names if name}
+    if names:
+        transaction.on_commit(lambda: collect(names), using=using)
+
+
+class MediaReferences:
+    """Signal receivers releasing the blobs one file field stops referencing."""
+
+    def __init__(self, model, field_name):
+        self.model = model
+        self.field_name = field_name
+
+    def remember_replaced(self, sender, instance, raw=False, update_fields=None, using=None, **kwargs):
+        if raw or instance._state.adding or (update_fields is not None and self.field_name not in update_fields):
+            return
+        # Only a new upload, not yet committed to storage, replaces the row's
+        # blob; saves that keep the file cost no lookup.
+        if getattr(instance, self.field_name)._committed:
+            return
+        previous = (
+            self.model._base_manager.using(using)
+            .filter(pk=instance.pk).values_list(self.field_name, flat=True).first()
+        )
+        if previous:
+            instance.__dict__.setdefault('_replaced_media', {})[self.field_name] = previous
+
+    def release_replaced(self, sender, instance, raw=False, using=None, **kwargs):
+        previous = instance.__dict__.get('_replaced_media', {}).pop(self.field_name, None)
+        if previous and previous != getattr(instance, self.field_name).name:
+            release_media([previous], using=using)
+
+    def release_deleted(self, sender, instance, using=None, **kwargs):
+        release_media([getattr(instance, self.field_name).name], using=using)
+
+
+def track_media(model, field_name, keep=()):
+    """
+    Count references to blobs from `model.field_name` and delete the blobs
+    it drops, except the names in `keep`.
+    """
+    kept_names.update(keep)
+    if (model, field_name) in tracked_fields:
+        return
+    receivers = MediaReferences(model, field_name)
+    tracked_fields.append((model, field_name))
+    uid = f'track_media:{model._meta.label}.{field_name}'
+    pre_save.connect(receivers.remember_replaced, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(receivers.release_replaced, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(receivers.release_deleted, sender=model, weak=False, dispatch_uid=uid)
@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import health_check
+from .views import health_check, cache_stats
 
 urlpatterns = [
     path("health-check/", health_check),
+    path("cache-stats/", cache_stats),
 ]
@@ -1,5 +1,17 @@
 from django.http import JsonResponse
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from .cache import NAMESPACES, get_stats
+
 
 def health_check(request):
     return JsonResponse({"status": "ok"})
 
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    """Hit/miss counters of the anonymous response cache, per namespace."""
+    return Response(get_stats(NAMESPACES))
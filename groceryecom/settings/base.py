@@ -80,8 +80,74 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Shared cache for anonymous catalog responses (see core/cache.py). Without
+# REDIS_CACHE_URL each process keeps its own local-memory cache.
+REDIS_CACHE_URL = config("REDIS_CACHE_URL", default="")
+
+if REDIS_CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
+RESPONSE_CACHE_TIMEOUT = config("RESPONSE_CACHE_TIMEOUT", default=300, cast=int)
+
+# Bulk product imports (run by `manage.py run_import_jobs`)
+PRODUCT_IMPORT_CHUNK_SIZE = config("PRODUCT_IMPORT_CHUNK_SIZE", default=500, cast=int)
+PRODUCT_IMPORT_JOB_LEASE = config("PRODUCT_IMPORT_JOB_LEASE", default=300, cast=int)
+
+# Products read per server-side cursor fetch by the streaming export (products/export/)
+PRODUCT_EXPORT_CHUNK_SIZE = config("PRODUCT_EXPORT_CHUNK_SIZE", default=500, cast=int)
+
+# Generate image renditions in a background thread after each upload; off
+# makes them inline on commit (tests, one-off scripts)
+PRODUCT_IMAGE_RENDITIONS_ASYNC = config("PRODUCT_IMAGE_RENDITIONS_ASYNC", default=True, cast=bool)
+
+# How long cart/reserve/ and checkout hold stock (`manage.py release_expired_reservations` gives it back)
+STOCK_RESERVATION_TTL = config("STOCK_RESERVATION_TTL", default=900, cast=int)
+
+# Lifetime in seconds of the signed guest cart cookie (products/guest-cart/)
+GUEST_CART_MAX_AGE = config("GUEST_CART_MAX_AGE", default=30 * 24 * 3600, cast=int)
+
+# How long responses to requests sent with an Idempotency-Key are replayed
+# (`manage.py purge_idempotency_keys` deletes expired ones)
+IDEMPOTENCY_KEY_TTL = config("IDEMPOTENCY_KEY_TTL", default=24 * 3600, cast=int)
+
 WSGI_APPLICATION = "groceryecom.wsgi.application"
 
+# Application logs go through core.logs: structured events, written by a
+# background thread. DEBUG/INFO events are kept at LOG_SAMPLE_RATE (0.0-1.0).
+LOG_LEVEL = config("LOG_LEVEL", default="INFO")
+LOG_SAMPLE_RATE = config("LOG_SAMPLE_RATE", default=1.0, cast=float)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'event': {
+            'format': '%(asctime)s %(levelname)s %(name)s %(message)s',
+        },
+    },
+    'handlers': {
+        'queue': {
+            'class': 'core.logs.QueueLogHandler',
+            'formatter': 'event',
+        },
+    },
+    'loggers': {
+        app: {'handlers': ['queue'], 'level': LOG_LEVEL, 'propagate': False}
+        for app in ('core', 'products', 'orders', 'chat', 'reviews')
+    },
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
@@ -104,6 +170,20 @@ STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Product, variant, banner and profile images are stored by content hash and
+# shared between rows (see core/storage.py); other uploads keep the default
+# storage, and renditions are named after their original instead.
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "content_addressed": {"BACKEND": "core.storage.ContentAddressedStorage"},
+    "renditions": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+# Seconds a re-uploaded image blob is kept even when no committed row uses it
+# (`manage.py purge_orphan_media` deletes it once that has passed)
+MEDIA_BLOB_GRACE_PERIOD = config("MEDIA_BLOB_GRACE_PERIOD", default=300, cast=int)
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 STRIPE_SECRET_KEY = config("STRIPE_SECRET_KEY")
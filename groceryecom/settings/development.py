@@ -26,22 +26,16 @@ DATABASES = {
 }
 
 # development.py
-LOGGING = {
-    'version': 1,
-    'disable_existing_loggers': False,
-    'handlers': {
-        'console': {
-            'class': 'logging.StreamHandler',
-        },
+LOGGING['handlers']['console'] = {
+    'class': 'logging.StreamHandler',
+}
+LOGGING['loggers'].update({
+    'channels': {
+        'handlers': ['console'],
+        'level': 'DEBUG',
     },
-    'loggers': {
-        'channels': {
-            'handlers': ['console'],
-            'level': 'DEBUG',
-        },
-        'django.channels': {
-            'handlers': ['console'],
-            'level': 'DEBUG',
-        },
+    'django.channels': {
+        'handlers': ['console'],
+        'level': 'DEBUG',
     },
-}
\ No newline at end of file
+})
@@ -11,6 +11,7 @@ from users.serializers import UserSerializer
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 from users.serializers import UserSerializer
+from products.guest_cart import merge_guest_cart
 User = get_user_model()
 
 # RegisterView for handling user registration
@@ -52,11 +53,14 @@ class LoginView(APIView):
         # ✅ Use full serializer to include `id` and all user fields
         user_data = UserSerializer(user).data
 
-        return Response({
+        response = Response({
             "refresh": str(refresh),
             "access": str(refresh.access_token),
             "user": user_data
         })
+        # Carry over what the visitor put in the cart before logging in.
+        merge_guest_cart(request, response, user)
+        return response
 
 class ChangePasswordView(APIView):
     permission_classes = [IsAuthenticated]
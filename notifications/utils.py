@@ -24,3 +24,29 @@ def create_and_push_notification(user, title, message, notification_type="genera
             "message": NotificationSerializer(notification).data
         }
     )
+
+
+def notify_users(users, title, message, notification_type="general", data=None):
+    """create_and_push_notification() for many users, with one INSERT for all of them."""
+    notifications = Notification.objects.bulk_create([
+        Notification(
+            user=user,
+            title=title,
+            message=message,
+            notification_type=notification_type,
+            data=data or {},
+            created_at=timezone.now()
+        )
+        for user in users
+    ])
+
+    channel_layer = get_channel_layer()
+    for notification in notifications:
+        async_to_sync(channel_layer.group_send)(
+            f"user_{notification.user_id}",
+            {
+                "type": "send_notification",
+                "message": NotificationSerializer(notification).data
+            }
+        )
+    return notifications
@@ -5,9 +5,9 @@ from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
 from products.models import Product, ProductVariant
 
-import logging
+from core.logs import get_logger
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 class Coupon(models.Model):
     code = models.CharField(max_length=20, unique=True)
@@ -91,25 +91,32 @@ class Order(models.Model):
         related_name='orders'
     )
     
-    def calculate_total(self, coupon=None):
+    def apply_totals(self, subtotal, coupon=None):
+        """Set discount_amount and total_price from the items' subtotal, without saving."""
         from decimal import Decimal
-        items = self.items.all()
-        subtotal = sum(
-            Decimal(str(item.price_at_purchase)) * Decimal(str(item.quantity))
-            for item in items
-        )
         shipping_cost = Decimal('0.00')
         if self.shipping_method:
             shipping_cost = Decimal(str(self.shipping_method.price))
-            logger.info(f"Applied shipping cost: {shipping_cost} for method {self.shipping_method.name}")
         self.discount_amount = Decimal('0.00')
         if coupon and coupon.is_valid():
             discount = (Decimal(str(coupon.discount_percentage)) / Decimal('100')) * subtotal
             self.discount_amount = discount.quantize(Decimal('0.01'))
-            logger.info(f"Applied discount: {self.discount_amount} from coupon {coupon.code}")
         self.total_price = (subtotal + shipping_cost - self.discount_amount).quantize(Decimal('0.01'))
+        logger.debug(
+            "order.total_calculated", order_id=self.order_id, total=self.total_price,
+            shipping=shipping_cost, discount=self.discount_amount,
+            coupon=coupon.code if coupon else None,
+        )
+
+    def calculate_total(self, coupon=None):
+        from decimal import Decimal
+        items = self.items.all()
+        subtotal = sum(
+            Decimal(str(item.price_at_purchase)) * Decimal(str(item.quantity))
+            for item in items
+        )
+        self.apply_totals(subtotal, coupon)
         self.save()
-        logger.info(f"Order {self.order_id} total calculated: {self.total_price}, shipping: {shipping_cost}, discount: {self.discount_amount}")
     
     def transition_to(self, new_status):
         if new_status not in self.VALID_TRANSITIONS.get(self.status, []):
@@ -119,10 +126,10 @@ class Order(models.Model):
         # Auto-update payment_status for COD when delivered
         if new_status == 'delivered' and self.payment_method == 'cod':
             self.payment_status = 'paid'
-            logger.info(f"Order {self.order_id} delivered with COD, payment marked as paid")
+            logger.info("order.cod_paid_on_delivery", order_id=self.order_id)
         
         self.save()
-        logger.info(f"Order {self.order_id} transitioned to {new_status}")
+        logger.info("order.status_changed", order_id=self.order_id, status=new_status)
 
     def __str__(self):
         return f"Order {self.order_id} - {self.user.username} - {self.status}"
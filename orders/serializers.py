@@ -3,11 +3,11 @@ from .models import Order, OrderItem, Coupon
 from products.serializers import ProductSerializer, ProductVariantSerializer
 from django.contrib.auth import get_user_model
 from django.utils import timezone  # NEW: Import timezone
-import logging
+from core.logs import get_logger
 from shipping.models import ShippingAddress
 from shipping.serializers import ShippingAddressSerializer, ShippingMethodSerializer
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 User = get_user_model()
 
@@ -49,7 +49,7 @@ class OrderSerializer(serializers.ModelSerializer):
 
     def validate_coupon(self, value):
         if not value:
-            logger.info("No coupon provided")
+            logger.debug("order.no_coupon")
             return None
         try:
             coupon = Coupon.objects.get(code=value, is_active=True)
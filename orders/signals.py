@@ -1,46 +1,63 @@
-from django.db.models.signals import post_save
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import Order
+from .models import Order, Coupon
+from core.cache import invalidate_tags
 from notifications.models import Notification
 from django.contrib.auth import get_user_model
-from notifications.utils import create_and_push_notification
+from notifications.utils import create_and_push_notification, notify_users
 
 User = get_user_model()
 
+def notify_order_placed(order):
+    # Notify customer
+    create_and_push_notification(
+        user=order.user,
+        title="Order Placed",
+        message=f"Your order #{order.order_id} has been placed successfully.",
+        notification_type="order"
+    )
+
+    # Notify admins
+    notify_users(
+        User.objects.filter(role='admin', is_active=True),
+        title="New Order Received",
+        message=f"Order #{order.order_id} placed by {order.user.email}.",
+        notification_type="order"
+    )
+
+
 @receiver(post_save, sender=Order)
-def order_status_notification(sender, instance, created, **kwargs):
+def order_status_notification(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    # Notifications are pushed to websockets, so they wait for the order to be committed
+    # (and are not sent at all for one that rolls back).
     if created:
-        # Notify customer
-        create_and_push_notification(
-            user=instance.user,
-            title="Order Placed",
-            message=f"Your order #{instance.order_id} has been placed successfully.",
-            notification_type="order"
-        )
-
-        # Notify admins
-        admins = User.objects.filter(role='admin', is_active=True)
-        for admin in admins:
-            create_and_push_notification(
-                user=admin,
-                title="New Order Received",
-                message=f"Order #{instance.order_id} placed by {instance.user.email}.",
-                notification_type="order"
-            )
+        transaction.on_commit(partial(notify_order_placed, instance))
 
     elif instance.status == "delivered":
-        create_and_push_notification(
+        transaction.on_commit(partial(
+            create_and_push_notification,
             user=instance.user,
             title="Order Delivered",
             message=f"Your order #{instance.order_id} has been delivered. Thank you!",
             notification_type="order"
-        )
+        ))
 
     elif instance.status == "cancelled":
-        create_and_push_notification(
+        transaction.on_commit(partial(
+            create_and_push_notification,
             user=instance.user,
             title="Order Cancelled",
             message=f"Your order #{instance.order_id} has been cancelled.",
             notification_type="cancel"
-        )
+        ))
+
 
+@receiver([post_save, post_delete], sender=Coupon)
+def invalidate_cached_coupons(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_tags('coupons')
@@ -1,3 +1,185 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import IdempotencyKey
+from notifications.models import Notification
+from orders.models import Coupon, Order, OrderItem
+from products.models import CartItem, Category, Product, ProductVariant
+from shipping.models import ShippingMethod
+from users.models import CustomUser
+
+
+class CheckoutTestCase(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Pantry")
+        self.user = CustomUser.objects.create_user(username="buyer", password="pw", email="buyer@example.com")
+        CustomUser.objects.create_superuser(username="admin", password="pw", email="admin@example.com")
+        self.shipping = ShippingMethod.objects.create(name="Standard", price=Decimal("3.00"))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_lines(self, count):
+        for i in range(count):
+            product = Product.objects.create(
+                name=f"Jar {i}", description="", category=self.category, price=Decimal("2.50"), stock=5,
+            )
+            CartItem.objects.create(user=self.user, product=product, quantity=2)
+
+    def post_checkout(self, payment_method='cod', **extra):
+        return self.client.post(reverse('checkout'), {
+            'payment_method': payment_method,
+            'shipping': {
+                'address_line_1': '1 Main St', 'city': 'Town', 'state': 'ST', 'postal_code': '1000',
+                'country': 'BD', 'phone': '123', 'shipping_method_id': self.shipping.id,
+            },
+        }, format='json', **extra)
+
+    def checkout(self):
+        response = self.post_checkout()
+        self.assertEqual(response.status_code, 201, response.data)
+        return response
+
+
+class CheckoutTests(CheckoutTestCase):
+    def test_order_is_written_once_with_its_totals(self):
+        tea = Product.objects.create(name="Tea", description="", category=self.category, has_variants=True)
+        small = ProductVariant.objects.create(product=tea, stock=4, price=Decimal("1.25"))
+        CartItem.objects.create(user=self.user, product=tea, variant=small, quantity=4)
+        self.add_lines(1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.checkout()
+        self.assertEqual(response.data['total_price'], '13.00')
+
+        order = Order.objects.get()
+        self.assertEqual(order.total_price, Decimal("13.00"))
+        self.assertEqual(
+            sorted(OrderItem.objects.values_list('quantity', 'price_at_purchase')),
+            [(2, Decimal("2.50")), (4, Decimal("1.25"))],
+        )
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(Notification.objects.filter(title="Order Placed").count(), 1)
+        self.assertEqual(Notification.objects.filter(title="New Order Received").count(), 1)
+
+    def test_query_count_does_not_grow_with_the_cart(self):
+        self.add_lines(1)
+        with CaptureQueriesContext(connection) as small:
+            self.checkout()
+        self.add_lines(10)
+        with CaptureQueriesContext(connection) as large:
+            self.checkout()
+        self.assertEqual(len(large), len(small))
+
+    def test_notifications_wait_for_the_commit(self):
+        self.add_lines(1)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.checkout()
+        self.assertFalse(Notification.objects.exists())
+        for callback in callbacks:
+            callback()
+        self.assertEqual(Notification.objects.count(), 2)
+
+
+class CardCheckoutTests(CheckoutTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_lines(1)
+        self.product = Product.objects.get()
+
+    def create_intent(self, **kwargs):
+        # Runs before the holds: the stock row is not locked during the Stripe call.
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+        return {'id': 'pi_1', 'client_secret': 'secret_1'}
+
+    @mock.patch('orders.views.stripe.PaymentIntent.cancel')
+    @mock.patch('orders.views.stripe.PaymentIntent.create')
+    def test_intent_is_created_before_the_stock_is_held(self, create, cancel):
+        create.side_effect = self.create_intent
+        response = self.post_checkout(payment_method='card')
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['client_secret'], 'secret_1')
+        self.assertEqual(Order.objects.get().payment_id, 'pi_1')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+        cancel.assert_not_called()
+
+    @mock.patch('orders.views.stripe.PaymentIntent.cancel')
+    @mock.patch('orders.views.stripe.PaymentIntent.create')
+    def test_intent_is_cancelled_when_the_stock_is_short(self, create, cancel):
+        create.side_effect = self.create_intent
+        CartItem.objects.update(quantity=6)
+        response = self.post_checkout(payment_method='card')
+
+        self.assertEqual(response.status_code, 400)
+        cancel.assert_called_once_with('pi_1')
+        self.assertFalse(Order.objects.exists())
+
+
+class IdempotencyKeyTests(CheckoutTestCase):
+    def test_retried_checkout_replays_the_first_order(self):
+        self.add_lines(2)
+        first = self.post_checkout(HTTP_IDEMPOTENCY_KEY='checkout-1')
+        retry = self.post_checkout(HTTP_IDEMPOTENCY_KEY='checkout-1')
+
+        self.assertEqual(first.status_code, 201, first.data)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(str(retry.data['order_id']), str(first.data['order_id']))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertNotIn('Idempotent-Replayed', first)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.add_lines(1)
+        self.post_checkout(HTTP_IDEMPOTENCY_KEY='checkout-1')
+        response = self.post_checkout(payment_method='stripe', HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_in_progress_is_a_conflict(self):
+        self.add_lines(1)
+        self.post_checkout(HTTP_IDEMPOTENCY_KEY='checkout-1')
+        # As if the first request were still running.
+        IdempotencyKey.objects.update(status_code=None, response_body=None)
+        self.add_lines(1)
+        response = self.post_checkout(HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_stale_in_progress_key_is_reclaimed(self):
+        self.add_lines(1)
+        self.post_checkout(HTTP_IDEMPOTENCY_KEY='checkout-1')
+        IdempotencyKey.objects.update(status_code=None, created_at=timezone.now() - timedelta(hours=1))
+        self.add_lines(1)
+        response = self.post_checkout(HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_expired_key_runs_the_request_again(self):
+        self.add_lines(1)
+        self.post_checkout(HTTP_IDEMPOTENCY_KEY='checkout-1')
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+        self.add_lines(1)
+        response = self.post_checkout(HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Order.objects.count(), 2)
 
-# Create your tests here.
+    def test_generate_coupon_is_created_once(self):
+        admin = CustomUser.objects.get(username="admin")
+        self.client.force_authenticate(admin)
+        payload = {'discount_percentage': '10', 'valid_days': 7}
+        first = self.client.post(reverse('generate-coupon'), payload, format='json', HTTP_IDEMPOTENCY_KEY='coupon-1')
+        retry = self.client.post(reverse('generate-coupon'), payload, format='json', HTTP_IDEMPOTENCY_KEY='coupon-1')
+        self.assertEqual(retry.status_code, first.status_code)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(Coupon.objects.count(), 1)
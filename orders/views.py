@@ -9,6 +9,7 @@ from django.db import transaction, models
 from rest_framework.generics import GenericAPIView
 from .models import Order, OrderItem, Coupon
 from products.models import CartItem
+from products.inventory import InsufficientStock, cart_lines, commit, hold
 from .serializers import OrderSerializer
 from notifications.models import Notification
 from django.utils import timezone
@@ -18,6 +19,8 @@ import string
 from .permissions import IsAdminOrStaff
 from django.db.models import Q
 from notifications.utils import create_and_push_notification
+from core.cache import cached_response
+from core.idempotency import idempotent
 
 
 
@@ -27,8 +30,8 @@ from shipping.models import ShippingAddress, ShippingMethod
 
 from shipping.serializers import ShippingAddressSerializer
 
-import logging
-logger = logging.getLogger(__name__)
+from core.logs import get_logger
+logger = get_logger(__name__)
 
 class OrderViewSet(viewsets.ModelViewSet):
     serializer_class = OrderSerializer
@@ -50,6 +53,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         order.calculate_total()
 
     @action(detail=True, methods=['post'], permission_classes=[IsAdminOrStaff])
+    @idempotent
     def update_status(self, request, order_id=None):
         try:
             order = self.get_object()
@@ -85,6 +89,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     @action(detail=True, methods=['post'], permission_classes=[IsAdminOrStaff], url_path='update_payment_status')
+    @idempotent
     def update_payment_status(self, request, order_id=None):
         order = self.get_object()
         new_payment_status = request.data.get('payment_status')
@@ -164,11 +169,17 @@ class CheckoutView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = OrderSerializer
 
+    @idempotent
     def create(self, request, *args, **kwargs):
-        
+        """
+        Place the order in one pass: the cart is read once with its products
+        and variants, priced in memory, and the order is written once with
+        its final totals, its items in one INSERT. Notifications go out
+        after the commit.
+        """
         user = request.user
-        cart_items = CartItem.objects.filter(user=user)
-        if not cart_items.exists():
+        cart_items = list(CartItem.objects.filter(user=user).select_related('product', 'variant'))
+        if not cart_items:
             return Response({"detail": "Cart is empty"}, status=status.HTTP_400_BAD_REQUEST)
 
         serializer = self.get_serializer(data=request.data)
@@ -176,6 +187,7 @@ class CheckoutView(generics.CreateAPIView):
 
         payment_method = serializer.validated_data['payment_method']
         coupon = serializer.validated_data.get('coupon_obj')
+        coupon = coupon if coupon and coupon.is_valid() else None
 
         # ✅ Extract shipping fields from raw data
         shipping_data = request.data.get('shipping', {})
@@ -184,73 +196,101 @@ class CheckoutView(generics.CreateAPIView):
         if missing:
             return Response({"shipping": [f"{field} is required" for field in missing]}, status=status.HTTP_400_BAD_REQUEST)
 
-        shipping_method_id = shipping_data.get('shipping_method_id')
-
-        with transaction.atomic():
-            # ✅ Create Order
-            order = Order.objects.create(
-                user=user,
-                payment_method=payment_method,
-                status='processing',
-                coupon=coupon if coupon and coupon.is_valid() else None,
-                shipping_method_id=shipping_method_id
-            )
-
-            # ✅ Create ShippingAddress
-            ShippingAddress.objects.create(
-                user=user,
+        shipping_method = ShippingMethod.objects.filter(pk=shipping_data.get('shipping_method_id')).first()
+        if shipping_method is None:
+            return Response({"shipping": ["shipping_method_id is invalid"]}, status=status.HTTP_400_BAD_REQUEST)
+
+        # order_id is assigned on instantiation, so Stripe can reference the order before it is written.
+        order = Order(
+            user=user,
+            payment_method=payment_method,
+            status='processing',
+            coupon=coupon,
+            shipping_method=shipping_method,
+        )
+        items = [
+            OrderItem(
                 order=order,
-                address_line_1=shipping_data['address_line_1'],
-                address_line_2=shipping_data.get('address_line_2', ''),
-                city=shipping_data['city'],
-                state=shipping_data['state'],
-                postal_code=shipping_data['postal_code'],
-                country=shipping_data['country'],
-                phone=shipping_data['phone']
+                product=item.product,
+                variant=item.variant,
+                quantity=item.quantity,
+                price_at_purchase=item.variant.price if item.variant else item.product.price
             )
-
-            # ✅ Create OrderItems
-            for item in cart_items:
-                OrderItem.objects.create(
-                    order=order,
-                    product=item.product,
-                    variant=item.variant,
-                    quantity=item.quantity,
-                    price_at_purchase=item.variant.price if item.variant else item.product.price
+            for item in cart_items
+        ]
+        order.apply_totals(sum(item.price_at_purchase * item.quantity for item in items), coupon=coupon)
+
+        # ✅ Stripe intent, created before any stock row is locked: the holds
+        # below keep their row locks until the commit, and a network call
+        # inside that transaction would queue every other buyer of the items.
+        intent = None
+        client_secret = None
+        if payment_method == 'card':
+            try:
+                intent = stripe.PaymentIntent.create(
+                    amount=int(order.total_price * 100),
+                    currency='usd',
+                    metadata={'order_id': order.order_id},
+                    description=f"Order #{order.order_id} for {user.username}",
                 )
+            except stripe.error.StripeError as e:
+                return Response({"detail": f"Payment error: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+            order.payment_id = intent['id']
+            order.payment_status = 'pending'
+            client_secret = intent['client_secret']
 
-            order.calculate_total(coupon=coupon if coupon and coupon.is_valid() else None)
-
-            # ✅ Stripe intent
-            client_secret = None
-            if payment_method == 'card':
+        try:
+            with transaction.atomic():
+                # Hold the cart's stock (reusing holds made through cart/reserve/);
+                # the holds are committed together with the order below.
                 try:
-                    intent = stripe.PaymentIntent.create(
-                        amount=int(order.total_price * 100),
-                        currency='usd',
-                        metadata={'order_id': order.order_id},
-                        description=f"Order #{order.order_id} for {user.username}",
-                    )
-                    order.payment_id = intent['id']
-                    order.payment_status = 'pending'
-                    order.save()
-                    client_secret = intent['client_secret']
-                except stripe.error.StripeError as e:
-                    return Response({"detail": f"Payment error: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+                    reservations = hold(user, cart_lines(cart_items))
+                except InsufficientStock as e:
+                    self.cancel_intent(intent)
+                    return Response({"detail": e.message, "items": e.items}, status=status.HTTP_400_BAD_REQUEST)
+
+                order.save()
+                ShippingAddress.objects.create(
+                    user=user,
+                    order=order,
+                    address_line_1=shipping_data['address_line_1'],
+                    address_line_2=shipping_data.get('address_line_2', ''),
+                    city=shipping_data['city'],
+                    state=shipping_data['state'],
+                    postal_code=shipping_data['postal_code'],
+                    country=shipping_data['country'],
+                    phone=shipping_data['phone']
+                )
+                OrderItem.objects.bulk_create(items)
 
-            cart_items.delete()
+                commit(reservations)
+                # CartItem has no dependents or delete signals, so this is a single DELETE.
+                CartItem.objects.filter(pk__in=[item.pk for item in cart_items]).delete()
+        except Exception:
+            self.cancel_intent(intent)
+            raise
 
+        logger.info("order.placed", order_id=order.order_id, items=len(items), total=order.total_price)
         response_data = {
             "order_id": order.order_id,
             "status": order.status,
             "total_price": str(order.total_price),
-            "shipping_method": order.shipping_method.name if order.shipping_method else None
+            "shipping_method": shipping_method.name,
         }
         if client_secret:
             response_data["client_secret"] = client_secret
 
         return Response(response_data, status=status.HTTP_201_CREATED)
 
+    def cancel_intent(self, intent):
+        """Cancel the payment intent of an order that was not placed, so it cannot be paid."""
+        if intent is None:
+            return
+        try:
+            stripe.PaymentIntent.cancel(intent['id'])
+        except stripe.error.StripeError:
+            logger.exception("payment.intent_cancel_failed", payment_id=intent['id'])
+
 
 
 
@@ -282,9 +322,8 @@ class OrderPreviewView(GenericAPIView):
             try:
                 shipping_method = ShippingMethod.objects.get(id=shipping_method_id)
                 shipping_cost = Decimal(str(shipping_method.price))
-                logger.info(f"Preview: Shipping cost {shipping_cost} for method {shipping_method.name}")
             except ShippingMethod.DoesNotExist:
-                logger.warning(f"Preview: Invalid shipping_method_id {shipping_method_id}")
+                logger.warning("order.preview.invalid_shipping_method", shipping_method_id=shipping_method_id)
                 shipping_cost = Decimal('0.00')
 
         # Apply coupon discount
@@ -292,7 +331,6 @@ class OrderPreviewView(GenericAPIView):
         if coupon and coupon.is_valid():
             discount_amount = (Decimal(str(coupon.discount_percentage)) / Decimal('100')) * subtotal
             discount_amount = discount_amount.quantize(Decimal('0.01'))
-            logger.info(f"Preview: Discount {discount_amount} applied for coupon {coupon.code}")
 
         # Calculate total price
         total_price = (subtotal + shipping_cost - discount_amount).quantize(Decimal('0.01'))
@@ -307,11 +345,12 @@ class OrderPreviewView(GenericAPIView):
             "total_price": str(total_price),
             "coupon_valid": bool(coupon)
         }
-        logger.info(f"Preview response: {response_data}")
+        logger.debug("order.preview", user_id=request.user.id, coupon=coupon.code if coupon else None, **response_data)
         return Response(response_data, status=status.HTTP_200_OK)
 
 @api_view(['POST'])
 @permission_classes([IsAdminUser])
+@idempotent
 def generate_coupon(request):
     discount = request.data.get('discount_percentage', 10.0)
     valid_days = request.data.get('valid_days', 30)
@@ -336,6 +375,10 @@ def generate_coupon(request):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def list_active_coupons(request):
+    return cached_response(request, 'coupons', ['coupons'], active_coupons_response)
+
+
+def active_coupons_response():
     now = timezone.now()
     coupons = Coupon.objects.filter(
         is_active=True,
@@ -385,7 +428,7 @@ def stripe_webhook(request):
     event_type = event['type']
     data = event['data']['object']
 
-    print(f"Webhook Event Received: {event_type}")
+    logger.info("stripe.webhook_received", event_type=event_type)
 
     if event_type == 'payment_intent.succeeded':
         payment_intent_id = data['id']
@@ -394,9 +437,9 @@ def stripe_webhook(request):
             order.payment_status = 'paid'
             order.status = 'processing'  # Optional
             order.save()
-            print(f"Order {order.order_id} Payment Success Updated")
+            logger.info("stripe.payment_succeeded", order_id=order.order_id)
         except Order.DoesNotExist:
-            print("Order Not Found")
+            logger.warning("stripe.order_not_found", event_type=event_type, payment_intent_id=payment_intent_id)
 
     elif event_type == 'payment_intent.payment_failed':
         payment_intent_id = data['id']
@@ -404,8 +447,8 @@ def stripe_webhook(request):
             order = Order.objects.get(payment_id=payment_intent_id)
             order.payment_status = 'failed'
             order.save()
-            print(f"Order {order.order_id} Payment Failed Updated")
+            logger.info("stripe.payment_failed", order_id=order.order_id)
         except Order.DoesNotExist:
-            print("Order Not Found")
+            logger.warning("stripe.order_not_found", event_type=event_type, payment_intent_id=payment_intent_id)
 
     return Response(status=200)
\ No newline at end of file
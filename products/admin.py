@@ -19,7 +19,7 @@ class ProductVariantInline(admin.TabularInline):
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = ('name', 'category', 'price', 'stock', 'has_variants', 'status', 'sku')
-    list_filter = ('category', 'status', 'has_variants')
+    list_filter = ('category', 'status', 'has_variants', 'is_archived')
     search_fields = ('name', 'sku')
     inlines = [ProductVariantInline]  # Allows adding/editing variants within Product
     fieldsets = (
@@ -34,11 +34,15 @@ class ProductAdmin(admin.ModelAdmin):
             'fields': ('unit', 'custom_unit'),
         }),
         ('Metadata', {
-            'fields': ('created_at', 'updated_at'),
+            'fields': ('is_archived', 'archived_at', 'created_at', 'updated_at'),
             'classes': ('collapse',),
         }),
     )
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('archived_at', 'created_at', 'updated_at')
+
+    def get_queryset(self, request):
+        # Show archived products too, so they can be restored before they are purged.
+        return Product.all_objects.all()
 
     def get_form(self, request, obj=None, **kwargs):
         form = super().get_form(request, obj, **kwargs)
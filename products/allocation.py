@@ -0,0 +1,65 @@
+"""
+Slug and SKU allocation without probing.
+
+Every existing value that shares a base ("tomato", "tomato-1", ...) is read
+with one prefix query, for a single save or a whole import batch, and free
+suffixes are picked in memory instead of with one exists() per candidate.
+On PostgreSQL product ids are drawn from the table's sequence before the
+INSERT, so the id-based SKU goes out with the row instead of in a second
+write.
+"""
+from functools import reduce
+from operator import or_
+
+from django.db import connections, router
+from django.db.models import Q
+
+
+def next_free(base, taken):
+    value, counter = base, 1
+    while value in taken:
+        value = f"{base}-{counter}"
+        counter += 1
+    taken.add(value)
+    return value
+
+
+def allocate(queryset, field, bases):
+    """
+    Unused values of `field` for each of `bases`, in order: the base itself,
+    else base-1, base-2... Repeated bases within the batch get distinct values.
+    """
+    bases = list(bases)
+    if not bases:
+        return []
+    taken = set(
+        queryset.filter(reduce(or_, (
+            Q(**{field: base}) | Q(**{f'{field}__startswith': f'{base}-'}) for base in set(bases)
+        ))).values_list(field, flat=True)
+    )
+    return [next_free(base, taken) for base in bases]
+
+
+def reserve_ids(model, count, using=None):
+    """
+    Draw `count` primary keys from the table's sequence ahead of the INSERT.
+    Returns None where there is no sequence to draw from; callers then let
+    the INSERT assign the id.
+    """
+    connection = connections[using or router.db_for_write(model)]
+    if count < 1 or connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)",
+            [model._meta.db_table, model._meta.pk.column, count],
+        )
+        return sorted(row[0] for row in cursor.fetchall())
+
+
+def product_sku(category_name, pk):
+    return f"{category_name[:3].upper()}-{pk:04d}"
+
+
+def variant_sku_base(product_sku, attribute_values):
+    return f"{product_sku}-" + "".join(value[:2] for value in attribute_values).upper()
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "products"
+
+    def ready(self):
+        import products.search  # noqa: F401 - registers the search index signals
+        import products.signals  # noqa: F401 - response cache invalidation, media references
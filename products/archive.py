@@ -0,0 +1,120 @@
+"""
+Archiving (soft delete) and batched purging of products.
+
+Deleting a product through the ORM makes Django's collector load every
+related cart item, order item, variant, image, review and chat room and
+send pre/post_delete for each of them, which stalls on large selections.
+Instead, archive_products() flags the rows with one UPDATE; the default
+Product manager hides them from every catalog query at once.
+purge_archived() later deletes them in bounded batches with one DELETE (or
+SET NULL UPDATE) per related table, following the on_delete rules without
+loading rows or sending signals; the media blobs of purged products and
+their images and variants are released explicitly.
+"""
+from django.apps import apps
+from django.db import models, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from core.cache import invalidate_tags
+from core.storage import release_media
+from .models import CartItem, Product, ProductImage, ProductVariant
+
+
+def archive_products(queryset):
+    """Hide the products in `queryset` from the catalog. Returns the number archived."""
+    now = timezone.now()
+    with transaction.atomic():
+        slugs = dict(queryset.filter(is_archived=False).values_list('pk', 'slug'))
+        archived = Product.all_objects.filter(pk__in=slugs).update(
+            is_archived=True, archived_at=now, updated_at=now
+        )
+        # Archived products can no longer be bought.
+        CartItem.objects.filter(product_id__in=slugs).delete()
+    if slugs:
+        transaction.on_commit(lambda: invalidate_tags(
+            'products', 'categories',
+            *(f'product:{pk}' for pk in slugs),
+            *(f'product-slug:{slug}' for slug in slugs.values() if slug),
+        ))
+    return archived
+
+
+def join(name, path):
+    return f'{name}__{path}' if path else name
+
+
+def purge_steps(model, path=''):
+    """
+    Statements that remove the rows of `model` reached through `path` (a
+    lookup from the related model to the purged products), children first:
+    ('null', model, lookup, field) or ('delete', model, lookup, None).
+    """
+    steps = []
+    for field in model._meta.many_to_many:
+        through = field.remote_field.through
+        if through._meta.auto_created:
+            steps.append(('delete', through, join(field.m2m_field_name(), path), None))
+    for relation in model._meta.related_objects:
+        related, lookup = relation.related_model, join(relation.field.name, path)
+        if relation.many_to_many:
+            if relation.through._meta.auto_created:
+                steps.append(('delete', relation.through, join(relation.field.m2m_reverse_field_name(), path), None))
+        elif relation.on_delete is models.CASCADE:
+            steps.extend(purge_steps(related, lookup))
+            steps.append(('delete', related, lookup, None))
+        elif relation.on_delete is models.SET_NULL:
+            steps.insert(0, ('null', related, lookup, relation.field.name))
+        elif relation.on_delete is not models.DO_NOTHING:
+            raise ValueError(
+                f"Cannot purge {model.__name__}: {related.__name__}.{relation.field.name} "
+                f"is {relation.on_delete.__name__}"
+            )
+    return steps
+
+
+def purge(product_ids, steps=None):
+    """Delete products and everything that cascades from them, one statement per table."""
+    steps = steps if steps is not None else purge_steps(Product)
+    with transaction.atomic():
+        release_media([
+            name
+            for model, lookup in ((Product, 'pk'), (ProductImage, 'product'), (ProductVariant, 'product'))
+            for name in model._base_manager.filter(**{f'{lookup}__in': product_ids}).values_list('image', flat=True)
+        ])
+        for action, model, lookup, field in steps:
+            queryset = model._base_manager.filter(**{f'{lookup}__in': product_ids})
+            if action == 'null':
+                queryset.update(**{field: None})
+            else:
+                # _raw_delete is what the collector itself runs for fast deletes.
+                queryset._raw_delete(queryset.db)
+        products = Product.all_objects.filter(pk__in=product_ids)
+        return products._raw_delete(products.db)
+
+
+def purgeable_products(archived_before=None, include_ordered=False):
+    queryset = Product.all_objects.filter(is_archived=True)
+    if archived_before is not None:
+        queryset = queryset.filter(archived_at__lte=archived_before)
+    if not include_ordered:
+        # Products that were sold stay archived so order history keeps its items.
+        OrderItem = apps.get_model('orders', 'OrderItem')
+        queryset = queryset.exclude(Exists(OrderItem.objects.filter(product=OuterRef('pk'))))
+    return queryset
+
+
+def purge_archived(batch_size=200, archived_before=None, include_ordered=False):
+    """Delete archived products, batch_size per transaction. Yields the running total after each batch."""
+    steps = purge_steps(Product)
+    product_ids = purgeable_products(archived_before, include_ordered).order_by('pk').values_list('pk', flat=True)
+    purged, last_id = 0, 0
+    while True:
+        batch = list(product_ids.filter(pk__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        purged += purge(batch, steps)
+        last_id = batch[-1]
+        yield purged
+    if purged:
+        invalidate_tags('products', 'categories')
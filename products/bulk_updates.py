@@ -0,0 +1,83 @@
+"""
+Bulk variant price and stock updates.
+
+patch_variants() applies a batch of {sku, price?, stock?, stock_delta?}
+changes with one locking SELECT and one UPDATE whose new values are CASE
+expressions over the variant ids, instead of a save() (and its signals)
+per variant. Relative deltas are applied as stock = stock + delta on rows
+that are locked for the batch, so concurrent checkouts cannot interleave
+and a delta that would take stock below zero is refused for that SKU
+only. The variant products are rolled up once, when the batch commits.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, IntegerField, Value, When
+
+from core.logs import get_logger
+from .models import ProductVariant
+from .rollups import mark_dirty
+
+logger = get_logger(__name__)
+
+MAX_ITEMS = getattr(settings, 'VARIANT_BULK_PATCH_MAX_ITEMS', 1000)
+
+
+def new_values(changes, field, output_field, expression):
+    """CASE assigning `field` on the variants that change it; the rest keep their value."""
+    whens = [When(pk=pk, then=expression(change)) for pk, change in changes.items()]
+    return Case(*whens, default=F(field), output_field=output_field) if whens else None
+
+
+def patch_variants(changes):
+    """
+    Apply validated changes ({'sku', 'price'?, 'stock'?, 'stock_delta'?}, one
+    per SKU). Returns (updated count, one result per change, in order).
+    """
+    results = {}
+    with transaction.atomic():
+        variants = {
+            sku: (pk, product_id, stock, price)
+            for pk, sku, product_id, stock, price in ProductVariant.objects.select_for_update()
+            .filter(sku__in=[change['sku'] for change in changes])
+            .order_by('pk')
+            .values_list('pk', 'sku', 'product_id', 'stock', 'price')
+        }
+
+        prices, stocks = {}, {}
+        for change in changes:
+            sku = change['sku']
+            if sku not in variants:
+                results[sku] = {'sku': sku, 'status': 'not_found'}
+                continue
+            pk, product_id, stock, price = variants[sku]
+            if 'stock_delta' in change and stock + change['stock_delta'] < 0:
+                results[sku] = {'sku': sku, 'status': 'insufficient_stock', 'stock': stock}
+                continue
+            if 'price' in change:
+                prices[pk] = change
+                price = change['price']
+            if 'stock' in change or 'stock_delta' in change:
+                stocks[pk] = change
+                stock = change['stock'] if 'stock' in change else stock + change['stock_delta']
+            results[sku] = {'sku': sku, 'status': 'updated', 'stock': stock, 'price': str(price)}
+
+        assignments = {
+            'price': new_values(
+                prices, 'price', DecimalField(max_digits=10, decimal_places=2), lambda change: Value(change['price'])
+            ),
+            'stock': new_values(
+                stocks, 'stock', IntegerField(),
+                lambda change: (
+                    Value(change['stock']) if 'stock' in change else F('stock') + Value(change['stock_delta'])
+                ),
+            ),
+        }
+        assignments = {field: value for field, value in assignments.items() if value is not None}
+        updated = 0
+        if assignments:
+            changed = prices.keys() | stocks.keys()
+            updated = ProductVariant.objects.filter(pk__in=changed).update(**assignments)
+            mark_dirty({variants[result['sku']][1] for result in results.values() if result['status'] == 'updated'})
+
+    logger.info("variants.bulk_patched", requested=len(changes), updated=updated)
+    return updated, [results[change['sku']] for change in changes]
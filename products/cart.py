@@ -0,0 +1,126 @@
+"""
+Cart mutations as set-wise upserts.
+
+add_lines() adds quantities to a user's cart for any number of lines with a
+fixed number of statements: the products, variants and existing cart rows
+of the batch are read with one query each, stock is checked against the
+resulting totals in memory, existing rows are incremented by a single
+quantity = quantity + CASE ... UPDATE and missing rows are written with
+one bulk INSERT. Cart rows are unique per (user, product, variant), so a
+concurrent request (a double click) that inserted the same line first
+makes the INSERT fail; the batch is then retried once, and the second pass
+turns that line into an increment.
+
+Lines are {(product_id, variant_id): quantity}, as in products.inventory.
+"""
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+
+from core.logs import get_logger
+from .inventory import quantity_by_pk
+from .models import CartItem, Product, ProductVariant
+
+logger = get_logger(__name__)
+
+ATTEMPTS = 2
+
+
+class InvalidCartLines(ValidationError):
+    def __init__(self, items):
+        # items: [{'product_id', 'variant_id', 'error', 'available'?}]
+        self.items = items
+        super().__init__(f"{len(items)} cart line(s) cannot be added.")
+
+
+def line_filter(keys):
+    condition = Q()
+    for product_id, variant_id in keys:
+        condition |= Q(product_id=product_id, variant_id=variant_id)
+    return condition
+
+
+def check_lines(lines, existing):
+    """
+    Errors for the lines that name no sellable item or exceed its stock once
+    added, and {line: quantity that still fits} for the ones that name one.
+    """
+    products = {
+        pk: (has_variants, stock)
+        for pk, has_variants, stock in Product.objects.filter(pk__in={key[0] for key in lines})
+        .values_list('pk', 'has_variants', 'stock')
+    }
+    variants = {
+        pk: (product_id, stock)
+        for pk, product_id, stock in ProductVariant.objects.filter(pk__in={key[1] for key in lines if key[1]})
+        .values_list('pk', 'product_id', 'stock')
+    }
+
+    errors, room = [], {}
+    for (product_id, variant_id), quantity in lines.items():
+        error = {'product_id': product_id, 'variant_id': variant_id}
+        if product_id not in products:
+            errors.append({**error, 'error': "Product not found."})
+            continue
+        has_variants, stock = products[product_id]
+        if has_variants and variant_id is None:
+            errors.append({**error, 'error': "A variant must be specified for products with variants."})
+            continue
+        if not has_variants and variant_id is not None:
+            errors.append({**error, 'error': "Variants cannot be specified for products without variants."})
+            continue
+        if variant_id is not None:
+            if variants.get(variant_id, (None,))[0] != product_id:
+                errors.append({**error, 'error': "Variant not found for this product."})
+                continue
+            stock = variants[variant_id][1]
+        available = stock or 0
+        room[(product_id, variant_id)] = max(available - existing.get((product_id, variant_id), (None, 0))[1], 0)
+        if quantity > room[(product_id, variant_id)]:
+            errors.append({**error, 'error': f"Only {available} items available in stock.", 'available': available})
+    return errors, room
+
+
+def upsert(user, lines, clamp=False):
+    existing = {
+        (product_id, variant_id): (pk, quantity)
+        for pk, product_id, variant_id, quantity in CartItem.objects.filter(user=user)
+        .filter(line_filter(lines))
+        .values_list('pk', 'product_id', 'variant_id', 'quantity')
+    }
+    errors, room = check_lines(lines, existing)
+    if clamp:
+        lines = {key: min(quantity, room[key]) for key, quantity in lines.items() if room.get(key)}
+    elif errors:
+        raise InvalidCartLines(errors)
+
+    increments = {existing[key][0]: quantity for key, quantity in lines.items() if key in existing}
+    if increments:
+        CartItem.objects.filter(pk__in=increments).update(quantity=F('quantity') + quantity_by_pk(increments))
+    CartItem.objects.bulk_create([
+        CartItem(user=user, product_id=product_id, variant_id=variant_id, quantity=quantity)
+        for (product_id, variant_id), quantity in lines.items()
+        if (product_id, variant_id) not in existing
+    ])
+
+
+def add_lines(user, lines, clamp=False):
+    """
+    Add `lines` to `user`'s cart, all or nothing; raises InvalidCartLines.
+    With clamp=True, lines that cannot be added are dropped and quantities
+    are cut to the stock left instead (for carts merged without a user in
+    front of them).
+    """
+    lines = {key: quantity for key, quantity in lines.items() if quantity > 0}
+    if not lines:
+        return
+    for attempt in range(1, ATTEMPTS + 1):
+        try:
+            with transaction.atomic():
+                upsert(user, lines, clamp)
+            return
+        except IntegrityError:
+            # Another request inserted one of the lines since we looked.
+            if attempt == ATTEMPTS:
+                raise
+            logger.debug("cart.upsert_retried", user_id=user.pk, lines=len(lines))
@@ -0,0 +1,105 @@
+"""
+Streaming catalog export in the column format the bulk importer reads.
+
+Products are read with iterator(chunk_size=...) (a server-side cursor on
+PostgreSQL) and their variants and attribute values are prefetched one
+chunk at a time, so memory stays flat whatever the size of the catalog.
+CSV rows are written to the response as they are produced. An XLSX file
+is a zip archive that can only be finished once every row is in, so
+openpyxl's write-only workbook spools the rows to a temporary file, which
+is then streamed out.
+"""
+import csv
+import json
+import tempfile
+
+from django.conf import settings
+from django.db.models import Prefetch
+
+from .models import Product, ProductVariant, VariantAttributeValue
+
+CHUNK_SIZE = getattr(settings, 'PRODUCT_EXPORT_CHUNK_SIZE', 500)
+
+# Columns read by importer.parse_row().
+COLUMNS = ['name', 'category', 'description', 'price', 'stock', 'discount', 'unit', 'has_variants', 'variants']
+
+FILE_TYPES = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+def export_queryset():
+    variants = ProductVariant.objects.order_by('pk').prefetch_related(
+        Prefetch('attributes', queryset=VariantAttributeValue.objects.select_related('attribute').order_by('pk'))
+    )
+    return (
+        Product.objects.select_related('category')
+        .prefetch_related(Prefetch('variants', queryset=variants))
+        .order_by('pk')
+    )
+
+
+def variants_cell(product):
+    return json.dumps([
+        {
+            'stock': variant.stock,
+            'price': str(variant.price),
+            'attributes': [f"{value.attribute.name}:{value.value}" for value in variant.attributes.all()],
+        }
+        for variant in product.variants.all()
+    ])
+
+
+def product_rows(queryset=None, chunk_size=CHUNK_SIZE):
+    """Yield one list of COLUMNS values per product."""
+    queryset = export_queryset() if queryset is None else queryset
+    for product in queryset.iterator(chunk_size=chunk_size):
+        yield [
+            product.name,
+            product.category.name,
+            product.description,
+            # The importer derives price and stock of variant products from their variants.
+            None if product.has_variants else product.price,
+            None if product.has_variants else product.stock,
+            product.discount,
+            product.unit,
+            product.has_variants,
+            variants_cell(product) if product.has_variants else None,
+        ]
+
+
+class Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def csv_stream(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def xlsx_stream(rows):
+    from openpyxl import Workbook
+
+    with tempfile.TemporaryFile() as out:
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('products')
+        sheet.append(COLUMNS)
+        for row in rows:
+            sheet.append(row)
+        workbook.save(out)
+        out.seek(0)
+        while block := out.read(STREAM_BLOCK_SIZE):
+            yield block
+
+
+def export_stream(file_type, queryset=None, chunk_size=CHUNK_SIZE):
+    rows = product_rows(queryset, chunk_size)
+    return xlsx_stream(rows) if file_type == 'xlsx' else csv_stream(rows)
@@ -0,0 +1,124 @@
+"""
+Facet counts for the storefront filter sidebar.
+
+All counts are computed over the already-filtered product queryset in three
+grouped queries: one conditional aggregate for status/on-sale/price buckets,
+one over the category closure table (so parents include their subcategories)
+and one over variant attribute values. Cached results are keyed by the
+versions of the response-cache tags they depend on, so product and category
+writes make them misses at once.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from core.cache import get_tag_versions
+from .models import CategoryClosure, Product, VariantAttributeValue
+
+# (lower bound inclusive, upper bound exclusive); None means unbounded.
+PRICE_BUCKETS = [
+    (None, 5),
+    (5, 10),
+    (10, 20),
+    (20, 50),
+    (50, None),
+]
+
+# Query parameters that do not change which products match.
+NON_FILTER_PARAMS = {
+    'page', 'page_size', 'ordering', 'cursor', 'pagination', 'format', 'count', 'view', 'fields', 'expand',
+}
+
+# Response-cache tags whose invalidation makes cached facets stale (see core.cache).
+FACETS_CACHE_TAGS = ('products', 'categories')
+
+FACETS_CACHE_TIMEOUT = getattr(settings, 'PRODUCT_FACETS_CACHE_TIMEOUT', 300)
+
+
+def facets_cache_key(query_params, tag_versions):
+    filters = {
+        key: sorted(query_params.getlist(key))
+        for key in sorted(query_params)
+        if key not in NON_FILTER_PARAMS
+    }
+    digest = hashlib.sha1(json.dumps([filters, tag_versions], sort_keys=True).encode()).hexdigest()
+    return f"product-facets:{digest}"
+
+
+def price_bucket_filter(low, high):
+    condition = Q()
+    if low is not None:
+        condition &= Q(price__gte=low)
+    if high is not None:
+        condition &= Q(price__lt=high)
+    return condition
+
+
+def compute_facets(queryset):
+    queryset = queryset.order_by()
+    product_ids = queryset.values('pk')
+
+    aggregates = {'total': Count('pk'), 'on_sale': Count('pk', filter=Q(discount__gt=0))}
+    for value, _ in Product.STATUS_CHOICES:
+        aggregates[f'status_{value}'] = Count('pk', filter=Q(status=value))
+    for i, (low, high) in enumerate(PRICE_BUCKETS):
+        aggregates[f'price_{i}'] = Count('pk', filter=price_bucket_filter(low, high))
+    totals = queryset.aggregate(**aggregates)
+
+    categories = (
+        CategoryClosure.objects.filter(descendant__product__in=product_ids)
+        .values('ancestor_id', 'ancestor__name', 'ancestor__parent_id')
+        .annotate(count=Count('descendant__product', distinct=True))
+        .order_by('ancestor__name')
+    )
+
+    attribute_values = (
+        VariantAttributeValue.objects.filter(variants__product__in=product_ids)
+        .values('id', 'value', 'attribute_id', 'attribute__name')
+        .annotate(count=Count('variants__product', distinct=True))
+        .order_by('attribute__name', 'value')
+    )
+    attributes = {}
+    for row in attribute_values:
+        attribute = attributes.setdefault(row['attribute_id'], {
+            'id': row['attribute_id'],
+            'name': row['attribute__name'],
+            'values': [],
+        })
+        attribute['values'].append({'id': row['id'], 'value': row['value'], 'count': row['count']})
+
+    return {
+        'total': totals['total'],
+        'on_sale': totals['on_sale'],
+        'status': [
+            {'value': value, 'label': label, 'count': totals[f'status_{value}']}
+            for value, label in Product.STATUS_CHOICES
+        ],
+        'price': [
+            {'min': low, 'max': high, 'count': totals[f'price_{i}']}
+            for i, (low, high) in enumerate(PRICE_BUCKETS)
+        ],
+        'categories': [
+            {
+                'id': row['ancestor_id'],
+                'name': row['ancestor__name'],
+                'parent': row['ancestor__parent_id'],
+                'count': row['count'],
+            }
+            for row in categories
+        ],
+        'attributes': list(attributes.values()),
+    }
+
+
+def get_facets(queryset, query_params):
+    # Versions are read before computing, so a write landing meanwhile still invalidates the entry.
+    key = facets_cache_key(query_params, get_tag_versions(FACETS_CACHE_TAGS))
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(queryset)
+        cache.set(key, facets, FACETS_CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,128 @@
+"""
+Guest carts kept client-side.
+
+An anonymous visitor's cart is a list of [product_id, variant_id, quantity]
+signed and compressed with django.core.signing and handed back as the
+guest_cart cookie (and as a token in the response body, for clients that
+send it in the X-Guest-Cart header instead). Reading it back costs one
+query, which checks every line against the catalog, and nothing is written
+to the database until the visitor logs in: merge_guest_cart() then folds
+the lines into their CartItem rows with one upsert (products.cart).
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import FilteredRelation, Q
+
+from .cart import add_lines
+from .models import Product
+
+COOKIE_NAME = 'guest_cart'
+HEADER_NAME = 'HTTP_X_GUEST_CART'
+SALT = 'products.guest_cart'
+MAX_AGE = getattr(settings, 'GUEST_CART_MAX_AGE', 30 * 24 * 3600)
+# Keeps the cookie well under the 4 KB browsers accept.
+MAX_LINES = 50
+
+
+def encode(lines):
+    return signing.dumps(
+        [[product_id, variant_id, quantity] for (product_id, variant_id), quantity in lines.items()],
+        salt=SALT, compress=True,
+    )
+
+
+def decode(token):
+    """Lines from a token; an empty cart for tampered, expired or malformed ones."""
+    try:
+        payload = signing.loads(token, salt=SALT, max_age=MAX_AGE)
+        lines = {}
+        for product_id, variant_id, quantity in payload[:MAX_LINES]:
+            if isinstance(product_id, int) and isinstance(variant_id, (int, type(None))) and isinstance(quantity, int):
+                if quantity > 0:
+                    lines[(product_id, variant_id)] = quantity
+        return lines
+    except (signing.BadSignature, TypeError, ValueError):
+        return {}
+
+
+def read(request):
+    token = request.META.get(HEADER_NAME) or request.COOKIES.get(COOKIE_NAME)
+    return decode(token) if token else {}
+
+
+def write(response, lines):
+    """Store `lines` on the response; returns the token."""
+    if not lines:
+        clear(response)
+        return None
+    token = encode(lines)
+    response.set_cookie(
+        COOKIE_NAME, token, max_age=MAX_AGE, httponly=True,
+        secure=settings.SESSION_COOKIE_SECURE, samesite=settings.SESSION_COOKIE_SAMESITE,
+    )
+    return token
+
+
+def clear(response):
+    response.delete_cookie(COOKIE_NAME, samesite=settings.SESSION_COOKIE_SAMESITE)
+
+
+def catalog_rows(lines):
+    """{line: product row} for the lines naming a product and, where it has variants, one of its variants."""
+    if not lines:
+        return {}
+    fields = ['pk', 'name', 'slug', 'unit', 'price', 'stock', 'discount', 'has_variants']
+    products = Product.objects.filter(pk__in={product_id for product_id, _ in lines})
+    variant_ids = {variant_id for _, variant_id in lines if variant_id}
+    if variant_ids:
+        # LEFT JOIN the variants the cart names, so products and variants come in one query.
+        products = products.annotate(
+            line_variant=FilteredRelation('variants', condition=Q(variants__pk__in=variant_ids)),
+        )
+        fields += ['line_variant__pk', 'line_variant__price', 'line_variant__stock', 'line_variant__sku']
+    rows = {}
+    for row in products.values(*fields):
+        variant_id = row.get('line_variant__pk') if row['has_variants'] else None
+        key = (row['pk'], variant_id)
+        if key in lines:
+            rows[key] = row
+    return rows
+
+
+def validate(lines):
+    """
+    The sellable lines of a guest cart, each cut to the stock available, as
+    a list of dicts with the product summary, unit price and line total.
+    """
+    items = []
+    for key, row in catalog_rows(lines).items():
+        product_id, variant_id = key
+        if variant_id:
+            price, stock = row['line_variant__price'], row['line_variant__stock']
+        else:
+            price = Decimal('0.00') if row['discount'] == 100 else row['price']
+            stock = row['stock']
+        quantity = min(lines[key], stock or 0)
+        if quantity <= 0 or price is None:
+            continue
+        items.append({
+            'product': {'id': product_id, 'name': row['name'], 'slug': row['slug'], 'unit': row['unit']},
+            'variant': {'id': variant_id, 'sku': row['line_variant__sku']} if variant_id else None,
+            'quantity': quantity,
+            'requested': lines[key],
+            'unit_price': str(price),
+            'line_total': str(price * quantity),
+        })
+    return items
+
+
+def merge_guest_cart(request, response, user):
+    """Fold the request's guest cart into `user`'s cart and drop the cookie. Returns the lines merged."""
+    lines = read(request)
+    if not lines or getattr(user, 'role', None) != 'customer':
+        return 0
+    add_lines(user, lines, clamp=True)
+    clear(response)
+    return len(lines)
@@ -0,0 +1,390 @@
+"""
+Chunked bulk product import.
+
+Rows are streamed from the upload (csv.DictReader for CSV, openpyxl in
+read-only mode for XLSX) and imported PRODUCT_IMPORT_CHUNK_SIZE rows at a
+time, each chunk in its own transaction:
+
+- categories and variant attribute values are resolved into in-memory maps
+  with one query per kind, creating only the missing ones;
+- slugs are allocated against a single query for the chunk and SKUs are
+  derived from ids drawn from the sequence up front (products.allocation);
+- products, images, variants and variant attribute links are written with
+  bulk_create, and stock/price/default variant are rolled up with one
+  UPDATE per chunk (products.rollups).
+
+bulk_create bypasses model signals, so rollups, the search index and the
+response cache are refreshed explicitly per chunk. Rows that fail validation are reported
+with their spreadsheet row number; if a chunk fails in the database it is
+retried row by row so one bad row cannot sink its neighbours.
+
+Uploads are queued as ImportJob rows and run by the run_import_jobs worker
+(claim_import_job / run_import_job below).
+"""
+import csv
+import io
+import json
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import slugify
+
+from core.cache import invalidate_tags
+from core.logs import get_logger
+from .models import (
+    Category,
+    CategoryClosure,
+    ImportJob,
+    PLACEHOLDER_IMAGE,
+    Product,
+    ProductImage,
+    ProductVariant,
+    VariantAttribute,
+    VariantAttributeValue,
+)
+from .allocation import allocate, next_free, product_sku, reserve_ids, variant_sku_base
+from .rollups import recompute
+from .search import schedule_reindex
+
+logger = get_logger(__name__)
+
+CHUNK_SIZE = getattr(settings, 'PRODUCT_IMPORT_CHUNK_SIZE', 500)
+
+# A running job that has not committed a chunk for this long is taken over.
+JOB_LEASE = timedelta(seconds=getattr(settings, 'PRODUCT_IMPORT_JOB_LEASE', 300))
+
+# Spreadsheet row of the first data row (row 1 holds the headers).
+FIRST_ROW_NUMBER = 2
+
+
+class UnsupportedFileType(ValueError):
+    pass
+
+
+def check_file_type(name):
+    if not name.lower().endswith(('.csv', '.xlsx')):
+        raise UnsupportedFileType("Only CSV or Excel (.xlsx) files are supported")
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(file):
+    """
+    Yield (row_number, row dict) from an uploaded CSV or XLSX file without
+    loading it into memory. Headers are read eagerly so unreadable files
+    fail before anything is imported.
+    """
+    check_file_type(file.name)
+    name = file.name.lower()
+    if name.endswith('.csv'):
+        reader = csv.DictReader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+        if reader.fieldnames is None:
+            raise ValueError("The file is empty")
+        return ((number, row) for number, row in enumerate(reader, FIRST_ROW_NUMBER))
+    if name.endswith('.xlsx'):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = next(rows, None)
+        if headers is None:
+            raise ValueError("The file is empty")
+        headers = [str(header).strip() if header is not None else '' for header in headers]
+
+        def records():
+            try:
+                for number, values in enumerate(rows, FIRST_ROW_NUMBER):
+                    if any(value is not None for value in values):
+                        yield number, dict(zip(headers, values))
+            finally:
+                workbook.close()
+
+        return records()
+
+
+def chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def clean(value):
+    """Normalise a cell: None for blanks, stripped text otherwise."""
+    if value is None:
+        return None
+    if isinstance(value, float) and value != value:  # NaN
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def parse_decimal(value, field):
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        raise RowError(f"Invalid {field}: {value}")
+
+
+def parse_int(value, field):
+    try:
+        return int(Decimal(str(value)))
+    except (InvalidOperation, ValueError):
+        raise RowError(f"Invalid {field}: {value}")
+
+
+def parse_row(number, row):
+    """Validate one row into plain data; raises RowError with the reason."""
+    category = clean(row.get('category'))
+    if not category:
+        raise RowError("Category name is missing")
+    name = clean(row.get('name'))
+    if not name:
+        raise RowError("Product name is missing")
+
+    has_variants = str(row.get('has_variants')).strip().lower() == 'true'
+    price = clean(row.get('price'))
+    stock = clean(row.get('stock'))
+    discount = clean(row.get('discount'))
+    item = {
+        'row_number': number,
+        'category': category,
+        'name': name,
+        'description': clean(row.get('description')) or '',
+        'price': None if has_variants or price is None else parse_decimal(price, 'price'),
+        'stock': None if has_variants or stock is None else parse_int(stock, 'stock'),
+        'discount': parse_decimal(discount, 'discount') if discount else Decimal('0'),
+        'unit': clean(row.get('unit')) or 'PCS',
+        'has_variants': has_variants,
+        'variants': [],
+    }
+
+    variants_json = clean(row.get('variants'))
+    if has_variants and variants_json:
+        try:
+            variants = json.loads(variants_json)
+        except json.JSONDecodeError:
+            raise RowError(f"Invalid JSON format in 'variants' field (row {number})")
+        for variant in variants:
+            attributes = []
+            for attribute in variant.get('attributes', []):
+                if ':' not in attribute:
+                    raise RowError(f"Invalid variant attribute: {attribute}")
+                attr_name, attr_value = attribute.split(':', 1)
+                attributes.append((attr_name.strip(), attr_value.strip()))
+            if variant.get('stock') is None:
+                raise RowError("Variant stock is missing")
+            item['variants'].append({
+                'stock': parse_int(variant['stock'], 'variant stock'),
+                'price': parse_decimal(variant.get('price'), 'variant price'),
+                'attributes': attributes,
+            })
+    return item
+
+
+class ProductImporter:
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.created = 0
+        self.errors = []
+
+    def run(self, rows):
+        for chunk in chunked(rows, self.chunk_size):
+            self.import_chunk(chunk)
+        return self
+
+    def import_chunk(self, chunk):
+        """Import one chunk of (row_number, row) pairs; returns the number of products created."""
+        items, errors = [], []
+        for number, row in chunk:
+            try:
+                items.append(parse_row(number, row))
+            except Exception as e:
+                errors.append({"row_number": number, "error": str(e)})
+
+        created = 0
+        if items:
+            try:
+                created = self.write(items)
+            except DatabaseError:
+                for item in items:
+                    try:
+                        created += self.write([item])
+                    except DatabaseError as e:
+                        errors.append({"row_number": item['row_number'], "error": str(e)})
+
+        self.errors += sorted(errors, key=lambda error: error['row_number'])
+        self.created += created
+        return created
+
+    @transaction.atomic
+    def write(self, items):
+        categories = self.resolve_categories({item['category'] for item in items})
+        attribute_values = self.resolve_attribute_values({
+            pair for item in items for variant in item['variants'] for pair in variant['attributes']
+        })
+
+        slugs = allocate(Product.all_objects.all(), 'slug', [slugify(item['name']) for item in items])
+        products = [
+            Product(
+                name=item['name'],
+                slug=slug,
+                description=item['description'],
+                price=item['price'],
+                stock=item['stock'],
+                discount=item['discount'],
+                unit=item['unit'],
+                has_variants=item['has_variants'],
+                category=categories[item['category']],
+            )
+            for item, slug in zip(items, slugs)
+        ]
+        # Ids drawn up front let the SKUs go out with the INSERT.
+        ids = reserve_ids(Product, len(products))
+        if ids:
+            for product, pk in zip(products, ids):
+                product.pk = pk
+                product.sku = product_sku(product.category.name, pk)
+        Product.objects.bulk_create(products)
+        if not ids:
+            for product in products:
+                product.sku = product_sku(product.category.name, product.id)
+            Product.objects.bulk_update(products, ['sku'])
+
+        ProductImage.objects.bulk_create([
+            ProductImage(product=product, image=PLACEHOLDER_IMAGE, is_main=True, alt_text=product.name)
+            for product in products
+        ])
+
+        variants, variant_attributes = [], []
+        for product, item in zip(products, items):
+            skus = set()
+            for data in item['variants']:
+                values = [attribute_values[pair] for pair in data['attributes']]
+                variant = ProductVariant(
+                    product=product, stock=data['stock'], price=data['price'],
+                    # New product SKUs are unique, so only variants of the same product can collide.
+                    sku=next_free(variant_sku_base(product.sku, [value.value for value in values]), skus),
+                )
+                variants.append(variant)
+                variant_attributes.append(values)
+        ProductVariant.objects.bulk_create(variants)
+
+        Through = ProductVariant.attributes.through
+        Through.objects.bulk_create([
+            Through(productvariant_id=variant.id, variantattributevalue_id=value.id)
+            for variant, values in zip(variants, variant_attributes)
+            for value in values
+        ], ignore_conflicts=True)
+
+        recompute([product.id for product in products if product.has_variants])
+
+        product_ids = [product.id for product in products]
+        schedule_reindex(product_ids)
+        transaction.on_commit(lambda: invalidate_tags('products', 'categories'))
+        return len(products)
+
+    def resolve_categories(self, names):
+        categories = {category.name: category for category in Category.objects.filter(name__in=names)}
+        missing = [Category(name=name) for name in sorted(names - categories.keys())]
+        if missing:
+            # New categories are roots: their only closure link is to themselves.
+            Category.objects.bulk_create(missing)
+            CategoryClosure.objects.bulk_create([
+                CategoryClosure(ancestor=category, descendant=category, depth=0) for category in missing
+            ])
+            categories.update((category.name, category) for category in missing)
+        return categories
+
+    def resolve_attribute_values(self, pairs):
+        """Map (attribute name, value) to a VariantAttributeValue, creating missing ones."""
+        if not pairs:
+            return {}
+        names = {name for name, _ in pairs}
+        attributes = {}
+        for attribute in VariantAttribute.objects.filter(name__in=names).order_by('-id'):
+            attributes[attribute.name] = attribute  # lowest id wins, like get_or_create()
+        missing = [VariantAttribute(name=name) for name in sorted(names - attributes.keys())]
+        VariantAttribute.objects.bulk_create(missing)
+        attributes.update((attribute.name, attribute) for attribute in missing)
+
+        names_by_id = {attribute.id: name for name, attribute in attributes.items()}
+        values = {}
+        existing = VariantAttributeValue.objects.filter(
+            attribute_id__in=names_by_id, value__in={value for _, value in pairs}
+        ).order_by('-id')
+        for value in existing:
+            values[(names_by_id[value.attribute_id], value.value)] = value
+        missing = [
+            VariantAttributeValue(attribute=attributes[name], value=value)
+            for name, value in sorted(pairs - values.keys())
+        ]
+        VariantAttributeValue.objects.bulk_create(missing)
+        values.update(((value.attribute.name, value.value), value) for value in missing)
+        return values
+
+
+def claim_import_job():
+    """
+    Take the oldest queued job, or a running job whose worker went away,
+    and mark it running. Concurrent workers skip rows another one has locked.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        job = (
+            ImportJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(status='queued') | Q(status='running', heartbeat_at__lt=now - JOB_LEASE))
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = 'running'
+        job.started_at = job.started_at or now
+        job.heartbeat_at = now
+        job.save(update_fields=['status', 'started_at', 'heartbeat_at'])
+    return job
+
+
+def run_import_job(job, chunk_size=CHUNK_SIZE):
+    """
+    Import a claimed job from where it left off. Each chunk commits together
+    with the job's progress, so a crash never loses or repeats a chunk.
+    """
+    importer = ProductImporter(chunk_size=chunk_size)
+    try:
+        with job.file.open('rb') as file:
+            rows = islice(read_rows(file), job.rows_processed, None)
+            for chunk in chunked(rows, chunk_size):
+                with transaction.atomic():
+                    errors_before = len(importer.errors)
+                    job.products_created += importer.import_chunk(chunk)
+                    job.errors += importer.errors[errors_before:]
+                    job.rows_processed += len(chunk)
+                    job.heartbeat_at = timezone.now()
+                    job.save(update_fields=['products_created', 'errors', 'rows_processed', 'heartbeat_at'])
+                logger.debug("import_job.chunk_committed", job_id=job.id, rows_processed=job.rows_processed)
+    except Exception as e:
+        logger.error("import_job.failed", exc_info=True, job_id=job.id, error=str(e))
+        job.status = 'failed'
+        job.error_message = f"Failed to read file: {str(e)}" if isinstance(e, (ValueError, csv.Error)) else str(e)
+    else:
+        job.status = 'done'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error_message', 'finished_at'])
+    logger.info(
+        "import_job.finished", job_id=job.id, status=job.status,
+        created=job.products_created, errors=len(job.errors),
+    )
+    return job
@@ -0,0 +1,193 @@
+"""
+Stock reservations.
+
+Stock is taken with conditional UPDATEs (stock = stock - n WHERE stock >= n),
+so concurrent buyers cannot oversell, and what a cart holds during checkout
+is recorded as StockReservation rows that expire after
+STOCK_RESERVATION_TTL seconds. Checkout commits a cart's holds by deleting
+their rows; `manage.py release_expired_reservations` gives expired holds
+back in batches.
+
+Each operation touches a stock table with one statement for all the lines
+it covers (a CASE over the row ids), so a cart takes its row locks once
+instead of once per line, and a cart whose holds are already in place
+commits without touching the product rows at all. The same statement bumps
+updated_at of products without variants (their ETag validator), and their
+cached responses are invalidated on commit; variant products get both from
+their rollup.
+
+Lines are {(product_id, variant_id): quantity}, variant_id None for
+products without variants.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .models import Product, ProductVariant, StockReservation
+from .rollups import invalidate_products, mark_dirty
+
+
+class InsufficientStock(ValidationError):
+    def __init__(self, items):
+        # items: [{'product_id', 'variant_id', 'requested', 'available'}]
+        self.items = items
+        super().__init__(f"Insufficient stock for {len(items)} item(s).")
+
+
+def reservation_ttl():
+    return timedelta(seconds=getattr(settings, 'STOCK_RESERVATION_TTL', 900))
+
+
+def cart_lines(cart_items):
+    lines = defaultdict(int)
+    for item in cart_items:
+        lines[(item.product_id, item.variant_id)] += item.quantity
+    return dict(lines)
+
+
+def split_lines(lines):
+    """Per-table quantities: ({product_id: n}, {variant_id: n})."""
+    products, variants = defaultdict(int), defaultdict(int)
+    for (product_id, variant_id), quantity in lines.items():
+        if variant_id is None:
+            products[product_id] += quantity
+        else:
+            variants[variant_id] += quantity
+    return products, variants
+
+
+def quantity_by_pk(quantities):
+    return Case(
+        *(When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()),
+        output_field=IntegerField(),
+    )
+
+
+def decrement(model, quantities, **fields):
+    """
+    Take stock from every row in one statement, also setting `fields`;
+    returns the rows that were short, none taken if any was.
+    """
+    if not quantities:
+        return {}
+    with transaction.atomic():
+        amount = quantity_by_pk(quantities)
+        updated = model.objects.filter(pk__in=quantities, stock__gte=amount).update(stock=F('stock') - amount, **fields)
+        if updated == len(quantities):
+            return {}
+        transaction.set_rollback(True)
+    available = dict(model.objects.filter(pk__in=quantities).values_list('pk', 'stock'))
+    return {pk: available.get(pk, 0) for pk, quantity in quantities.items() if (available.get(pk) or 0) < quantity}
+
+
+def increment(model, quantities, **fields):
+    if quantities:
+        amount = quantity_by_pk(quantities)
+        model._base_manager.filter(pk__in=quantities).update(stock=F('stock') + amount, **fields)
+
+
+def variant_products(lines):
+    return {product_id for product_id, variant_id in lines if variant_id is not None}
+
+
+def stock_changed(product_ids):
+    """Invalidate the cached responses of products whose own stock changed, once the change commits."""
+    product_ids = set(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: invalidate_products(
+            dict(Product._base_manager.filter(pk__in=product_ids).values_list('pk', 'slug'))
+        ))
+
+
+def take_stock(lines):
+    """Take `lines` from stock, all or nothing; raises InsufficientStock."""
+    products, variants = split_lines(lines)
+    with transaction.atomic():
+        short_products = decrement(Product, products, updated_at=timezone.now())
+        short_variants = decrement(ProductVariant, variants) if not short_products else {}
+        if short_products or short_variants:
+            raise InsufficientStock([
+                {
+                    'product_id': product_id,
+                    'variant_id': variant_id,
+                    'requested': quantity,
+                    'available': short_variants[variant_id] if variant_id else short_products[product_id],
+                }
+                for (product_id, variant_id), quantity in lines.items()
+                if (variant_id in short_variants if variant_id else product_id in short_products)
+            ])
+        stock_changed(products)
+        mark_dirty(variant_products(lines))
+
+
+def give_back_stock(lines):
+    products, variants = split_lines(lines)
+    increment(Product, products, updated_at=timezone.now())
+    increment(ProductVariant, variants)
+    stock_changed(products)
+    mark_dirty(variant_products(lines))
+
+
+def hold(user, lines, ttl=None):
+    """
+    Hold `lines` for `user` until now + ttl, replacing the user's current
+    holds. Only the difference to what is already held is taken from (or
+    given back to) stock. Returns the new reservation rows.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        current = list(
+            StockReservation.objects.select_for_update()
+            .filter(user=user, expires_at__gt=now)
+            .values_list('pk', 'product_id', 'variant_id', 'quantity')
+        )
+        held = defaultdict(int)
+        for _, product_id, variant_id, quantity in current:
+            held[(product_id, variant_id)] += quantity
+
+        deltas = {key: lines.get(key, 0) - held.get(key, 0) for key in set(lines) | set(held)}
+        give_back_stock({key: -delta for key, delta in deltas.items() if delta < 0})
+        take_stock({key: delta for key, delta in deltas.items() if delta > 0})
+
+        if current:
+            StockReservation.objects.filter(pk__in=[row[0] for row in current]).delete()
+        expires_at = now + (ttl or reservation_ttl())
+        return StockReservation.objects.bulk_create([
+            StockReservation(
+                user=user, product_id=product_id, variant_id=variant_id, quantity=quantity, expires_at=expires_at,
+            )
+            for (product_id, variant_id), quantity in lines.items()
+            if quantity > 0
+        ])
+
+
+def commit(reservations):
+    """Make holds permanent: their stock is already taken, so only the rows go."""
+    StockReservation.objects.filter(pk__in=[reservation.pk for reservation in reservations]).delete()
+
+
+def release_expired(batch_size=500, now=None):
+    """Give back the stock of expired holds, batch_size rows per transaction. Returns the rows released."""
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                StockReservation.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lte=now)
+                .order_by('expires_at')
+                .values_list('pk', 'product_id', 'variant_id', 'quantity')[:batch_size]
+            )
+            if not batch:
+                return released
+            lines = defaultdict(int)
+            for _, product_id, variant_id, quantity in batch:
+                lines[(product_id, variant_id)] += quantity
+            give_back_stock(lines)
+            StockReservation.objects.filter(pk__in=[row[0] for row in batch]).delete()
+        released += len(batch)
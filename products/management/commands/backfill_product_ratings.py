@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from products.models import Product
+from reviews.models import Review
+from reviews.signals import clamp_rating
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored rating aggregates on Product from reviews, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        histogram_fields = list(Product.RATING_HISTOGRAM_FIELDS.values())
+        product_ids = Product.objects.order_by('pk').values_list('pk', flat=True)
+
+        last_id = 0
+        processed = 0
+        while True:
+            batch_ids = list(product_ids.filter(pk__gt=last_id)[:batch_size])
+            if not batch_ids:
+                break
+
+            histograms = {pk: dict.fromkeys(histogram_fields, 0) for pk in batch_ids}
+            rows = (
+                Review.objects.filter(product_id__in=batch_ids)
+                .values('product_id', 'rating')
+                .annotate(total=Count('id'))
+                .order_by()
+            )
+            for row in rows:
+                field = Product.RATING_HISTOGRAM_FIELDS[clamp_rating(row['rating'])]
+                histograms[row['product_id']][field] += row['total']
+
+            products = []
+            for pk, histogram in histograms.items():
+                product = Product(pk=pk, rating_count=sum(histogram.values()), **histogram)
+                products.append(product)
+
+            with transaction.atomic():
+                Product.objects.bulk_update(products, ['rating_count', *histogram_fields])
+                Product.objects.filter(pk__in=batch_ids).refresh_rating_avg()
+
+            processed += len(batch_ids)
+            last_id = batch_ids[-1]
+            self.stdout.write(f"Backfilled ratings for {processed} products")
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {processed} products updated."))
@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from products.archive import purge_archived
+
+
+class Command(BaseCommand):
+    help = "Delete archived products and their related rows, in batches, without model signals."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--older-than-days', type=int, default=0,
+                            help="Only purge products archived at least this many days ago.")
+        parser.add_argument('--include-ordered', action='store_true',
+                            help="Also purge products that appear in orders, deleting those order items.")
+
+    def handle(self, *args, **options):
+        archived_before = timezone.now() - timedelta(days=options['older_than_days'])
+        purged = 0
+        for purged in purge_archived(options['batch_size'], archived_before, options['include_ordered']):
+            self.stdout.write(f"Purged {purged} products")
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {purged} products purged."))
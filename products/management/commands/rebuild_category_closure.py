@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from products.models import CategoryClosure
+
+
+class Command(BaseCommand):
+    help = "Regenerate the category closure table from Category.parent."
+
+    def handle(self, *args, **options):
+        CategoryClosure.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt category closure: {CategoryClosure.objects.count()} links."
+        ))
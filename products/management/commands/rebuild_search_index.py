@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from products.models import Product
+from products.search import index_products
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product search documents and index, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        product_ids = Product.objects.order_by('pk').values_list('pk', flat=True)
+
+        last_id = 0
+        processed = 0
+        while True:
+            batch_ids = list(product_ids.filter(pk__gt=last_id)[:batch_size])
+            if not batch_ids:
+                break
+            index_products(batch_ids)
+            processed += len(batch_ids)
+            last_id = batch_ids[-1]
+            self.stdout.write(f"Indexed {processed} products")
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {processed} products indexed."))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.importer import claim_import_job, run_import_job
+
+
+class Command(BaseCommand):
+    help = "Run queued bulk product imports, resuming any whose worker died."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit when no job is waiting.")
+        parser.add_argument('--poll-interval', type=float, default=5.0)
+        parser.add_argument('--chunk-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        chunk_options = {'chunk_size': options['chunk_size']} if options['chunk_size'] else {}
+        while True:
+            job = claim_import_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f"Importing job {job.id} ({job.original_name}) from row {job.rows_processed}")
+            job = run_import_job(job, **chunk_options)
+            self.stdout.write(
+                f"Job {job.id} {job.status}: {job.products_created} created, {len(job.errors)} errors"
+            )
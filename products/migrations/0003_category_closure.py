@@ -0,0 +1,42 @@
+# Generated by Django 5.0 on 2026-10-18 02:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_closure(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    CategoryClosure = apps.get_model('products', 'CategoryClosure')
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+    links = []
+    for category_id in parents:
+        node, depth, seen = category_id, 0, set()
+        while node is not None and node not in seen:
+            seen.add(node)
+            links.append(CategoryClosure(ancestor_id=node, descendant_id=category_id, depth=depth))
+            node, depth = parents.get(node), depth + 1
+    CategoryClosure.objects.bulk_create(links, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_product_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='products.category')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='products.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='products_ca_descend_c38652_idx')],
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(build_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.0 on 2026-10-18 02:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def add_search_vector(apps, schema_editor):
+    # PostgreSQL only: a weighted tsvector generated from the document fields,
+    # with a GIN index. Other databases use ProductSearchTerm instead.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        """
+        ALTER TABLE products_productsearchdocument
+        ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(name_text, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(category_text, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(body_text, '')), 'C')
+        ) STORED
+        """
+    )
+    schema_editor.execute(
+        "CREATE INDEX products_search_vector_gin ON products_productsearchdocument USING gin (search_vector)"
+    )
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS products_search_vector_gin")
+    schema_editor.execute("ALTER TABLE products_productsearchdocument DROP COLUMN IF EXISTS search_vector")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_category_closure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchDocument',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='products.product')),
+                ('name_text', models.TextField(blank=True)),
+                ('category_text', models.TextField(blank=True)),
+                ('body_text', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.FloatField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'product'], name='products_pr_term_519224_idx')],
+            },
+        ),
+        migrations.RunPython(add_search_vector, drop_search_vector),
+    ]
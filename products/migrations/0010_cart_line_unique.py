@@ -0,0 +1,37 @@
+# Generated by Django 5.0 on 2026-10-18 03:11
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    """Fold repeated variant-less lines of a cart into one before they become unique."""
+    CartItem = apps.get_model('products', 'CartItem')
+    duplicates = (
+        CartItem.objects.filter(variant__isnull=True, user__isnull=False)
+        .values('user', 'product')
+        .annotate(lines=Count('id'), total=Sum('quantity'))
+        .filter(lines__gt=1)
+    )
+    for group in duplicates:
+        rows = CartItem.objects.filter(user=group['user'], product=group['product'], variant__isnull=True).order_by('id')
+        keep = rows.first()
+        rows.exclude(pk=keep.pk).delete()
+        CartItem.objects.filter(pk=keep.pk).update(quantity=group['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_product_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('variant__isnull', True)), fields=('user', 'product'), name='cart_line_no_variant_unique'),
+        ),
+    ]
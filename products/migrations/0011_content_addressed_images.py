@@ -0,0 +1,29 @@
+# Generated by Django 5.0 on 2026-10-18 03:31
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_cart_line_unique'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.content_addressed_storage, upload_to='product_images/'),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(storage=core.storage.content_addressed_storage, upload_to='product_images/'),
+        ),
+        migrations.AlterField(
+            model_name='productvariant',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.content_addressed_storage, upload_to='product_variants/'),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.0 on 2026-10-18 04:02
+
+from django.db import migrations
+
+from products.search import FIELD_WEIGHTS, tokenize
+
+BATCH_SIZE = 500
+
+
+def index_batch(apps, connection, products):
+    CategoryClosure = apps.get_model('products', 'CategoryClosure')
+    ProductSearchDocument = apps.get_model('products', 'ProductSearchDocument')
+    ProductSearchTerm = apps.get_model('products', 'ProductSearchTerm')
+
+    paths = {}
+    links = (
+        CategoryClosure.objects.filter(descendant_id__in={product.category_id for product in products})
+        .order_by('descendant_id', '-depth')
+        .values_list('descendant_id', 'ancestor__name')
+    )
+    for descendant_id, name in links:
+        paths.setdefault(descendant_id, []).append(name)
+
+    documents = [
+        ProductSearchDocument(
+            product_id=product.pk,
+            name_text=product.name or '',
+            category_text=' '.join(paths.get(product.category_id, [])),
+            body_text=product.description or '',
+        )
+        for product in products
+    ]
+    ProductSearchDocument.objects.bulk_create(
+        documents,
+        update_conflicts=True,
+        unique_fields=['product'],
+        update_fields=['name_text', 'category_text', 'body_text', 'updated_at'],
+    )
+    if connection.vendor == 'postgresql':
+        # The tsvector column is generated from the documents.
+        return
+
+    terms = []
+    for document in documents:
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(getattr(document, field)):
+                weights[token] = weights.get(token, 0) + weight
+        terms += [
+            ProductSearchTerm(product_id=document.product_id, term=term, weight=weight)
+            for term, weight in weights.items()
+        ]
+    ProductSearchTerm.objects.filter(product_id__in=[document.product_id for document in documents]).delete()
+    ProductSearchTerm.objects.bulk_create(terms, batch_size=1000)
+
+
+def backfill_search_index(apps, schema_editor):
+    """Index the catalog that existed before search documents were maintained on save."""
+    Product = apps.get_model('products', 'Product')
+    products = Product.objects.order_by('pk').only('pk', 'name', 'description', 'category_id')
+    last_id = 0
+    while True:
+        batch = list(products.filter(pk__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            return
+        index_batch(apps, schema_editor.connection, batch)
+        last_id = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_index, migrations.RunPython.noop),
+    ]
@@ -1,16 +1,19 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.text import slugify
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import pre_delete
 from django.dispatch import receiver
 from django.conf import settings
 from django.db.models.signals import pre_save
-from django.db.models import Min, Avg
+from django.db.models import Prefetch, F, Case, When, Value, FloatField, DecimalField, IntegerField, Sum, Window
+from django.db.models.functions import Cast
 
-import uuid
 from decimal import Decimal
 
+from core.storage import content_addressed_storage
+from .allocation import allocate, product_sku, reserve_ids, variant_sku_base
+
 UNIT_CHOICES = [
     ('PCS', 'Pieces'),
     ('KG', 'Kilogram'),
@@ -22,30 +25,223 @@ UNIT_CHOICES = [
 ]
 
 
+class CategoryQuerySet(models.QuerySet):
+    def with_ancestors(self):
+        return self.prefetch_related(ancestors_prefetch('ancestor_links'))
+
+    def descendants_of(self, category_id, include_self=True):
+        queryset = self.filter(ancestor_links__ancestor_id=category_id)
+        if not include_self:
+            queryset = queryset.exclude(pk=category_id)
+        return queryset
+
+
+def ancestors_prefetch(lookup):
+    """
+    Prefetch every ancestor of a category (itself included) through the
+    closure table into `ancestor_chain`, so the whole chain costs one query.
+    """
+    return Prefetch(
+        lookup,
+        queryset=CategoryClosure.objects.select_related('ancestor').order_by('-depth'),
+        to_attr='ancestor_chain',
+    )
+
+
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True, db_index=True)
     parent = models.ForeignKey(
         'self', null=True, blank=True, on_delete=models.SET_NULL, related_name='subcategories'
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = CategoryQuerySet.as_manager()
 
     def validate_parent(self):
-        if self.parent:
-            if self.parent == self:
+        if self.parent_id:
+            if self.parent_id == self.pk:
                 raise ValidationError("A category cannot be its own parent.")
-            ancestor = self.parent
-            while ancestor is not None:
-                if ancestor == self:
-                    raise ValidationError("Circular category hierarchy detected!")
-                ancestor = ancestor.parent
+            # The new parent must not be inside this category's subtree.
+            if self.pk and CategoryClosure.objects.filter(
+                ancestor_id=self.pk, descendant_id=self.parent_id
+            ).exists():
+                raise ValidationError("Circular category hierarchy detected!")
 
     def save(self, *args, **kwargs):
         self.validate_parent()
-        super().save(*args, **kwargs)
+        is_new = self.pk is None
+        previous_parent_id = None
+        if not is_new:
+            previous_parent_id = (
+                Category.objects.filter(pk=self.pk).values_list('parent_id', flat=True).first()
+            )
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if is_new:
+                CategoryClosure.insert_node(self)
+            elif previous_parent_id != self.parent_id:
+                CategoryClosure.move_subtree(self)
+
+    def get_ancestors(self, include_self=False):
+        """Ancestors ordered from the root down, in one query."""
+        queryset = Category.objects.filter(descendant_links__descendant=self)
+        if not include_self:
+            queryset = queryset.exclude(pk=self.pk)
+        return queryset.order_by('-descendant_links__depth')
+
+    def get_descendants(self, include_self=False):
+        return Category.objects.descendants_of(self.pk, include_self=include_self)
 
     def __str__(self):
         return self.name
 
 
+class CategoryClosure(models.Model):
+    """
+    Ancestor/descendant pairs for every category, including a depth-0 row
+    linking each category to itself.
+    """
+    ancestor = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+        indexes = [models.Index(fields=['descendant', 'depth'])]
+
+    @classmethod
+    def insert_node(cls, category):
+        links = [cls(ancestor=category, descendant=category, depth=0)]
+        if category.parent_id:
+            links += [
+                cls(ancestor_id=ancestor_id, descendant=category, depth=depth + 1)
+                for ancestor_id, depth in cls.objects.filter(
+                    descendant_id=category.parent_id
+                ).values_list('ancestor_id', 'depth')
+            ]
+        cls.objects.bulk_create(links)
+
+    @classmethod
+    def detach_subtree(cls, category):
+        """Drop the links between the category's subtree and everything above it."""
+        subtree = list(cls.objects.filter(ancestor=category).values_list('descendant_id', flat=True))
+        cls.objects.filter(descendant_id__in=subtree).exclude(ancestor_id__in=subtree).delete()
+
+    @classmethod
+    def move_subtree(cls, category):
+        cls.detach_subtree(category)
+        if not category.parent_id:
+            return
+        subtree = list(cls.objects.filter(ancestor=category).values_list('descendant_id', 'depth'))
+        ancestors = list(
+            cls.objects.filter(descendant_id=category.parent_id).values_list('ancestor_id', 'depth')
+        )
+        cls.objects.bulk_create([
+            cls(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=up + down + 1)
+            for ancestor_id, up in ancestors
+            for descendant_id, down in subtree
+        ])
+
+    @classmethod
+    def rebuild(cls):
+        """Regenerate the whole table from Category.parent."""
+        parents = dict(Category.objects.values_list('id', 'parent_id'))
+        links = []
+        for category_id in parents:
+            node, depth, seen = category_id, 0, set()
+            while node is not None and node not in seen:
+                seen.add(node)
+                links.append(cls(ancestor_id=node, descendant_id=category_id, depth=depth))
+                node, depth = parents.get(node), depth + 1
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(links, batch_size=1000)
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
+
+@receiver(pre_delete, sender=Category)
+def detach_category_children(sender, instance, **kwargs):
+    # Children are re-rooted by SET_NULL, so cut them loose from the old ancestors.
+    for child in instance.subcategories.all():
+        CategoryClosure.detach_subtree(child)
+
+
+# Product columns read by computed serializer fields. Other serializer fields
+# read the column of the same name, if there is one.
+CATALOG_FIELD_COLUMNS = {
+    'final_price': ('price', 'discount'),
+    'original_price': ('price', 'discount'),
+    'average_rating': ('rating_avg',),
+    'rating_histogram': ('rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count'),
+    'is_verified': ('certificate_file', 'certificate_description'),
+    'category_data': ('category',),
+    'variants': ('discount',),
+    'default_variant': ('default_variant', 'discount'),
+}
+
+# Loaded for every planned product: pagination and ordering read these.
+CATALOG_BASE_COLUMNS = ('id', 'slug', 'created_at', 'price', 'rating_avg', 'rating_count')
+
+CATALOG_IMAGE_FIELDS = {'images', 'gallery_images'}
+CATALOG_MAIN_IMAGE_FIELDS = {'main_image', 'thumbnail', 'thumbnail_srcset'}
+CATALOG_VARIANT_FIELDS = {'variants', 'default_variant'}
+
+
+class ProductQuerySet(models.QuerySet):
+    def for_catalog(self, fields=None):
+        """
+        Plan the relations ProductSerializer reads so that a page of products
+        costs a fixed number of queries instead of a few per row.
+
+        `fields` names the serializer fields that will be rendered (None for
+        all of them); relations nobody renders are not prefetched and
+        columns nobody reads are deferred.
+        """
+        queryset = self
+        if fields is None or 'category_data' in fields:
+            queryset = queryset.select_related('category').prefetch_related(
+                ancestors_prefetch('category__ancestor_links')
+            )
+        if fields is None or fields & CATALOG_IMAGE_FIELDS:
+            queryset = queryset.prefetch_related('images')
+        elif fields & CATALOG_MAIN_IMAGE_FIELDS:
+            # The main image is all a card needs.
+            queryset = queryset.prefetch_related(
+                Prefetch('images', queryset=ProductImage.objects.filter(is_main=True))
+            )
+        if fields is None or fields & CATALOG_VARIANT_FIELDS:
+            queryset = queryset.prefetch_related(
+                Prefetch('variants', queryset=ProductVariant.objects.prefetch_related('attributes'))
+            )
+        if fields is not None:
+            columns = {field.name for field in Product._meta.concrete_fields}
+            loaded = set(CATALOG_BASE_COLUMNS)
+            for name in fields:
+                loaded.update(CATALOG_FIELD_COLUMNS.get(name, (name,)))
+            queryset = queryset.only(*(loaded & columns))
+        return queryset
+
+    def refresh_rating_avg(self):
+        """Recompute rating_avg from the stored per-star histogram in a single UPDATE."""
+        weighted = sum(F(field) * star for star, field in Product.RATING_HISTOGRAM_FIELDS.items())
+        return self.update(
+            rating_avg=Case(
+                When(rating_count=0, then=Value(0.0)),
+                default=Cast(weighted, FloatField()) / Cast(F('rating_count'), FloatField()),
+                output_field=FloatField(),
+            )
+        )
+
+
+class CatalogManager(models.Manager.from_queryset(ProductQuerySet)):
+    """Products that have not been archived; Product.all_objects sees every row."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_archived=False)
+
+
 class Product(models.Model):
     STATUS_CHOICES = [
         ('NEW', 'New'),
@@ -72,7 +268,7 @@ class Product(models.Model):
     )
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='NEW')
     label = models.CharField(max_length=50, blank=True, null=True)
-    image = models.ImageField(upload_to='product_images/', blank=True, null=True)
+    image = models.ImageField(upload_to='product_images/', storage=content_addressed_storage, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     has_variants = models.BooleanField(default=False, help_text="Does this product have variants?")
@@ -98,6 +294,30 @@ class Product(models.Model):
     help_text="Certificate description in rich text (HTML)"
     )
 
+    # Denormalized review aggregates, maintained by reviews.signals.
+    rating_avg = models.FloatField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+
+    RATING_HISTOGRAM_FIELDS = {
+        1: 'rating_1_count',
+        2: 'rating_2_count',
+        3: 'rating_3_count',
+        4: 'rating_4_count',
+        5: 'rating_5_count',
+    }
+
+    # Archived products are hidden from every catalog query straight away and
+    # deleted later, in batches, by `manage.py purge_archived_products`.
+    is_archived = models.BooleanField(default=False)
+    archived_at = models.DateTimeField(null=True, blank=True)
+
+    objects = CatalogManager()
+    all_objects = ProductQuerySet.as_manager()
 
     def clean(self):
         if not self.has_variants:
@@ -111,66 +331,34 @@ class Product(models.Model):
             self.custom_unit = None
 
     def save(self, *args, **kwargs):
-            # Generate slug if not set
-            if not self.slug:
-                base_slug = slugify(self.name)
-                unique_slug = base_slug
-                counter = 1
-                while Product.objects.filter(slug=unique_slug).exists():
-                    unique_slug = f"{base_slug}-{counter}"
-                    counter += 1
-                self.slug = unique_slug
-
-            # Generate SKU if not set
-            if not self.sku:
-                cat_prefix = self.category.name[:3].upper()
-                if self.id:
-                    self.sku = f"{cat_prefix}-{self.id:04d}"
-                else:
-                    # Use a temporary unique SKU to avoid conflicts
-                    temp_suffix = uuid.uuid4().hex[:8]  # e.g., "CLO-1a2b3c4d"
-                    self.sku = f"{cat_prefix}-{temp_suffix}"
-                    super().save(*args, **kwargs)
-                    # Update SKU with id after save
-                    self.sku = f"{cat_prefix}-{self.id:04d}"
-                    super().save(update_fields=['sku'])
-            else:
-                super().save(*args, **kwargs)
+        # Generate slug if not set
+        if not self.slug:
+            self.slug = allocate(Product.all_objects.all(), 'slug', [slugify(self.name)])[0]
+
+        # Generate SKU if not set: draw the id first so the SKU is written with the row
+        if not self.sku and self.pk is None:
+            ids = reserve_ids(Product, 1, using=kwargs.get('using'))
+            if ids:
+                self.pk = ids[0]
+                kwargs['force_insert'] = True
+        if not self.sku and self.pk is not None:
+            self.sku = product_sku(self.category.name, self.pk)
 
-    
-    def update_price_from_variants(self):
-        if self.has_variants:
-            min_price = self.variants.aggregate(Min("price"))["price__min"]
-            if min_price is not None:
-                self.price = min_price
-                self.save(update_fields=["price"])
-
-            # Optional: assign default_variant if missing
-            if not self.default_variant:
-                cheapest = self.variants.order_by("price").first()
-                if cheapest:
-                    self.default_variant = cheapest
-                    self.save(update_fields=["default_variant"])
-
-    def update_stock(self):
-        if self.has_variants:
-            total_stock = self.variants.aggregate(total=models.Sum('stock'))['total'] or 0
-            self.stock = total_stock
-            self.save(update_fields=['stock'])
+        super().save(*args, **kwargs)
+        if not self.sku:
+            # No sequence to draw from: embed the id assigned by the INSERT.
+            self.sku = product_sku(self.category.name, self.pk)
+            super().save(update_fields=['sku'])
 
     def reduce_stock(self, quantity, variant=None):
-        if self.has_variants:
-            if not variant:
-                raise ValidationError("A variant must be specified for products with variants.")
-            variant.stock -= quantity
-            if variant.stock < 0:
-                raise ValidationError(f"Insufficient stock for {variant}")
-            variant.save()
-        else:
-            self.stock -= quantity
-            if self.stock < 0:
-                raise ValidationError(f"Insufficient stock for {self}")
-            self.save()
+        from .inventory import take_stock
+
+        if self.has_variants and not variant:
+            raise ValidationError("A variant must be specified for products with variants.")
+        target = variant if self.has_variants else self
+        # A conditional UPDATE, so concurrent buyers cannot take the same units.
+        take_stock({(self.pk, variant.pk if self.has_variants else None): quantity})
+        target.refresh_from_db(fields=['stock'])
 
     def get_final_price(self):
         if self.price is None:
@@ -211,7 +399,11 @@ class Product(models.Model):
      
     @property
     def average_rating(self):
-        return self.reviews.aggregate(avg_rating=Avg('rating'))['avg_rating'] or 0
+        return self.rating_avg
+
+    @property
+    def rating_histogram(self):
+        return {star: getattr(self, field) for star, field in self.RATING_HISTOGRAM_FIELDS.items()}
 
     def __str__(self):
         return self.name or "Unnamed Product"
@@ -220,9 +412,39 @@ class Product(models.Model):
         indexes = [
             models.Index(fields=['slug']),
             models.Index(fields=['category', 'status']),
+            models.Index(fields=['rating_avg', 'rating_count']),
+            # Keyset pagination orderings, with the id tiebreak.
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['price', 'id']),
+            models.Index(fields=['archived_at'], condition=models.Q(is_archived=True), name='product_archived_idx'),
         ]
 
 
+class ProductSearchDocument(models.Model):
+    """
+    Precomputed search text for a product, maintained by products.search.
+    On PostgreSQL the table also carries a generated, GIN-indexed
+    `search_vector` tsvector column built from these fields.
+    """
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name='search_document'
+    )
+    name_text = models.TextField(blank=True)
+    category_text = models.TextField(blank=True)
+    body_text = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class ProductSearchTerm(models.Model):
+    """Inverted index used for search on databases without full-text support."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=64)
+    weight = models.FloatField()
+
+    class Meta:
+        indexes = [models.Index(fields=['term', 'product'])]
+
+
 class VariantAttribute(models.Model):
     name = models.CharField(max_length=50)
 
@@ -243,21 +465,17 @@ class ProductVariant(models.Model):
     attributes = models.ManyToManyField(VariantAttributeValue, related_name='variants')
     stock = models.IntegerField(validators=[MinValueValidator(0)])
     price = models.DecimalField(max_digits=10, decimal_places=2)  # Final price
-    image = models.ImageField(upload_to='product_variants/', blank=True, null=True)
+    image = models.ImageField(upload_to='product_variants/', storage=content_addressed_storage, blank=True, null=True)
     sku = models.CharField(max_length=100, unique=True, blank=True, null=True)
 
     def save(self, *args, **kwargs):
+        if not self.sku:
+            # A new variant has no attributes yet; they are set after the first save.
+            values = [attr.value for attr in self.attributes.all()] if self.pk else []
+            self.sku = allocate(
+                ProductVariant.objects.exclude(pk=self.pk), 'sku', [variant_sku_base(self.product.sku, values)]
+            )[0]
         super().save(*args, **kwargs)
-        if not self.sku and self.pk:
-            attrs_short = "".join(attr.value[:2] for attr in self.attributes.all()).upper()
-            base_sku = f"{self.product.sku}-{attrs_short}"
-            unique_sku = base_sku
-            counter = 1
-            while ProductVariant.objects.filter(sku=unique_sku).exclude(pk=self.pk).exists():
-                unique_sku = f"{base_sku}-{counter}"
-                counter += 1
-            self.sku = unique_sku
-            super().save(update_fields=['sku'])
 
     def __str__(self):
         return f"{self.product.name} - Variant {self.id}"
@@ -267,24 +485,37 @@ class ProductVariant(models.Model):
         unique_together = ('product', 'sku')
 
 
-@receiver(post_save, sender=ProductVariant)
-def update_product_stock_on_variant_save(sender, instance, **kwargs):
-    if instance.product.has_variants:
-        instance.product.update_stock()
-        instance.product.update_price_from_variants()
-
-
-@receiver(pre_delete, sender=ProductVariant)
-def update_product_stock_on_variant_delete(sender, instance, **kwargs):
-    product = instance.product
-    if product.has_variants:
-        product.update_stock()
-        product.update_price_from_variants()
-        if product.default_variant_id == instance.id:
-            product.default_variant = None
-            product.save(update_fields=["default_variant"])
-
-
+class CartItemQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Cart lines with unit_price, line_total and available stock, plus the
+        cart's subtotal as a window sum, all computed by the database in the
+        query that loads the lines. Prices follow get_total_price().
+        """
+        money = DecimalField(max_digits=12, decimal_places=2)
+        return (
+            self.select_related('product', 'variant')
+            .prefetch_related(
+                'variant__attributes',
+                Prefetch('product__images', queryset=ProductImage.objects.filter(is_main=True)),
+            )
+            .annotate(
+                unit_price=Case(
+                    When(product__has_variants=True, then=F('variant__price')),
+                    When(product__discount=100, then=Value(Decimal('0.00'))),
+                    default=F('product__price'),
+                    output_field=money,
+                ),
+                available=Case(
+                    When(product__has_variants=True, then=F('variant__stock')),
+                    default=F('product__stock'),
+                    output_field=IntegerField(),
+                ),
+            )
+            .annotate(line_total=models.ExpressionWrapper(F('unit_price') * F('quantity'), output_field=money))
+            .annotate(subtotal=Window(Sum('line_total'), output_field=money))
+            .order_by('added_at', 'pk')
+        )
 
 
 class CartItem(models.Model):
@@ -305,6 +536,8 @@ class CartItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     added_at = models.DateTimeField(auto_now_add=True)  # New: Track when added
 
+    objects = CartItemQuerySet.as_manager()
+
     def clean(self):
         if self.product.has_variants and not self.variant:
             raise ValidationError("A variant must be specified for products with variants.")
@@ -334,14 +567,46 @@ class CartItem(models.Model):
         unique_together = (
             ('user', 'product', 'variant'),
         )
+        constraints = [
+            # NULLs are distinct in unique_together, so lines without a variant need their own constraint.
+            models.UniqueConstraint(
+                fields=['user', 'product'], condition=models.Q(variant__isnull=True), name='cart_line_no_variant_unique',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.product.name} ({self.variant or 'No Variant'}) - Qty: {self.quantity}"
     
 
+class StockReservation(models.Model):
+    """
+    Stock held for one cart line. The quantity has already been taken from
+    the product/variant; checkout commits the hold by deleting the row, and
+    release_expired_reservations gives expired holds back.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='stock_reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    variant = models.ForeignKey(
+        ProductVariant, on_delete=models.CASCADE, null=True, blank=True, related_name='reservations'
+    )
+    quantity = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'expires_at'])]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.variant or self.product} for {self.user} until {self.expires_at}"
+
+
+# Shared main image of products imported without one.
+PLACEHOLDER_IMAGE = 'product_images/no-image.jpg'
+
+
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, related_name='images', on_delete=models.CASCADE)
-    image = models.ImageField(upload_to='product_images/')
+    image = models.ImageField(upload_to='product_images/', storage=content_addressed_storage)
     alt_text = models.CharField(max_length=255, blank=True, null=True)
     is_main = models.BooleanField(default=False)
 
@@ -365,7 +630,7 @@ def remove_default_no_image(sender, instance, **kwargs):
         # Only when a new main image is being added
         existing_default = ProductImage.objects.filter(
             product=instance.product,
-            image='product_images/no-image.jpg',
+            image=PLACEHOLDER_IMAGE,
             is_main=True
         ).first()
 
@@ -373,4 +638,38 @@ def remove_default_no_image(sender, instance, **kwargs):
             existing_default.delete()
 
 
+class ImportJob(models.Model):
+    """
+    A bulk product upload, imported in the background by the
+    run_import_jobs worker. rows_processed only advances together with the
+    chunk it covers, so a crashed job resumes after its last committed chunk.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    file = models.FileField(upload_to='product_imports/')
+    original_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued', db_index=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='import_jobs'
+    )
+    rows_processed = models.PositiveIntegerField(default=0)
+    products_created = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    error_message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Refreshed with every committed chunk; a running job whose heartbeat is
+    # older than the lease is considered abandoned and may be picked up again.
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
 
+    def __str__(self):
+        return f"Import {self.id} ({self.original_name}) - {self.status}"
@@ -1,19 +1,216 @@
 # products/pagination.py
 
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+import math
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.core.paginator import Paginator as DjangoPaginator
+from django.db import connections
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+# Below this many estimated rows an exact COUNT is cheap and more useful.
+EXACT_COUNT_THRESHOLD = 1000
+
+
+def estimate_count(queryset):
+    """
+    Row count from the PostgreSQL planner's statistics instead of a COUNT(*).
+    Other databases, and small results, get an exact count.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    rows = int(plan[0]['Plan']['Plan Rows'])
+    if rows < EXACT_COUNT_THRESHOLD:
+        return queryset.count()
+    return rows
+
+
+class EstimatedCountPaginator(DjangoPaginator):
+    @cached_property
+    def count(self):
+        return estimate_count(self.object_list)
+
 
 class CustomProductPagination(PageNumberPagination):
     page_size = 20  # default items per page
     page_size_query_param = 'page_size'
     max_page_size = 100
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # ?count=estimate trades an exact total for planner statistics.
+        self.count_estimated = request.query_params.get(self.count_query_param) == 'estimate'
+        if self.count_estimated:
+            self.django_paginator_class = EstimatedCountPaginator
+        return super().paginate_queryset(queryset, request, view)
 
     def get_paginated_response(self, data):
-        return Response({
+        response = {
             'count': self.page.paginator.count,
             'total_pages': self.page.paginator.num_pages,
             'current_page': self.page.number,
             'next': self.get_next_link(),
             'previous': self.get_previous_link(),
             'results': data,
+        }
+        if self.count_estimated:
+            response['count_estimated'] = True
+        return Response(response)
+
+
+class ProductCursorPagination(BasePagination):
+    """
+    Keyset pagination for infinite scroll. Pages are positioned by the
+    (ordering value, id) of the last row seen, so deep pages cost the same
+    as the first one and rows never shift under concurrent inserts.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    # Type of each ordering field's value, as carried by cursors.
+    ordering_fields = {
+        'created_at': datetime,
+        'price': Decimal,
+        'rating_avg': float,
+        'rating_count': int,
+        'search_rank': float,
+    }
+    # Only annotated when the request searches.
+    search_fields = ('search_rank',)
+    nullable_fields = ('price',)
+    default_ordering = '-created_at'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_ordering(self, request):
+        ordering = request.query_params.get('ordering', '').split(',')[0].strip()
+        if not ordering:
+            ordering = '-search_rank' if request.query_params.get('search') else self.default_ordering
+        field = ordering.lstrip('-')
+        if field not in self.ordering_fields or (field in self.search_fields and not request.query_params.get('search')):
+            ordering = self.default_ordering
+        return ordering.lstrip('-'), ordering.startswith('-')
+
+    def parse_value(self, value):
+        """A cursor's ordering value as the type of the ordering field; raises ValueError for any other."""
+        if value is None:
+            if self.field in self.nullable_fields:
+                return None
+            raise ValueError("Missing cursor value")
+        field_type = self.ordering_fields[self.field]
+        if field_type is datetime:
+            parsed = parse_datetime(value) if isinstance(value, str) else None
+            if parsed is None:
+                raise ValueError("Invalid cursor timestamp")
+            return parsed
+        try:
+            parsed = field_type(str(value)) if field_type is Decimal else field_type(value)
+        except InvalidOperation:
+            raise ValueError("Invalid cursor value")
+        if field_type in (Decimal, float) and not math.isfinite(parsed):
+            raise ValueError("Invalid cursor value")
+        return parsed
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            return {'value': self.parse_value(cursor['v']), 'id': int(cursor['id']), 'reverse': bool(cursor.get('r'))}
+        except (TypeError, ValueError, KeyError):
+            raise NotFound("Invalid cursor")
+
+    def encode_cursor(self, row, reverse):
+        value = getattr(row, self.field)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+        payload = json.dumps({'v': value, 'id': row.pk, 'r': int(reverse)})
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def order_by(self, descending, nulls_last):
+        expression = F(self.field).desc if descending else F(self.field).asc
+        if self.field in self.nullable_fields:
+            column = expression(nulls_last=True) if nulls_last else expression(nulls_first=True)
+        else:
+            column = expression()
+        return [column, '-id' if descending else 'id']
+
+    def rows_after(self, cursor, descending, nulls_last):
+        compare = 'lt' if descending else 'gt'
+        value, pk = cursor['value'], cursor['id']
+        same_value_after = Q(**{f'id__{compare}': pk})
+        if value is None:
+            condition = Q(**{f'{self.field}__isnull': True}) & same_value_after
+            if not nulls_last:
+                condition |= Q(**{f'{self.field}__isnull': False})
+            return condition
+        condition = Q(**{f'{self.field}__{compare}': value}) | (Q(**{self.field: value}) & same_value_after)
+        if self.field in self.nullable_fields and nulls_last:
+            condition |= Q(**{f'{self.field}__isnull': True})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        self.field, descending = self.get_ordering(request)
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor['reverse'])
+
+        # Scanning backwards flips both the direction and where NULLs sort.
+        scan_descending = descending != reverse
+        nulls_last = not reverse
+        queryset = queryset.order_by(*self.order_by(scan_descending, nulls_last))
+        if cursor:
+            queryset = queryset.filter(self.rows_after(cursor, scan_descending, nulls_last))
+
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next_cursor = self.previous_cursor = None
+        if rows:
+            if has_more or reverse:
+                self.next_cursor = self.encode_cursor(rows[-1], reverse=False)
+            if cursor and (has_more or not reverse):
+                self.previous_cursor = self.encode_cursor(rows[0], reverse=True)
+        return rows
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, 'page')
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_link(self.next_cursor),
+            'previous': self.get_link(self.previous_cursor),
+            'results': data,
         })
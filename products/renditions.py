@@ -0,0 +1,204 @@
+"""
+Fixed-width WebP/JPEG renditions of product and variant images.
+
+Renditions live next to the media files under renditions/<original name
+without extension>/<width>.<ext>, so their URLs follow from the original's
+name and cost serializers no queries. They are generated in a background
+thread after an image is saved (inline when PRODUCT_IMAGE_RENDITIONS_ASYNC
+is off, as in tests), and lazily by the product-image-rendition view the
+first time one is requested; either way the file is written once and
+served from storage after that.
+
+Renditions go to the "renditions" storage: their names are derived from the
+original's, and content-addressed originals mean identical uploads share
+one set of renditions.
+"""
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.db import transaction
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+from core.logs import get_logger
+from core.storage import content_addressed_storage
+
+logger = get_logger(__name__)
+
+RENDITION_WIDTHS = tuple(getattr(settings, 'PRODUCT_IMAGE_RENDITION_WIDTHS', (160, 320, 640, 1280)))
+THUMBNAIL_WIDTH = getattr(settings, 'PRODUCT_IMAGE_THUMBNAIL_WIDTH', 320)
+QUALITY = 80
+
+FORMATS = {
+    'webp': ('WEBP', 'webp', 'image/webp'),
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg'),
+}
+
+# Upload directories renditions may be made from.
+SOURCE_DIRS = ('product_images/', 'product_variants/')
+
+RENDITIONS_DIR = 'renditions'
+
+
+class InvalidRendition(ValueError):
+    pass
+
+
+def rendition_storage():
+    return storages['renditions']
+
+
+def rendition_name(name, width, fmt):
+    base, _ = os.path.splitext(name)
+    return f"{RENDITIONS_DIR}/{base}/{width}.{FORMATS[fmt][1]}"
+
+
+def check_rendition(name, width, fmt):
+    if width not in RENDITION_WIDTHS:
+        raise InvalidRendition(f"Unsupported width: {width}")
+    if fmt not in FORMATS:
+        raise InvalidRendition(f"Unsupported format: {fmt}")
+    if not name.startswith(SOURCE_DIRS) or os.path.normpath(name) != name:
+        raise InvalidRendition(f"Not a product image: {name}")
+
+
+def open_original(name):
+    with content_addressed_storage().open(name, 'rb') as file:
+        image = Image.open(file)
+        image.load()
+    return ImageOps.exif_transpose(image)
+
+
+def encode(image, width, fmt):
+    if image.width > width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.Resampling.LANCZOS)
+    has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        if has_alpha:
+            rgba = image.convert('RGBA')
+            image = Image.new('RGB', rgba.size, 'white')
+            image.paste(rgba, mask=rgba.getchannel('A'))
+        else:
+            image = image.convert('RGB')
+    elif fmt == 'webp' and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, format=FORMATS[fmt][0], quality=QUALITY)
+    return ContentFile(buffer.getvalue())
+
+
+def store(path, content):
+    storage = rendition_storage()
+    saved = storage.save(path, content)
+    if saved != path:
+        # Another worker wrote it first; storage gave this copy a new name.
+        storage.delete(saved)
+
+
+def get_rendition(name, width, fmt):
+    """Storage name of one rendition, generating it on first use."""
+    check_rendition(name, width, fmt)
+    path = rendition_name(name, width, fmt)
+    if not rendition_storage().exists(path):
+        store(path, encode(open_original(name), width, fmt))
+    return path
+
+
+def generate_renditions(name):
+    """Write every missing rendition of `name`, decoding the original once."""
+    storage = rendition_storage()
+    missing = [
+        (width, fmt) for width in RENDITION_WIDTHS for fmt in FORMATS
+        if not storage.exists(rendition_name(name, width, fmt))
+    ]
+    if not missing:
+        return 0
+    image = open_original(name)
+    for width, fmt in missing:
+        store(rendition_name(name, width, fmt), encode(image, width, fmt))
+    return len(missing)
+
+
+def delete_renditions(name):
+    """Remove every rendition of `name`, once its original is gone."""
+    if not name.startswith(SOURCE_DIRS):
+        return
+    storage = rendition_storage()
+    for width in RENDITION_WIDTHS:
+        for fmt in FORMATS:
+            storage.delete(rendition_name(name, width, fmt))
+
+
+def generate_in_background(name):
+    try:
+        created = generate_renditions(name)
+    except Exception:
+        logger.exception("renditions.failed", name=name)
+    else:
+        logger.debug("renditions.generated", name=name, created=created)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'PRODUCT_IMAGE_RENDITION_WORKERS', 2),
+                thread_name_prefix='renditions',
+            )
+    return _executor
+
+
+def schedule_renditions(name):
+    """Generate the renditions of `name` off the request path, once the upload is committed."""
+    if not name or not name.startswith(SOURCE_DIRS):
+        return
+    if getattr(settings, 'PRODUCT_IMAGE_RENDITIONS_ASYNC', True):
+        transaction.on_commit(lambda: get_executor().submit(generate_in_background, name))
+    else:
+        transaction.on_commit(lambda: generate_in_background(name))
+
+
+def rendition_url(name, width, fmt, request=None):
+    url = reverse('product-image-rendition', kwargs={'width': width, 'fmt': fmt, 'name': name})
+    return request.build_absolute_uri(url) if request else url
+
+
+def renditions(image, request=None):
+    """{format: {width: url}} for an image field, or None when it has none."""
+    if not image or not image.name.startswith(SOURCE_DIRS):
+        return None
+    return {
+        fmt: {width: rendition_url(image.name, width, fmt, request) for width in RENDITION_WIDTHS}
+        for fmt in FORMATS
+    }
+
+
+def srcset(image, request=None):
+    """{format: srcset attribute value} for an image field, or None when it is empty."""
+    urls = renditions(image, request)
+    if urls is None:
+        return None
+    return {
+        fmt: ', '.join(f"{url} {width}w" for width, url in by_width.items())
+        for fmt, by_width in urls.items()
+    }
+
+
+def thumbnail_url(image, request=None):
+    """URL of the THUMBNAIL_WIDTH JPEG rendition, or of the original when it has none."""
+    if not image:
+        return None
+    if not image.name.startswith(SOURCE_DIRS):
+        return request.build_absolute_uri(image.url) if request else image.url
+    return rendition_url(image.name, THUMBNAIL_WIDTH, 'jpeg', request)
@@ -0,0 +1,141 @@
+"""
+Stock, price and default variant of variant products, derived from their
+variants.
+
+Variant writes call mark_dirty() instead of recomputing on the spot. Dirty
+products are collected per transaction and recomputed once, on commit, by a
+single UPDATE whose aggregates are correlated subqueries, so editing twelve
+variants of a product costs one statement instead of dozens. Callers that
+need the values before the commit (serializers, bulk paths) call recompute()
+or refresh_rollups() themselves.
+
+Writes that change a product's payload without saving the product (images,
+variant attributes) call touch() the same way: updated_at is bumped and the
+cached responses dropped once per product, on commit, and not at all for
+products whose rollups were recomputed in the same transaction.
+"""
+from django.db import transaction
+from django.db.models import F, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core.cache import invalidate_tags
+from .models import Product, ProductVariant
+
+ROLLUP_FIELDS = ['stock', 'price', 'default_variant', 'updated_at']
+
+
+class PendingProducts:
+    """on_commit callback of one transaction, holding the products it will recompute or touch."""
+
+    def __init__(self, using):
+        self.using = using
+        self.dirty = set()
+        self.touched = set()
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        recomputed = recompute(self.dirty, using=self.using)
+        touch_products(self.touched - recomputed, using=self.using)
+
+
+def pending_products(using=None, create=False):
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        return None
+    # A savepoint rollback discards the callbacks registered inside it, so
+    # look the batch up instead of remembering it.
+    for _, callback, *_ in connection.run_on_commit:
+        if isinstance(callback, PendingProducts) and not callback.done:
+            return callback
+    if not create:
+        return None
+    pending = PendingProducts(using)
+    transaction.on_commit(pending, using=using)
+    return pending
+
+
+def mark_dirty(product_ids, using=None):
+    """Recompute the rollups of `product_ids` when the current transaction commits."""
+    product_ids = set(product_ids)
+    if not product_ids:
+        return
+    pending = pending_products(using, create=True)
+    if pending is None:
+        recompute(product_ids, using=using)
+    else:
+        pending.dirty |= product_ids
+
+
+def touch(product_ids, using=None):
+    """Bump updated_at and drop the cached responses of `product_ids` when the current transaction commits."""
+    product_ids = set(product_ids)
+    if not product_ids:
+        return
+    pending = pending_products(using, create=True)
+    if pending is None:
+        touch_products(product_ids, using=using)
+    else:
+        pending.touched |= product_ids
+
+
+def touch_products(product_ids, using=None):
+    products = Product.objects.using(using).filter(pk__in=product_ids)
+    slugs = dict(products.values_list('pk', 'slug'))
+    if slugs:
+        products.update(updated_at=timezone.now())
+        invalidate_products(slugs)
+
+
+def rollup_expressions():
+    variants = ProductVariant.objects.filter(product=OuterRef('pk')).order_by()
+    total_stock = variants.values('product').annotate(total=Sum('stock')).values('total')
+    min_price = variants.values('product').annotate(lowest=Min('price')).values('lowest')
+    # Keep a default variant that still belongs to the product, else pick the cheapest.
+    current_default = variants.filter(pk=OuterRef('default_variant')).values('pk')
+    cheapest = variants.order_by('price', 'pk').values('pk')[:1]
+    return {
+        'stock': Coalesce(Subquery(total_stock), 0),
+        'price': Coalesce(Subquery(min_price), F('price')),
+        'default_variant': Coalesce(Subquery(current_default), Subquery(cheapest)),
+    }
+
+
+def recompute(product_ids, using=None):
+    """Recompute the rollups of the variant products among `product_ids` now; return the ids updated."""
+    product_ids = set(product_ids)
+    pending = pending_products(using)
+    if pending is not None:
+        pending.dirty -= product_ids
+    if not product_ids:
+        return set()
+
+    products = Product.objects.using(using).filter(pk__in=product_ids, has_variants=True)
+    slugs = dict(products.values_list('pk', 'slug'))
+    if not slugs:
+        return set()
+    Product.objects.using(using).filter(pk__in=slugs).update(
+        updated_at=timezone.now(), **rollup_expressions()
+    )
+    invalidate_products(slugs)
+    if pending is not None:
+        # The UPDATE bumped updated_at and the cache is dropped, so touching them again is redundant.
+        pending.touched -= slugs.keys()
+    return set(slugs)
+
+
+def invalidate_products(slugs):
+    """Drop cached catalog responses that include the products of {pk: slug}."""
+    invalidate_tags(
+        'products',
+        *(f'product:{pk}' for pk in slugs),
+        *(f'product-slug:{slug}' for slug in slugs.values() if slug),
+    )
+
+
+def refresh_rollups(product):
+    """Recompute one product's rollups and load them onto the instance."""
+    if product.has_variants:
+        recompute([product.pk])
+        product.refresh_from_db(fields=ROLLUP_FIELDS)
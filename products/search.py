@@ -0,0 +1,170 @@
+"""
+Product search backends.
+
+Every product has a ProductSearchDocument holding its name, category path and
+description. On PostgreSQL that table carries a generated, GIN-indexed
+tsvector column (see migration 0004) and searches are ranked with
+ts_rank_cd. Other databases fall back to the ProductSearchTerm inverted
+index, ranked by the summed weight of the matched terms.
+"""
+import re
+from functools import reduce
+from operator import or_
+
+from django.db import connection, transaction
+from django.db.models import BooleanField, Case, FloatField, Max, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Category, CategoryClosure, Product, ProductSearchDocument, ProductSearchTerm
+
+SEARCH_CONFIG = 'english'
+
+# Mirrors PostgreSQL's default weights for the A/B/C labels used by the tsvector.
+FIELD_WEIGHTS = {
+    'name_text': 1.0,
+    'category_text': 0.4,
+    'body_text': 0.2,
+}
+
+# Product fields that feed the search document.
+INDEXED_FIELDS = {'name', 'description', 'category'}
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TERM_LENGTH = 64
+
+
+def tokenize(text):
+    return [token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall((text or '').lower())]
+
+
+def category_paths(category_ids):
+    """Map each category id to the space-joined names of its ancestors and itself."""
+    paths = {category_id: [] for category_id in category_ids}
+    links = (
+        CategoryClosure.objects.filter(descendant_id__in=category_ids)
+        .order_by('descendant_id', '-depth')
+        .values_list('descendant_id', 'ancestor__name')
+    )
+    for descendant_id, name in links:
+        paths[descendant_id].append(name)
+    return {category_id: ' '.join(names) for category_id, names in paths.items()}
+
+
+def no_results(queryset):
+    # Keep search_rank available so relevance ordering still applies.
+    return queryset.annotate(search_rank=Value(0.0, output_field=FloatField())).none()
+
+
+class PostgresSearchBackend:
+    def index(self, documents):
+        # search_vector is a generated column, so the documents are all we write.
+        pass
+
+    def search(self, queryset, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return no_results(queryset)
+        # Prefix-match the last token so results keep up while the user types.
+        tsquery = ' & '.join(tokens[:-1] + [f'{tokens[-1]}:*'])
+        matches = ProductSearchDocument.objects.filter(
+            RawSQL('search_vector @@ to_tsquery(%s, %s)', (SEARCH_CONFIG, tsquery), output_field=BooleanField())
+        )
+        rank = matches.filter(product_id=OuterRef('pk')).annotate(
+            rank=RawSQL('ts_rank_cd(search_vector, to_tsquery(%s, %s))', (SEARCH_CONFIG, tsquery), output_field=FloatField())
+        ).values('rank')
+        return queryset.filter(pk__in=matches.values('product_id')).annotate(search_rank=Subquery(rank))
+
+
+class InvertedIndexSearchBackend:
+    def index(self, documents):
+        product_ids = [document.product_id for document in documents]
+        terms = []
+        for document in documents:
+            weights = {}
+            for field, weight in FIELD_WEIGHTS.items():
+                for token in tokenize(getattr(document, field)):
+                    weights[token] = weights.get(token, 0) + weight
+            terms += [
+                ProductSearchTerm(product_id=document.product_id, term=term, weight=weight)
+                for term, weight in weights.items()
+            ]
+        ProductSearchTerm.objects.filter(product_id__in=product_ids).delete()
+        ProductSearchTerm.objects.bulk_create(terms, batch_size=1000)
+
+    def search(self, queryset, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return no_results(queryset)
+        conditions = [Q(term=token) for token in tokens[:-1]] + [Q(term__startswith=tokens[-1])]
+        # Every query token must match at least one indexed term of the product.
+        matched = {
+            f'matched_{i}': Max(Case(When(condition, then=1), default=0))
+            for i, condition in enumerate(conditions)
+        }
+        matches = (
+            ProductSearchTerm.objects.filter(reduce(or_, conditions))
+            .values('product_id')
+            .annotate(rank=Sum('weight'), **matched)
+            .filter(**{name: 1 for name in matched})
+            .order_by()
+        )
+        rank = matches.filter(product_id=OuterRef('pk')).values('rank')
+        return queryset.filter(pk__in=matches.values('product_id')).annotate(search_rank=Subquery(rank))
+
+
+def get_backend():
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return InvertedIndexSearchBackend()
+
+
+def index_products(product_ids):
+    """Rebuild the search documents (and fallback terms) for the given products."""
+    products = list(Product.objects.filter(pk__in=product_ids).select_related('category'))
+    if not products:
+        return
+    paths = category_paths({product.category_id for product in products})
+    documents = [
+        ProductSearchDocument(
+            product=product,
+            name_text=product.name or '',
+            category_text=paths.get(product.category_id, ''),
+            body_text=product.description or '',
+        )
+        for product in products
+    ]
+    with transaction.atomic():
+        ProductSearchDocument.objects.bulk_create(
+            documents,
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=['name_text', 'category_text', 'body_text', 'updated_at'],
+        )
+        get_backend().index(documents)
+
+
+def schedule_reindex(product_ids):
+    product_ids = list(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: index_products(product_ids))
+
+
+@receiver(post_save, sender=Product)
+def reindex_product_on_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields and not INDEXED_FIELDS.intersection(update_fields):
+        return
+    schedule_reindex([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    # The category path is part of every product document below this category.
+    schedule_reindex(
+        Product.objects.filter(category__ancestor_links__ancestor=instance).values_list('pk', flat=True)
+    )
@@ -1,14 +1,59 @@
 from rest_framework import serializers
+from django.db import transaction
 import uuid
 import json
-from .models import Category, Product, ProductVariant, VariantAttribute, VariantAttributeValue, CartItem, ProductImage
-import logging
+from .models import Category, Product, ProductVariant, VariantAttribute, VariantAttributeValue, CartItem, ProductImage, ImportJob
+from .renditions import renditions, srcset, thumbnail_url
+from .rollups import refresh_rollups
+from core.logs import get_logger, lazy
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 def generate_sku(category):
     return f"{category.name[:3].upper()}-{uuid.uuid4().hex[:4]}"
 
+
+def get_prefetched(obj, name):
+    """Return the prefetched rows for `name` on `obj`, or None if it was not prefetched."""
+    return getattr(obj, '_prefetched_objects_cache', {}).get(name)
+
+
+def get_product_images(product):
+    images = get_prefetched(product, 'images')
+    if images is None:
+        images = product.images.all()
+    return list(images)
+
+
+def get_main_product_image(product):
+    images = get_prefetched(product, 'images')
+    if images is None:
+        return product.images.filter(is_main=True).first()
+    return next((img for img in images if img.is_main), None)
+
+
+class SparseFieldsMixin:
+    """
+    Render only the fields a client asked for. The view passes `fields`
+    (?fields=a,b) and `expand` (?expand=x,y) through the serializer context;
+    without ?fields the serializer renders `default_fields` (None means all),
+    and ?expand adds fields on top of either selection.
+    """
+    default_fields = None
+    # Public field name -> extra fields rendered along with it.
+    linked_fields = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected = self.context.get('fields') or self.default_fields
+        if selected is None:
+            return fields
+        selected = set(selected) | set(self.context.get('expand') or ())
+        for name in list(selected):
+            selected.update(self.linked_fields.get(name, ()))
+        return {name: field for name, field in fields.items() if name in selected}
+
+
 class CategorySerializer(serializers.ModelSerializer):
     parent = serializers.SerializerMethodField()
 
@@ -17,9 +62,25 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'parent']
 
     def get_parent(self, obj):
-        if obj.parent:
-            return CategorySerializer(obj.parent, context=self.context).data
-        return None
+        if not obj.parent_id:
+            return None
+        # Querysets planned with ancestors_prefetch() carry the whole chain;
+        # hand it down so each level resolves without a query.
+        category_map = self.context.get('category_map')
+        chain = getattr(obj, 'ancestor_chain', None)
+        if chain is not None:
+            category_map = {link.ancestor_id: link.ancestor for link in chain}
+        parent = category_map.get(obj.parent_id) if category_map else None
+        if parent is None:
+            parent = obj.parent
+        context = {**self.context, 'category_map': category_map} if category_map else self.context
+        return CategorySerializer(parent, context=context).data
+
+
+class BreadcrumbSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ['id', 'name']
 
 class VariantAttributeValueSerializer(serializers.ModelSerializer):
     attribute = serializers.PrimaryKeyRelatedField(read_only=True)
@@ -45,10 +106,11 @@ class ProductVariantSerializer(serializers.ModelSerializer):
     final_price = serializers.SerializerMethodField()
     original_price = serializers.SerializerMethodField()
     variant_name = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = ProductVariant
-        fields = ['id', 'attributes', 'attributes_ids', 'stock', 'price', 'original_price', 'final_price', 'image', 'sku', 'variant_name']
+        fields = ['id', 'attributes', 'attributes_ids', 'stock', 'price', 'original_price', 'final_price', 'image', 'image_srcset', 'sku', 'variant_name']
 
     def get_final_price(self, obj):
         return obj.product.get_variant_final_price(obj)
@@ -58,12 +120,24 @@ class ProductVariantSerializer(serializers.ModelSerializer):
 
     def get_variant_name(self, obj):
         return " ".join(attr.value for attr in obj.attributes.all())
+
+    def get_image_srcset(self, obj):
+        return srcset(obj.image, self.context.get('request'))
     
 
 class ProductImageSerializer(serializers.ModelSerializer):
+    renditions = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = ProductImage
-        fields = ['id', 'image', 'alt_text', 'is_main']
+        fields = ['id', 'image', 'alt_text', 'is_main', 'renditions', 'srcset']
+
+    def get_renditions(self, obj):
+        return renditions(obj.image, self.context.get('request'))
+
+    def get_srcset(self, obj):
+        return srcset(obj.image, self.context.get('request'))
 
 
 
@@ -77,6 +151,7 @@ class ProductSimpleSerializer(serializers.ModelSerializer):
     - Ready for chat system integration
     """
     thumbnail = serializers.SerializerMethodField()
+    thumbnail_srcset = serializers.SerializerMethodField()
     final_price = serializers.SerializerMethodField()
     original_price = serializers.SerializerMethodField()
 
@@ -86,6 +161,7 @@ class ProductSimpleSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'thumbnail',      # From ProductImage (is_main=True)
+            'thumbnail_srcset',
             'final_price',    # After discounts
             'original_price', # Before discounts
             'unit',           # e.g. 'KG', 'PCS'
@@ -95,17 +171,13 @@ class ProductSimpleSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
     def get_thumbnail(self, obj):
-        """Get URL of the main product image with request-aware absolute URL"""
-        request = self.context.get('request')
-        
-        # Get the first image marked as main (your exact model structure)
-        main_image = obj.images.filter(is_main=True).first()
-        
-        if main_image and main_image.image:
-            if request:
-                return request.build_absolute_uri(main_image.image.url)
-            return main_image.image.url
-        return None
+        """Get URL of the main image's thumbnail rendition with request-aware absolute URL"""
+        main_image = get_main_product_image(obj)
+        return thumbnail_url(main_image.image if main_image else None, self.context.get('request'))
+
+    def get_thumbnail_srcset(self, obj):
+        main_image = get_main_product_image(obj)
+        return srcset(main_image.image if main_image else None, self.context.get('request'))
 
     def get_final_price(self, obj):
         """Use your existing price calculation logic"""
@@ -115,10 +187,10 @@ class ProductSimpleSerializer(serializers.ModelSerializer):
         """Use your existing original price logic"""
         return obj.get_original_price()
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     final_price = serializers.SerializerMethodField()
     original_price = serializers.SerializerMethodField()
-    default_variant = ProductVariantSerializer(read_only=True)
+    default_variant = serializers.SerializerMethodField()
     default_variant_id = serializers.PrimaryKeyRelatedField(    # ✅ add this line
         queryset=ProductVariant.objects.all(),
         source='default_variant',
@@ -134,6 +206,7 @@ class ProductSerializer(serializers.ModelSerializer):
     category = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all())
     category_data = CategorySerializer(source='category', read_only=True)
     average_rating = serializers.FloatField(read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
     certificate_file = serializers.FileField(required=False, allow_null=True)
     certificate_description = serializers.CharField(required=False, allow_blank=True)
     is_verified = serializers.ReadOnlyField()
@@ -143,18 +216,33 @@ class ProductSerializer(serializers.ModelSerializer):
         'id', 'name', 'slug', 'description', 'price', 'stock', 'discount', 'category', 'category_data',
         'unit', 'custom_unit', 'label', 'status', 'has_variants', 'default_variant', 'variants','default_variant_id',
         'sku', 'created_at', 'updated_at', 'final_price', 'original_price',
-        'main_image', 'gallery_images', 'images', 'average_rating','certificate_file', 'certificate_description', 'is_verified',  # ✅ new fields
+        'main_image', 'gallery_images', 'images', 'average_rating', 'rating_count', 'rating_histogram', 'certificate_file', 'certificate_description', 'is_verified',  # ✅ new fields
         ]   
+        read_only_fields = ['rating_count']
         extra_kwargs = {
             'category_data': {'source': 'category'}
         }
 
+    # `category` is rendered from category_data, see to_representation().
+    linked_fields = {'category': ('category_data',)}
+
+    def get_default_variant(self, obj):
+        if not obj.default_variant_id:
+            return None
+        variants = get_prefetched(obj, 'variants')
+        variant = None
+        if variants is not None:
+            variant = next((v for v in variants if v.id == obj.default_variant_id), None)
+        if variant is None:
+            variant = obj.default_variant
+        return ProductVariantSerializer(variant, context=self.context).data if variant else None
+
     def get_main_image(self, obj):
-        main_img = obj.images.filter(is_main=True).first()
+        main_img = get_main_product_image(obj)
         return ProductImageSerializer(main_img, context=self.context).data if main_img else None
 
     def get_gallery_images(self, obj):
-        gallery_imgs = obj.images.filter(is_main=False)
+        gallery_imgs = [img for img in get_product_images(obj) if not img.is_main]
         return ProductImageSerializer(gallery_imgs, many=True, context=self.context).data
 
 
@@ -167,7 +255,7 @@ class ProductSerializer(serializers.ModelSerializer):
         return original_price if original_price is not None else "Price not available"
 
     def to_internal_value(self, data):
-        logger.debug(f"Raw data received: {data}")
+        logger.debug("product.payload_received", keys=lazy(lambda: sorted(data.keys())))
         mutable_data = data.copy() if hasattr(data, 'copy') else data
 
         processed_data = {}
@@ -191,23 +279,23 @@ class ProductSerializer(serializers.ModelSerializer):
                         image_key = f'variants[{i}][image]'
                         if image_key in mutable_data:
                             variant_data['image'] = mutable_data[image_key]
-                            logger.debug(f"Variant {i} image: {variant_data['image']}")
+                            logger.debug("product.variant_image", index=i, name=lazy(lambda: variant_data['image'].name))
                         processed_data['variants'].append(variant_data)
             except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse 'data': {str(e)}")
+                logger.error("product.payload_invalid_json", error=str(e))
                 raise serializers.ValidationError({"data": "Invalid JSON format"})
 
-        logger.debug(f"Processed data: {processed_data}")
+        logger.debug("product.payload_processed", keys=lazy(lambda: sorted(processed_data)))
         try:
             internal_value = super().to_internal_value(processed_data)
-            logger.debug(f"Internal value: {internal_value}")
             return internal_value
         except serializers.ValidationError as e:
-            logger.error(f"Validation error: {e.detail}")
+            logger.error("product.validation_failed", errors=e.detail)
             raise
 
+    @transaction.atomic
     def create(self, validated_data):
-        logger.debug(f"Creating with validated_data: {validated_data}")
+        logger.debug("product.creating", keys=lazy(lambda: sorted(validated_data)))
         request = self.context.get('request')
         variants_data = validated_data.pop('variants', [])
         has_variants = validated_data.get('has_variants', False)
@@ -247,20 +335,17 @@ class ProductSerializer(serializers.ModelSerializer):
                 alt_text=product.name
             )
 
-        logger.debug(f"Product created with ID {product.id}")
-        # ✅ Assign default variant after creating all variants
-        if product.has_variants and not product.default_variant:
-            cheapest = product.variants.order_by("price").first()
-            if cheapest:
-                product.default_variant = cheapest
-                product.save(update_fields=["default_variant"])
+        logger.info("product.created", product_id=product.id)
+        # Stock, price and default variant now, rather than at commit, so the response shows them.
+        refresh_rollups(product)
 
         return product
 
 
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        logger.debug(f"Updating with validated_data: {validated_data}")
+        logger.debug("product.updating", product_id=instance.id, keys=lazy(lambda: sorted(validated_data)))
         request = self.context.get('request')
         variants_data = validated_data.pop('variants', None)
 
@@ -305,9 +390,8 @@ class ProductSerializer(serializers.ModelSerializer):
                         variant.save(update_fields=['image'])
                     variant.attributes.set(attributes)
 
-            for variant_id, variant in existing_variants.items():
-                if variant_id not in updated_variant_ids:
-                    variant.delete()
+            # One delete, so the default_variant references are cleared in one UPDATE.
+            instance.variants.filter(pk__in=existing_variants.keys() - updated_variant_ids).delete()
 
         # 🔥 New Logic: Update uploaded images (optional)
         uploaded_images = request.FILES.getlist('uploaded_images')
@@ -327,13 +411,9 @@ class ProductSerializer(serializers.ModelSerializer):
                     alt_text=instance.name
                 )
 
-        logger.debug(f"Updated instance: {instance}")
+        logger.info("product.updated", product_id=instance.id)
         
-        if instance.has_variants and not instance.default_variant:
-            cheapest = instance.variants.order_by("price").first()
-            if cheapest:
-                instance.default_variant = cheapest
-                instance.save(update_fields=["default_variant"])
+        refresh_rollups(instance)
 
 
         return instance
@@ -342,6 +422,8 @@ class ProductSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
+        if 'category_data' not in self.fields:
+            return representation
         category_data = representation.pop('category_data', None)
         if category_data:
             representation['category'] = category_data
@@ -349,6 +431,32 @@ class ProductSerializer(serializers.ModelSerializer):
             representation['category'] = None
         return representation
 
+
+class ProductCardSerializer(ProductSerializer):
+    """
+    Compact product for grids (?view=card): what a product card shows, with
+    a thumbnail instead of the image list. ?expand= adds any ProductSerializer
+    field, e.g. ?view=card&expand=variants,category.
+    """
+    thumbnail = serializers.SerializerMethodField()
+    thumbnail_srcset = serializers.SerializerMethodField()
+
+    class Meta(ProductSerializer.Meta):
+        fields = ProductSerializer.Meta.fields + ['thumbnail', 'thumbnail_srcset']
+
+    default_fields = [
+        'id', 'name', 'slug', 'thumbnail', 'thumbnail_srcset', 'final_price', 'original_price',
+        'status', 'average_rating', 'rating_count',
+    ]
+
+    def get_thumbnail(self, obj):
+        main_image = get_main_product_image(obj)
+        return thumbnail_url(main_image.image if main_image else None, self.context.get('request'))
+
+    def get_thumbnail_srcset(self, obj):
+        main_image = get_main_product_image(obj)
+        return srcset(main_image.image if main_image else None, self.context.get('request'))
+
 class CartItemSerializer(serializers.ModelSerializer):
     product_id = serializers.PrimaryKeyRelatedField(
         queryset=Product.objects.all(), source='product', write_only=True
@@ -378,4 +486,77 @@ class CartItemSerializer(serializers.ModelSerializer):
         if quantity > available_stock:
             raise serializers.ValidationError(f"Quantity {quantity} exceeds stock {available_stock}.")
         data['product'] = product
-        return data
\ No newline at end of file
+        return data
+
+
+class CartLineSerializer(serializers.Serializer):
+    """One line of a batch add to cart."""
+    product_id = serializers.IntegerField()
+    variant_id = serializers.IntegerField(required=False, allow_null=True)
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
+class CartSummaryItemSerializer(serializers.ModelSerializer):
+    """A cart line for CartItem.objects.with_totals(): a product summary instead of the full product."""
+    product = serializers.SerializerMethodField()
+    variant = serializers.SerializerMethodField()
+    unit_price = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    line_total = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    available = serializers.IntegerField(read_only=True)
+    stock_warning = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CartItem
+        fields = ['id', 'product', 'variant', 'quantity', 'unit_price', 'line_total', 'available', 'stock_warning']
+
+    def get_product(self, obj):
+        main_image = get_main_product_image(obj.product)
+        return {
+            'id': obj.product.id,
+            'name': obj.product.name,
+            'slug': obj.product.slug,
+            'unit': obj.product.unit,
+            'thumbnail': thumbnail_url(main_image.image if main_image else None, self.context.get('request')),
+        }
+
+    def get_variant(self, obj):
+        if obj.variant is None:
+            return None
+        return {
+            'id': obj.variant.id,
+            'sku': obj.variant.sku,
+            'name': " ".join(attr.value for attr in obj.variant.attributes.all()),
+        }
+
+    def get_stock_warning(self, obj):
+        available = obj.available or 0
+        if available <= 0:
+            return 'out_of_stock'
+        if obj.quantity > available:
+            return 'insufficient_stock'
+        return None
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImportJob
+        fields = [
+            'id', 'original_name', 'status', 'rows_processed', 'products_created',
+            'errors', 'error_message', 'created_at', 'started_at', 'finished_at',
+        ]
+        read_only_fields = fields
+
+
+class VariantPatchSerializer(serializers.Serializer):
+    """One line of a bulk variant patch: absolute price/stock, or a relative stock_delta."""
+    sku = serializers.CharField(max_length=100)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    stock = serializers.IntegerField(min_value=0, required=False)
+    stock_delta = serializers.IntegerField(required=False)
+
+    def validate(self, data):
+        if 'stock' in data and 'stock_delta' in data:
+            raise serializers.ValidationError("Send either stock or stock_delta, not both.")
+        if not {'price', 'stock', 'stock_delta'} & data.keys():
+            raise serializers.ValidationError("Nothing to update: send price, stock or stock_delta.")
+        return data
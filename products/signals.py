@@ -0,0 +1,74 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from core.cache import invalidate_tags
+from core.storage import blob_deleted, track_media
+from .models import PLACEHOLDER_IMAGE, Category, Product, ProductImage, ProductVariant
+from .renditions import delete_renditions, schedule_renditions
+from .rollups import mark_dirty, touch
+
+# Product.image shares product_images/ with ProductImage, so both are counted.
+# The import placeholder is shared by name and was never uploaded, so it stays.
+track_media(Product, 'image', keep=[PLACEHOLDER_IMAGE])
+track_media(ProductImage, 'image', keep=[PLACEHOLDER_IMAGE])
+track_media(ProductVariant, 'image')
+
+
+def invalidate_product(product_id, slug=None):
+    """Drop cached catalog responses that include the given product."""
+    if slug is None:
+        slug = Product.objects.filter(pk=product_id).values_list('slug', flat=True).first()
+    tags = ['products', f'product:{product_id}']
+    if slug:
+        tags.append(f'product-slug:{slug}')
+    invalidate_tags(*tags)
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_cached_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_product(instance.pk, instance.slug)
+
+
+@receiver([post_save, post_delete], sender=ProductVariant)
+@receiver([post_save, post_delete], sender=ProductImage)
+def invalidate_cached_product_parts(sender, instance, raw=False, **kwargs):
+    if not raw:
+        touch([instance.product_id])
+
+
+@receiver([post_save, post_delete], sender=ProductVariant)
+def schedule_product_rollup(sender, instance, raw=False, **kwargs):
+    if not raw:
+        mark_dirty([instance.product_id])
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_save, sender=ProductImage)
+def schedule_image_renditions(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'image' not in update_fields):
+        return
+    if instance.image:
+        schedule_renditions(instance.image.name)
+
+
+@receiver(blob_deleted)
+def delete_image_renditions(sender, name, **kwargs):
+    delete_renditions(name)
+
+
+@receiver(m2m_changed, sender=ProductVariant.attributes.through)
+def invalidate_cached_variant_attributes(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        touch(ProductVariant.objects.filter(pk__in=pk_set or []).values_list('product_id', flat=True))
+    else:
+        touch([instance.product_id])
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_cached_categories(sender, instance, raw=False, **kwargs):
+    if not raw:
+        # Product payloads embed the category chain.
+        invalidate_tags('categories', 'products')
@@ -1,3 +1,1292 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import os
+import posixpath
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from reviews.models import Review
+from shipping.models import ShippingMethod
+from core.storage import content_addressed_storage
+from users.models import CustomUser
+
+from products.cart import add_lines
+from products.exporter import product_rows
+from products.importer import ProductImporter, claim_import_job, read_rows, run_import_job
+from products.inventory import InsufficientStock, hold, release_expired
+from products.renditions import generate_renditions, rendition_name, rendition_storage
+from products.models import (
+    CartItem,
+    Category,
+    CategoryClosure,
+    ImportJob,
+    PLACEHOLDER_IMAGE,
+    Product,
+    ProductImage,
+    ProductSearchDocument,
+    ProductVariant,
+    StockReservation,
+    VariantAttribute,
+    VariantAttributeValue,
+)
+from products.search import InvertedIndexSearchBackend, get_backend
+
+
+def make_catalog(count, depth=3):
+    """Create `count` products in a `depth`-level category chain with variants, images and reviews."""
+    parent = None
+    for level in range(depth):
+        parent = Category.objects.create(name=f"Level {level}", parent=parent)
+    category = parent
+
+    size = VariantAttribute.objects.create(name="Size")
+    colour = VariantAttribute.objects.create(name="Colour")
+    values = [
+        VariantAttributeValue.objects.create(attribute=size, value="Small"),
+        VariantAttributeValue.objects.create(attribute=size, value="Large"),
+        VariantAttributeValue.objects.create(attribute=colour, value="Red"),
+    ]
+    reviewer = CustomUser.objects.create_user(username="reviewer", password="pw")
+
+    for i in range(count):
+        product = Product.objects.create(
+            name=f"Product {i}",
+            description="desc",
+            category=category,
+            has_variants=True,
+        )
+        for j in range(3):
+            variant = ProductVariant.objects.create(
+                product=product, stock=5, price=Decimal("10.00") + j
+            )
+            variant.attributes.set(values[:2])
+        ProductImage.objects.create(product=product, image="product_images/a.jpg", is_main=True)
+        ProductImage.objects.create(product=product, image="product_images/b.jpg")
+        Review.objects.create(product=product, user=reviewer, rating=4)
+    return category
+
+
+class ProductQueryBudgetTests(TestCase):
+    """
+    Regression suite for the planned product list/detail: the number of
+    queries must not grow with the number of products on the page.
+    """
+
+    # count, products, category ancestors, images, variants, variant attributes.
+    LIST_QUERY_BUDGET = 6
+    DETAIL_QUERY_BUDGET = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        make_catalog(20)
+
+    def setUp(self):
+        # Measure the uncached path; anonymous reads are otherwise served from the response cache.
+        cache.clear()
+        self.client = APIClient()
+
+    def list_queries(self, page_size):
+        url = reverse('product-list')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {'page_size': page_size})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), page_size)
+        return len(ctx.captured_queries)
+
+    def test_list_page_within_budget(self):
+        for page_size in (1, 5, 20):
+            with self.subTest(page_size=page_size):
+                self.assertLessEqual(self.list_queries(page_size), self.LIST_QUERY_BUDGET)
+
+    def test_list_queries_do_not_scale_with_page_size(self):
+        self.assertEqual(self.list_queries(2), self.list_queries(20))
+
+    def test_detail_within_budget(self):
+        product = Product.objects.first()
+        for url in (
+            reverse('product-detail', kwargs={'slug': product.slug}),
+            reverse('product-by-id', kwargs={'slug': product.slug, 'id': product.id}),
+        ):
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(len(ctx.captured_queries), self.DETAIL_QUERY_BUDGET)
+
+    def test_planned_payload_matches_unplanned(self):
+        from products.serializers import ProductSerializer
+
+        product = Product.objects.first()
+        planned = Product.objects.for_catalog().get(pk=product.pk)
+        self.assertEqual(
+            ProductSerializer(planned).data,
+            ProductSerializer(product).data,
+        )
+        self.assertEqual(planned.average_rating, 4)
+        self.assertEqual(len(ProductSerializer(planned).data['category']['parent']['parent']), 3)
+
+
+class SparseFieldsetTests(TestCase):
+    """?view=card and ?fields= render less and plan fewer queries and columns."""
+
+    CARD_FIELDS = {
+        'id', 'name', 'slug', 'thumbnail', 'thumbnail_srcset', 'final_price', 'original_price',
+        'status', 'average_rating', 'rating_count',
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        make_catalog(5)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def get_list(self, params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('product-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results'], [query['sql'] for query in ctx.captured_queries]
+
+    def test_card_list(self):
+        results, queries = self.get_list({'view': 'card'})
+        self.assertEqual(set(results[0]), self.CARD_FIELDS)
+        self.assertTrue(results[0]['thumbnail'].endswith('product_images/a.jpg'))
+        # count, products, main images.
+        self.assertLessEqual(len(queries), 3)
+        self.assertFalse(any('products_productvariant' in sql for sql in queries))
+        self.assertFalse(any('"products_product"."description"' in sql for sql in queries))
+
+    def test_fields_and_expand(self):
+        results, queries = self.get_list({'fields': 'id,name'})
+        self.assertEqual(set(results[0]), {'id', 'name'})
+        self.assertLessEqual(len(queries), 2)
+
+        results, _ = self.get_list({'view': 'card', 'expand': 'category,variants'})
+        self.assertEqual(set(results[0]), self.CARD_FIELDS | {'category', 'variants'})
+        self.assertEqual(results[0]['category']['name'], 'Level 2')
+        self.assertEqual(len(results[0]['variants']), 3)
+
+    def test_full_payload_unchanged_without_params(self):
+        results, _ = self.get_list({})
+        self.assertIn('description', results[0])
+        self.assertIn('variants', results[0])
+        self.assertIsInstance(results[0]['category'], dict)
+
+
+class CategoryClosureTests(TestCase):
+    """The closure table follows every hierarchy change and matches a rebuild from Category.parent."""
+
+    def setUp(self):
+        cache.clear()
+        self.food = Category.objects.create(name="Food")
+        self.pantry = Category.objects.create(name="Pantry", parent=self.food)
+        self.oils = Category.objects.create(name="Oils", parent=self.pantry)
+        self.drinks = Category.objects.create(name="Drinks")
+
+    def links(self):
+        return set(CategoryClosure.objects.values_list('ancestor__name', 'descendant__name', 'depth'))
+
+    def assertMatchesRebuild(self):
+        links = self.links()
+        CategoryClosure.rebuild()
+        self.assertEqual(self.links(), links)
+
+    def ancestors(self, category):
+        return [ancestor.name for ancestor in category.get_ancestors(include_self=True)]
+
+    def test_moving_a_subtree_relinks_its_descendants(self):
+        self.pantry.parent = self.drinks
+        self.pantry.save()
+        self.assertEqual(self.ancestors(self.oils), ["Drinks", "Pantry", "Oils"])
+        self.assertEqual(list(self.food.get_descendants()), [])
+        self.assertMatchesRebuild()
+
+        self.pantry.parent = None
+        self.pantry.save()
+        self.assertEqual(self.ancestors(self.oils), ["Pantry", "Oils"])
+        self.assertMatchesRebuild()
+
+    def test_cycles_are_rejected(self):
+        for parent in (self.oils, self.food):
+            with self.subTest(parent=parent.name):
+                self.food.parent = parent
+                with self.assertRaises(ValidationError):
+                    self.food.save()
+        self.assertEqual(Category.objects.get(pk=self.food.pk).parent, None)
+
+    def test_deleting_a_category_re_roots_its_children(self):
+        self.pantry.delete()
+        self.oils.refresh_from_db()
+        self.assertIsNone(self.oils.parent)
+        self.assertEqual(self.ancestors(self.oils), ["Oils"])
+        self.assertMatchesRebuild()
+
+    def test_rebuild_command_restores_the_table(self):
+        links = self.links()
+        CategoryClosure.objects.all().delete()
+        call_command('rebuild_category_closure', stdout=io.StringIO())
+        self.assertEqual(self.links(), links)
+
+    def test_breadcrumbs_and_descendants_actions(self):
+        client = APIClient()
+        response = client.get(reverse('category-breadcrumbs', args=[self.oils.pk]))
+        self.assertEqual([row['name'] for row in response.data], ["Food", "Pantry", "Oils"])
+        response = client.get(reverse('category-descendants', args=[self.food.pk]))
+        self.assertEqual(sorted(row['name'] for row in response.data), ["Oils", "Pantry"])
+
+    def test_category_filter_includes_descendants(self):
+        products = {
+            category.name: Product.objects.create(name=f"{category.name} item", description="", category=category, price=1)
+            for category in (self.food, self.oils, self.drinks)
+        }
+        response = APIClient().get(reverse('product-list'), {'category': self.food.pk})
+        self.assertEqual(
+            {row['id'] for row in response.data['results']}, {products["Food"].id, products["Oils"].id}
+        )
+
+
+class ProductRatingTests(TestCase):
+    """Stored rating aggregates follow review writes and can be rebuilt by the backfill command."""
+
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(
+            name="Honey", description="", category=Category.objects.create(name="Pantry"), price=Decimal("4.00"),
+        )
+        self.users = [CustomUser.objects.create_user(username=f"reviewer{i}", password="pw") for i in range(3)]
+
+    def aggregates(self):
+        self.product.refresh_from_db()
+        return self.product.rating_count, self.product.rating_avg, self.product.rating_histogram
+
+    def test_reviews_update_the_aggregates_incrementally(self):
+        review = Review.objects.create(product=self.product, user=self.users[0], rating=5)
+        Review.objects.create(product=self.product, user=self.users[1], rating=2)
+        self.assertEqual(self.aggregates(), (2, 3.5, {1: 0, 2: 1, 3: 0, 4: 0, 5: 1}))
+
+        review.rating = 3
+        review.save()
+        self.assertEqual(self.aggregates(), (2, 2.5, {1: 0, 2: 1, 3: 1, 4: 0, 5: 0}))
+
+        review.delete()
+        self.assertEqual(self.aggregates(), (1, 2.0, {1: 0, 2: 1, 3: 0, 4: 0, 5: 0}))
+
+    def test_backfill_recomputes_the_aggregates(self):
+        for user, rating in zip(self.users, (1, 4, 4)):
+            Review.objects.create(product=self.product, user=user, rating=rating)
+        Product.objects.update(rating_count=0, rating_avg=0, rating_1_count=0, rating_4_count=7)
+
+        call_command('backfill_product_ratings', batch_size=1, stdout=io.StringIO())
+        self.assertEqual(self.aggregates(), (3, 3.0, {1: 1, 2: 0, 3: 0, 4: 2, 5: 0}))
+
+    def test_min_rating_filter(self):
+        Review.objects.create(product=self.product, user=self.users[0], rating=4)
+        Product.objects.create(name="Jam", description="", category=self.product.category, price=Decimal("2.00"))
+        client = APIClient()
+
+        response = client.get(reverse('product-list'), {'min_rating': '3.5'})
+        self.assertEqual([row['id'] for row in response.data['results']], [self.product.id])
+
+        response = client.get(reverse('product-list'), {'min_rating': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('min_rating', response.data)
+
+
+class ProductSearchTests(TestCase):
+    """Search documents follow product and category saves; matches are ranked by where the terms occur."""
+
+    def setUp(self):
+        self.fruit = Category.objects.create(name="Fruit")
+        drinks = Category.objects.create(name="Drinks")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.apple = self.create("Green Apple", "Crisp and sour.", self.fruit)
+            self.juice = self.create("Orange Juice", "Pressed with a hint of apple.", drinks)
+            self.pear = self.create("Pear", "Juicy.", self.fruit)
+
+    def create(self, name, description, category):
+        return Product.objects.create(name=name, description=description, category=category, price=Decimal("1.00"))
+
+    def search(self, query, backend=None):
+        backend = backend or get_backend()
+        return list(backend.search(Product.objects.all(), query).order_by('-search_rank', 'pk'))
+
+    def test_inverted_index_ranks_name_matches_first(self):
+        backend = InvertedIndexSearchBackend()
+        backend.index(list(ProductSearchDocument.objects.all()))
+        self.assertEqual(self.search("apple", backend), [self.apple, self.juice])
+        # The category path is indexed too, below the name.
+        self.assertEqual(self.search("fruit", backend), [self.apple, self.pear])
+        self.assertEqual(self.search("", backend), [])
+
+    def test_inverted_index_prefix_matches_the_last_token(self):
+        backend = InvertedIndexSearchBackend()
+        backend.index(list(ProductSearchDocument.objects.all()))
+        self.assertEqual(self.search("app", backend), [self.apple, self.juice])
+        self.assertEqual(self.search("green app", backend), [self.apple])
+        # Only the last token is a prefix: every other one must match a whole term.
+        self.assertEqual(self.search("gre apple", backend), [])
+
+    def test_product_save_reindexes_it(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pear.name = "Conference Pear"
+            self.pear.save()
+        self.assertEqual(self.search("conference"), [self.pear])
+
+        # Saves that leave the indexed fields alone schedule no reindex.
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.pear.save(update_fields=['stock'])
+        self.assertEqual(callbacks, [])
+
+    def test_category_rename_reindexes_its_products(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fruit.name = "Orchard"
+            self.fruit.save()
+        self.assertEqual(self.search("orchard"), [self.apple, self.pear])
+        self.assertEqual(self.search("fruit"), [])
+
+
+class ProductFacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.pantry = Category.objects.create(name="Pantry")
+        self.oils = Category.objects.create(name="Oils", parent=self.pantry)
+        self.olive = Product.objects.create(
+            name="Olive Oil", description="", category=self.oils, price=Decimal("12.00"), discount=10,
+        )
+        Product.objects.create(name="Rice", description="", category=self.pantry, price=Decimal("3.00"), status='HOT')
+        tea = Product.objects.create(name="Tea", description="", category=self.pantry, has_variants=True)
+        size = VariantAttribute.objects.create(name="Size")
+        small = VariantAttributeValue.objects.create(attribute=size, value="Small")
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductVariant.objects.create(product=tea, stock=3, price=Decimal("6.00")).attributes.set([small])
+
+    def facets(self, params=None):
+        response = self.client.get(reverse('product-facets'), params or {})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_counts_follow_the_filters(self):
+        facets = self.facets()
+        self.assertEqual((facets['total'], facets['on_sale']), (3, 1))
+        self.assertEqual({row['value']: row['count'] for row in facets['status']}['HOT'], 1)
+        self.assertEqual([bucket['count'] for bucket in facets['price']], [1, 1, 1, 0, 0])
+        # Parents count the products of their subcategories.
+        self.assertEqual({row['name']: row['count'] for row in facets['categories']}, {'Oils': 1, 'Pantry': 3})
+        self.assertEqual([(value['value'], value['count']) for value in facets['attributes'][0]['values']], [('Small', 1)])
+
+        facets = self.facets({'category': self.oils.id})
+        self.assertEqual((facets['total'], facets['attributes']), (1, []))
+
+    def test_cached_facets_are_invalidated_by_product_writes(self):
+        self.facets()
+        with CaptureQueriesContext(connection) as ctx:
+            self.facets({'view': 'card', 'fields': 'id', 'page': 2})
+        # Presentation parameters share the entry: nothing is recomputed.
+        self.assertFalse(any('products_categoryclosure' in query['sql'] for query in ctx.captured_queries))
+
+        self.olive.discount = 0
+        self.olive.save()
+        self.assertEqual(self.facets()['on_sale'], 0)
+
+        self.oils.name = "Cooking Oils"
+        self.oils.save()
+        self.assertIn('Cooking Oils', [row['name'] for row in self.facets()['categories']])
+
+
+class ProductPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        category = Category.objects.create(name="Pantry")
+        # Repeated prices, so pages split runs of equal ordering values.
+        self.products = [
+            Product.objects.create(
+                name=f"Item {i}", description="", category=category, price=Decimal(i % 3), stock=1,
+            )
+            for i in range(7)
+        ]
+
+    def get(self, params):
+        response = self.client.get(reverse('product-list'), params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def follow(self, link):
+        response = self.client.get(link)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_cursor_pages_walk_forward_and_back_without_gaps(self):
+        params = {'pagination': 'cursor', 'page_size': 3, 'ordering': 'price', 'view': 'card'}
+        page = self.get(params)
+        self.assertIsNone(page['previous'])
+        pages = [[row['id'] for row in page['results']]]
+        while page['next']:
+            page = self.follow(page['next'])
+            pages.append([row['id'] for row in page['results']])
+
+        expected = [product.id for product in sorted(self.products, key=lambda product: (product.price, product.id))]
+        self.assertEqual(sum(pages, []), expected)
+        self.assertEqual([len(ids) for ids in pages], [3, 3, 1])
+
+        page = self.follow(page['previous'])
+        self.assertEqual([row['id'] for row in page['results']], pages[1])
+        page = self.follow(page['previous'])
+        self.assertEqual([row['id'] for row in page['results']], pages[0])
+
+    def test_invalid_cursors_are_not_found(self):
+        wrong_type = base64.urlsafe_b64encode(json.dumps({'v': 'abc', 'id': 1}).encode()).decode()
+        for ordering, cursor in (('-created_at', 'garbage'), ('-created_at', wrong_type), ('price', wrong_type)):
+            with self.subTest(ordering=ordering, cursor=cursor):
+                response = self.client.get(reverse('product-list'), {'cursor': cursor, 'ordering': ordering})
+                self.assertEqual(response.status_code, 404)
+
+    def test_search_rank_ordering_needs_a_search(self):
+        page = self.get({'pagination': 'cursor', 'ordering': '-search_rank'})
+        self.assertEqual(len(page['results']), 7)
+
+    def test_estimated_count(self):
+        page = self.get({'count': 'estimate', 'page_size': 5})
+        self.assertEqual((page['count'], page['total_pages'], page['count_estimated']), (7, 2, True))
+        self.assertNotIn('count_estimated', self.get({'page_size': 5}))
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Pantry")
+        self.product = Product.objects.create(
+            name="Tea", description="", category=self.category, has_variants=True,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.variant = ProductVariant.objects.create(product=self.product, stock=3, price=Decimal("2.00"))
+        self.urls = [reverse('product-list'), reverse('product-detail', kwargs={'slug': self.product.slug})]
+
+    def cache_status(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response['X-Cache']
+
+    def assertInvalidated(self, write):
+        for url in self.urls:
+            self.client.get(url)
+            self.assertEqual(self.cache_status(url), 'HIT')
+        # Variant and image writes invalidate when their transaction commits.
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.cache_status(url), 'MISS')
+                self.assertEqual(self.cache_status(url), 'HIT')
+
+    def test_anonymous_reads_are_cached(self):
+        for url in self.urls:
+            self.assertEqual(self.cache_status(url), 'MISS')
+            self.assertEqual(self.cache_status(url), 'HIT')
+        self.client.force_authenticate(CustomUser.objects.create_user(username="shopper", password="pw"))
+        self.assertNotIn('X-Cache', self.client.get(self.urls[0]))
+
+    def test_product_write_invalidates(self):
+        self.assertInvalidated(lambda: Product.objects.get(pk=self.product.pk).save())
+
+    def test_variant_write_invalidates(self):
+        self.variant.stock = 1
+        self.assertInvalidated(self.variant.save)
+        self.assertInvalidated(self.variant.delete)
+
+    def test_image_write_invalidates(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        buffer = io.BytesIO()
+        Image.new('RGB', (40, 30), 'green').save(buffer, format='PNG')
+        with override_settings(MEDIA_ROOT=media_root, PRODUCT_IMAGE_RENDITIONS_ASYNC=False):
+            self.assertInvalidated(lambda: ProductImage.objects.create(
+                product=self.product, image=SimpleUploadedFile('a.png', buffer.getvalue()), is_main=True,
+            ))
+
+    def test_category_write_invalidates(self):
+        self.category.name = "Larder"
+        self.assertInvalidated(self.category.save)
+        response = self.client.get(self.urls[1])
+        self.assertEqual(response.data['category']['name'], "Larder")
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.root = Category.objects.create(name="Food")
+        self.category = Category.objects.create(name="Pantry", parent=self.root)
+        self.product = Product.objects.create(
+            name="Rice", description="", category=self.category, price=Decimal("3.00"), stock=10,
+        )
+        self.url = reverse('product-detail', kwargs={'slug': self.product.slug})
+
+    def etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+        return response['ETag']
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.etag()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        by_id = reverse('product-by-id', kwargs={'slug': self.product.slug, 'id': self.product.id})
+        self.assertEqual(self.client.get(by_id, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+        # Another representation of the same product gets its own ETag.
+        self.assertNotEqual(self.client.get(self.url, {'view': 'card'})['ETag'], etag)
+
+    def test_product_write_changes_the_etag(self):
+        etag = self.etag()
+        self.product.price = Decimal("3.50")
+        self.product.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['price'], '3.50')
+
+    def test_ancestor_category_write_changes_the_etag(self):
+        etag = self.etag()
+        self.root.name = "Groceries"
+        self.root.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_category_list_etag(self):
+        response = self.client.get(reverse('category-list'))
+        self.assertEqual(
+            self.client.get(reverse('category-list'), HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304
+        )
+        Category.objects.create(name="Dairy", parent=self.root)
+        self.assertEqual(
+            self.client.get(reverse('category-list'), HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200
+        )
+
+
+class ProductImportTests(TestCase):
+    HEADER = 'name,description,category,price,stock,discount,unit,has_variants,variants\n'
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def upload(self, body):
+        admin = CustomUser.objects.create_superuser(username='admin', password='pw', email='admin@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+        upload = SimpleUploadedFile('products.csv', (self.HEADER + body).encode())
+        response = self.client.post(reverse('bulk-product-upload'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'queued')
+        return response.data['job_id']
+
+    def import_file(self, body):
+        job_id = self.upload(body)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('run_import_jobs', '--once', stdout=io.StringIO())
+        response = self.client.get(reverse('import-job-detail', args=[job_id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'done')
+        return response.data
+
+    def test_import_creates_products_variants_and_rollups(self):
+        Product.objects.create(name='Apple', description='', category=Category.objects.create(name='Fruit'), price=1, stock=1)
+        variants = '"[{""attributes"": [""Size:Small""], ""stock"": 3, ""price"": 4.5}, {""attributes"": [""Size:Large""], ""stock"": 2, ""price"": 3.25}]"'
+        data = self.import_file(
+            f'Apple,,Fruit,,,,KG,true,{variants}\n'
+            'Pear,juicy,Veg,2.50,10,5,PCS,false,\n'
+        )
+        self.assertEqual((data['products_created'], data['rows_processed'], data['errors']), (2, 2, []))
+
+        apple = Product.objects.get(slug='apple-1')
+        self.assertEqual((apple.stock, apple.price), (5, Decimal('3.25')))
+        self.assertEqual(apple.default_variant.price, Decimal('3.25'))
+        self.assertEqual(apple.sku, f'FRU-{apple.id:04d}')
+        self.assertEqual(
+            sorted(apple.variants.values_list('attributes__value', flat=True)), ['Large', 'Small']
+        )
+        self.assertTrue(apple.images.filter(is_main=True).exists())
+
+        pear = Product.objects.get(slug='pear')
+        self.assertEqual(list(pear.category.get_ancestors(include_self=True)), [pear.category])
+        # bulk_create skips signals, so the importer indexes new products itself.
+        self.assertEqual(list(get_backend().search(Product.objects.all(), 'juicy')), [pear])
+
+    def test_row_errors_are_reported_with_row_numbers(self):
+        data = self.import_file(
+            'Good,,Fruit,1,1,,PCS,false,\n'
+            'Bad,,Fruit,abc,1,,PCS,false,\n'
+            ',,Fruit,1,1,,PCS,false,\n'
+            'Broken,,Fruit,,,,PCS,true,{oops\n'
+        )
+        self.assertEqual(data['products_created'], 1)
+        self.assertEqual([error['row_number'] for error in data['errors']], [3, 4, 5])
+        self.assertEqual(data['errors'][2]['error'], "Invalid JSON format in 'variants' field (row 5)")
+
+    def test_interrupted_job_resumes_after_last_committed_chunk(self):
+        job_id = self.upload('One,,Fruit,1,1,,PCS,false,\nTwo,,Fruit,1,1,,PCS,false,\nThree,,Fruit,1,1,,PCS,false,\n')
+        # A worker committed the first chunk, then died; its lease has not run out yet.
+        ImportJob.objects.filter(pk=job_id).update(status='running', rows_processed=2, heartbeat_at=timezone.now())
+        self.assertIsNone(claim_import_job())
+
+        ImportJob.objects.filter(pk=job_id).update(heartbeat_at='2000-01-01T00:00:00Z')
+        with self.captureOnCommitCallbacks(execute=True):
+            job = run_import_job(claim_import_job(), chunk_size=2)
+        self.assertEqual((job.status, job.rows_processed), ('done', 3))
+        self.assertEqual(list(Product.objects.values_list('name', flat=True)), ['Three'])
+
+    def test_jobs_are_visible_only_to_their_owner(self):
+        job_id = self.upload('One,,Fruit,1,1,,PCS,false,\n')
+        other = CustomUser.objects.create_user(username='other', password='pw', email='other@example.com')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(reverse('import-job-detail', args=[job_id])).status_code, 404)
+
+    def test_unsupported_file_type_is_rejected(self):
+        admin = CustomUser.objects.create_superuser(username='admin', password='pw', email='admin@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+        upload = SimpleUploadedFile('products.txt', b'nope')
+        response = self.client.post(reverse('bulk-product-upload'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ImportJob.objects.exists())
+
+    def test_upload_requires_staff(self):
+        shopper = CustomUser.objects.create_user(username='shopper', password='pw', email='shopper@example.com')
+        self.client = APIClient()
+        for user, expected in ((None, 401), (shopper, 403)):
+            self.client.force_authenticate(user)
+            upload = SimpleUploadedFile('products.csv', (self.HEADER + 'One,,Fruit,1,1,,PCS,false,\n').encode())
+            response = self.client.post(reverse('bulk-product-upload'), {'file': upload}, format='multipart')
+            self.assertEqual(response.status_code, expected)
+        self.assertFalse(ImportJob.objects.exists())
+        self.assertEqual(os.listdir(settings.MEDIA_ROOT), [])
+
+
+class ProductExportTests(TestCase):
+    def setUp(self):
+        fruit = Category.objects.create(name='Fruit')
+        Product.objects.create(name='Pear', description='juicy', category=fruit, price=Decimal('2.50'), stock=10)
+        apple = Product.objects.create(name='Apple', description='', category=fruit, has_variants=True)
+        size = VariantAttribute.objects.create(name='Size')
+        for value, stock, price in (('Small', 3, '4.50'), ('Large', 2, '3.25')):
+            variant = ProductVariant.objects.create(product=apple, stock=stock, price=Decimal(price))
+            variant.attributes.set([VariantAttributeValue.objects.create(attribute=size, value=value)])
+        self.client = APIClient()
+        self.client.force_authenticate(
+            CustomUser.objects.create_superuser(username='admin', password='pw', email='admin@example.com')
+        )
+
+    def export(self, *args):
+        response = self.client.get(reverse('product-export'), *args)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_csv_export_uses_the_import_columns(self):
+        rows = list(csv.DictReader(io.StringIO(self.export().decode())))
+        self.assertEqual([row['name'] for row in rows], ['Pear', 'Apple'])
+        self.assertEqual((rows[0]['price'], rows[0]['stock'], rows[0]['has_variants']), ('2.50', '10', 'False'))
+        self.assertEqual(json.loads(rows[1]['variants']), [
+            {'stock': 3, 'price': '4.50', 'attributes': ['Size:Small']},
+            {'stock': 2, 'price': '3.25', 'attributes': ['Size:Large']},
+        ])
+
+    def test_query_count_does_not_grow_with_the_catalog(self):
+        with CaptureQueriesContext(connection) as small:
+            list(product_rows(chunk_size=100))
+        make_catalog(30)
+        with CaptureQueriesContext(connection) as large:
+            list(product_rows(chunk_size=100))
+        self.assertEqual(len(large), len(small))
+
+    def test_xlsx_export_imports_back(self):
+        upload = SimpleUploadedFile('products.xlsx', self.export({'file_type': 'xlsx'}))
+        importer = ProductImporter().run(read_rows(upload))
+        self.assertEqual((importer.created, importer.errors), (2, []))
+        copy = Product.objects.get(slug='apple-1')
+        self.assertEqual((copy.stock, copy.price), (5, Decimal('3.25')))
+        self.assertEqual(Product.objects.get(slug='pear-1').price, Decimal('2.50'))
+
+    def test_unknown_file_type_is_rejected(self):
+        response = self.client.get(reverse('product-export'), {'file_type': 'pdf'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_requires_staff(self):
+        shopper = CustomUser.objects.create_user(username='shopper', password='pw', email='shopper@example.com')
+        for user, expected in ((None, 401), (shopper, 403)):
+            self.client.force_authenticate(user)
+            self.assertEqual(self.client.get(reverse('product-export')).status_code, expected)
+
+
+class VariantRollupTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(
+            name="Tea", description="", category=Category.objects.create(name="Drinks"), has_variants=True,
+        )
+
+    def test_variant_writes_roll_up_once_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            variants = [
+                ProductVariant.objects.create(product=self.product, stock=2, price=Decimal("20.00") - i)
+                for i in range(12)
+            ]
+            for variant in variants:
+                variant.stock += 1
+                variant.save()
+            self.product.refresh_from_db()
+            self.assertIsNone(self.product.stock)
+
+        self.assertEqual(len(callbacks), 1)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.price), (36, Decimal("9.00")))
+        self.assertEqual(self.product.default_variant, variants[-1])
+
+    def test_deleting_default_variant_picks_the_cheapest_remaining(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            cheap = ProductVariant.objects.create(product=self.product, stock=1, price=Decimal("1.00"))
+            ProductVariant.objects.create(product=self.product, stock=4, price=Decimal("3.00"))
+            ProductVariant.objects.create(product=self.product, stock=5, price=Decimal("2.00"))
+        with self.captureOnCommitCallbacks(execute=True):
+            cheap.delete()
+
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.price), (9, Decimal("2.00")))
+        self.assertEqual(self.product.default_variant.price, Decimal("2.00"))
+
+
+class ProductWriteTransactionTests(TransactionTestCase):
+    """Runs without the test-case transaction, the way requests reach the view."""
+
+    def setUp(self):
+        self.product = Product.objects.create(
+            name="Tea", description="", category=Category.objects.create(name="Drinks"), has_variants=True,
+        )
+        size = VariantAttribute.objects.create(name="Size")
+        self.sizes = [VariantAttributeValue.objects.create(attribute=size, value=f"{grams}g") for grams in (50, 100, 250, 500)]
+        for i, value in enumerate(self.sizes):
+            variant = ProductVariant.objects.create(product=self.product, stock=1, price=Decimal("9.00") + i)
+            variant.attributes.set([value])
+        self.client = APIClient()
+
+    def test_editing_variants_rolls_up_once(self):
+        variants = [
+            {'stock': 2, 'price': str(Decimal("5.00") + i), 'attributes': [value.pk]}
+            for i, value in enumerate(self.sizes)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                reverse('product-detail', kwargs={'slug': self.product.slug}),
+                {'data': json.dumps({'variants': variants})},
+                format='multipart',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['stock'], response.data['price']), (8, '5.00'))
+        product_updates = [query for query in queries if query['sql'].startswith('UPDATE "products_product"')]
+        # The product itself, default_variant cleared for the replaced variants, and the rollup.
+        self.assertEqual(len(product_updates), 3, [query['sql'] for query in product_updates])
+
+
+class BulkVariantPatchTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(
+            name="Tea", description="", category=Category.objects.create(name="Drinks"), has_variants=True,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.variants = [
+                ProductVariant.objects.create(product=self.product, stock=5, price=Decimal("4.00") + i)
+                for i in range(3)
+            ]
+        self.client = APIClient()
+
+    def patch(self, changes):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(reverse('productvariant-bulk'), changes, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_changes_apply_in_one_update_and_one_rollup(self):
+        first, second, third = (variant.sku for variant in self.variants)
+        with CaptureQueriesContext(connection) as queries:
+            data = self.patch([
+                {'sku': first, 'price': '1.50'},
+                {'sku': second, 'stock': 20},
+                {'sku': third, 'stock_delta': -2, 'price': '9.00'},
+            ])
+        self.assertEqual(data['updated'], 3)
+        self.assertEqual(
+            [(result['status'], result['stock'], result['price']) for result in data['results']],
+            [('updated', 5, '1.50'), ('updated', 20, '5.00'), ('updated', 3, '9.00')],
+        )
+        updates = [query for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)  # the variants, then the product rollup
+
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.price), (28, Decimal("1.50")))
+
+    def test_each_sku_gets_its_own_result(self):
+        first, second, _ = (variant.sku for variant in self.variants)
+        data = self.patch([
+            {'sku': first, 'stock_delta': -6},
+            {'sku': 'NOPE'},
+            {'sku': 'MISSING', 'stock': 1},
+            {'sku': second, 'stock': 1, 'stock_delta': 1},
+            {'sku': second, 'stock_delta': 3},
+        ])
+        self.assertEqual(
+            [result['status'] for result in data['results']],
+            ['insufficient_stock', 'invalid', 'not_found', 'invalid', 'updated'],
+        )
+        self.assertEqual(data['updated'], 1)
+        stocks = dict(ProductVariant.objects.values_list('sku', 'stock'))
+        self.assertEqual((stocks[first], stocks[second]), (5, 8))
+
+
+class SlugAndSkuAllocationTests(TestCase):
+    def test_colliding_names_take_the_next_free_suffix_in_one_lookup(self):
+        category = Category.objects.create(name="Vegetables")
+        for _ in range(5):
+            Product.objects.create(name="Tomato", description="", category=category, price=1, stock=1)
+
+        with CaptureQueriesContext(connection) as queries:
+            product = Product.objects.create(name="Tomato", description="", category=category, price=1, stock=1)
+
+        self.assertEqual(product.slug, "tomato-5")
+        self.assertEqual(Product.objects.get(pk=product.pk).sku, f"VEG-{product.pk:04d}")
+        slug_lookups = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('SELECT "products_product"."slug"')
+        ]
+        self.assertEqual(len(slug_lookups), 1)
+
+
+class CartSummaryTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Pantry")
+        self.user = CustomUser.objects.create_user(username="buyer", password="pw", email="buyer@example.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_lines(self, count):
+        for i in range(count):
+            product = Product.objects.create(name=f"Jar {i}", description="", category=self.category, price=2, stock=9)
+            CartItem.objects.create(user=self.user, product=product, quantity=1)
+
+    def summary(self):
+        response = self.client.get(reverse('cart-summary'))
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_totals_and_stock_warnings(self):
+        rice = Product.objects.create(name="Rice", description="", category=self.category, price=Decimal("2.50"), stock=3)
+        tea = Product.objects.create(name="Tea", description="", category=self.category, has_variants=True)
+        size = VariantAttribute.objects.create(name="Size")
+        small = ProductVariant.objects.create(product=tea, stock=4, price=Decimal("1.25"))
+        small.attributes.set([VariantAttributeValue.objects.create(attribute=size, value="Small")])
+        CartItem.objects.create(user=self.user, product=rice, quantity=2)
+        CartItem.objects.create(user=self.user, product=tea, variant=small, quantity=4)
+        # Stock sold elsewhere after the lines were added.
+        Product.objects.filter(pk=rice.pk).update(stock=1)
+
+        data = self.summary()
+        self.assertEqual((data['subtotal'], data['item_count'], data['has_stock_warnings']), ('10.00', 6, True))
+        first, second = data['items']
+        self.assertEqual((first['line_total'], first['available'], first['stock_warning']), ('5.00', 1, 'insufficient_stock'))
+        self.assertEqual((second['unit_price'], second['variant']['name'], second['stock_warning']), ('1.25', 'Small', None))
+        self.assertEqual(second['product']['name'], 'Tea')
+
+    def test_query_count_is_fixed(self):
+        self.add_lines(2)
+        with CaptureQueriesContext(connection) as small:
+            self.summary()
+        self.add_lines(10)
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(self.summary()['subtotal'], '24.00')
+        self.assertEqual(len(large), len(small))
+
+    def test_empty_cart(self):
+        self.assertEqual(self.summary(), {'items': [], 'item_count': 0, 'subtotal': '0.00', 'has_stock_warnings': False})
+
+
+class CartUpsertTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Pantry")
+        self.user = CustomUser.objects.create_user(username="buyer", password="pw", email="buyer@example.com")
+        self.rice = Product.objects.create(name="Rice", description="", category=category, price=5, stock=6)
+        self.tea = Product.objects.create(name="Tea", description="", category=category, has_variants=True)
+        self.small = ProductVariant.objects.create(product=self.tea, stock=4, price=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_repeated_add_increments_the_line(self):
+        for _ in range(2):
+            response = self.client.post(reverse('cart-list'), {'product_id': self.rice.id, 'quantity': 2}, format='json')
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(list(CartItem.objects.values_list('quantity', flat=True)), [4])
+
+    def test_batch_adds_and_increments_in_fixed_statements(self):
+        CartItem.objects.create(user=self.user, product=self.rice, quantity=1)
+        with CaptureQueriesContext(connection) as queries:
+            add_lines(self.user, {(self.rice.id, None): 2, (self.tea.id, self.small.id): 3})
+        writes = [query for query in queries if query['sql'].startswith(('UPDATE', 'INSERT'))]
+        self.assertEqual(len(writes), 2)
+        self.assertEqual(
+            dict(CartItem.objects.values_list('product_id', 'quantity')), {self.rice.id: 3, self.tea.id: 3}
+        )
+
+    def test_batch_endpoint_returns_the_summary(self):
+        response = self.client.post(reverse('cart-batch'), [
+            {'product_id': self.rice.id, 'quantity': 2},
+            {'product_id': self.tea.id, 'variant_id': self.small.id},
+            {'product_id': self.rice.id},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['item_count'], response.data['subtotal']), (4, '17.00'))
+
+    def test_invalid_batch_adds_nothing(self):
+        response = self.client.post(reverse('cart-batch'), [
+            {'product_id': self.rice.id, 'quantity': 2},
+            {'product_id': self.rice.id, 'variant_id': self.small.id},
+            {'product_id': self.tea.id, 'variant_id': self.small.id, 'quantity': 5},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([item['product_id'] for item in response.data['items']], [self.rice.id, self.tea.id])
+        self.assertEqual(response.data['items'][1]['available'], 4)
+        self.assertFalse(CartItem.objects.exists())
+
+
+class GuestCartTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Pantry")
+        self.rice = Product.objects.create(name="Rice", description="", category=category, price=Decimal("2.50"), stock=6)
+        self.tea = Product.objects.create(name="Tea", description="", category=category, has_variants=True)
+        self.small = ProductVariant.objects.create(product=self.tea, stock=4, price=2)
+        self.user = CustomUser.objects.create_user(username="buyer", password="pw", email="buyer@example.com")
+        self.client = APIClient()
+
+    def add(self, lines):
+        response = self.client.post(reverse('guest-cart'), lines, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_guest_cart_lives_in_a_signed_cookie(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.add([{'product_id': self.rice.id, 'quantity': 2}, {'product_id': self.tea.id, 'variant_id': self.small.id}])
+            data = self.client.get(reverse('guest-cart')).data
+        self.assertEqual((data['item_count'], data['subtotal']), (3, '7.00'))
+        self.assertEqual(len(queries), 2)  # one catalog query per request, no writes
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_tampered_cookie_reads_as_empty(self):
+        self.add([{'product_id': self.rice.id}])
+        self.client.cookies['guest_cart'] = self.client.cookies['guest_cart'].value[:-2] + 'xx'
+        self.assertEqual(self.client.get(reverse('guest-cart')).data['items'], [])
+
+    def test_unsellable_lines_are_dropped_and_quantities_cut_to_stock(self):
+        data = self.add([
+            {'product_id': self.rice.id, 'quantity': 9},
+            {'product_id': self.tea.id},
+            {'product_id': 999},
+        ]).data
+        self.assertEqual([(item['product']['id'], item['quantity']) for item in data['items']], [(self.rice.id, 6)])
+
+    def test_login_merges_the_guest_cart(self):
+        CartItem.objects.create(user=self.user, product=self.rice, quantity=5)
+        self.add([{'product_id': self.rice.id, 'quantity': 3}, {'product_id': self.tea.id, 'variant_id': self.small.id}])
+
+        response = self.client.post(reverse('login'), {'username': 'buyer', 'password': 'pw'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cookies['guest_cart'].value, '')
+        self.assertEqual(
+            dict(CartItem.objects.filter(user=self.user).values_list('product_id', 'quantity')),
+            {self.rice.id: 6, self.tea.id: 1},
+        )
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Pantry")
+        self.user = CustomUser.objects.create_user(username="buyer", password="pw", email="buyer@example.com")
+        self.rice = Product.objects.create(name="Rice", description="", category=category, price=5, stock=3)
+        self.tea = Product.objects.create(name="Tea", description="", category=category, has_variants=True)
+        self.small = ProductVariant.objects.create(product=self.tea, stock=4, price=2)
+
+    def stock(self):
+        self.rice.refresh_from_db()
+        self.small.refresh_from_db()
+        return self.rice.stock, self.small.stock
+
+    def test_hold_takes_stock_once_and_only_the_difference_on_rehold(self):
+        with CaptureQueriesContext(connection) as queries:
+            hold(self.user, {(self.rice.id, None): 2, (self.tea.id, self.small.id): 1})
+        stock_updates = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(stock_updates), 2)
+        self.assertEqual(self.stock(), (1, 3))
+
+        hold(self.user, {(self.rice.id, None): 1, (self.tea.id, self.small.id): 1})
+        self.assertEqual(self.stock(), (2, 3))
+        self.assertEqual(StockReservation.objects.filter(user=self.user).count(), 2)
+
+    def test_short_line_takes_nothing(self):
+        with self.assertRaises(InsufficientStock) as raised:
+            hold(self.user, {(self.rice.id, None): 2, (self.tea.id, self.small.id): 5})
+        self.assertEqual(raised.exception.items[0]['available'], 4)
+        self.assertEqual(self.stock(), (3, 4))
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_expired_holds_are_given_back(self):
+        hold(self.user, {(self.rice.id, None): 3}, ttl=timedelta(minutes=5))
+        self.assertEqual(release_expired(), 0)
+        self.assertEqual(release_expired(now=timezone.now() + timedelta(minutes=6)), 1)
+        self.assertEqual(self.stock(), (3, 4))
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_hold_refreshes_cached_and_conditional_reads(self):
+        cache.clear()
+        client = APIClient()
+        url = reverse('product-detail', kwargs={'slug': self.rice.slug})
+        etag = client.get(url)['ETag']
+        self.assertEqual(client.get(url)['X-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            hold(self.user, {(self.rice.id, None): 2})
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response['X-Cache'], response.data['stock']), ('MISS', 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            release_expired(now=timezone.now() + timedelta(days=1))
+        self.assertEqual(client.get(url).data['stock'], 3)
+
+    def test_checkout_commits_the_holds(self):
+        shipping = ShippingMethod.objects.create(name="Standard", price=0)
+        CartItem.objects.create(user=self.user, product=self.rice, quantity=2)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.post(reverse('cart-reserve')).status_code, 200)
+
+        response = client.post(reverse('checkout'), {
+            'payment_method': 'cod',
+            'shipping': {
+                'address_line_1': '1 Main St', 'city': 'Town', 'state': 'ST', 'postal_code': '1000',
+                'country': 'BD', 'phone': '123', 'shipping_method_id': shipping.id,
+            },
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(self.stock(), (1, 4))
+        self.assertFalse(StockReservation.objects.exists())
+
+
+class ArchiveAndPurgeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = make_catalog(3)
+        self.admin = CustomUser.objects.create_superuser(username='admin', password='pw', email='admin@example.com')
+        self.client = APIClient()
+
+    def test_bulk_delete_archives_and_hides_products(self):
+        doomed = list(Product.objects.order_by('pk').values_list('pk', flat=True)[:2])
+        self.client.force_authenticate(self.admin)
+        response = self.client.delete(reverse('bulk-delete-products'), {'ids': doomed}, format='json')
+        self.assertEqual(response.data, {'deleted': 2})
+
+        self.client.force_authenticate(None)
+        listed = self.client.get(reverse('product-list')).data['results']
+        self.assertEqual(len(listed), 1)
+        self.assertEqual(self.client.get(reverse('product-detail', args=[doomed[0]])).status_code, 404)
+        self.assertEqual(Product.all_objects.count(), 3)
+
+    def test_purge_deletes_archived_products_in_batches_without_signals(self):
+        Product.objects.update(is_archived=True, archived_at=timezone.now())
+        out = io.StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('purge_archived_products', '--batch-size', '2', stdout=out)
+
+        self.assertIn("Done: 3 products purged.", out.getvalue())
+        self.assertFalse(Product.all_objects.exists())
+        self.assertFalse(ProductVariant.objects.exists())
+        self.assertFalse(Review.objects.exists())
+        # Two batches, each a fixed number of statements however many rows they touch.
+        self.assertLess(len(queries), 60)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), PRODUCT_IMAGE_RENDITIONS_ASYNC=False)
+class ImageRenditionTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        # Every test uploads the same bytes, so they share one original and its renditions.
+        shutil.rmtree(os.path.join(settings.MEDIA_ROOT, 'renditions'), ignore_errors=True)
+        buffer = io.BytesIO()
+        Image.new('RGBA', (800, 600), (200, 30, 30, 128)).save(buffer, format='PNG')
+        product = Product.objects.create(
+            name="Chilli", description="", category=Category.objects.create(name="Spice"), price=1, stock=1,
+        )
+        self.image = ProductImage.objects.create(
+            product=product, is_main=True, image=SimpleUploadedFile('chilli.png', buffer.getvalue()),
+        )
+
+    def test_generate_renditions_writes_each_width_and_format_once(self):
+        self.assertEqual(generate_renditions(self.image.image.name), 8)
+        self.assertEqual(generate_renditions(self.image.image.name), 0)
+
+    def test_card_thumbnail_is_generated_on_first_request(self):
+        card = APIClient().get(reverse('product-list'), {'view': 'card'}).data['results'][0]
+        self.assertIn(' 640w', card['thumbnail_srcset']['webp'])
+
+        response = self.client.get(card['thumbnail'])
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        thumbnail = Image.open(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(thumbnail.size, (320, 240))
+        self.assertEqual(thumbnail.mode, 'RGB')
+
+    def test_saving_an_image_renders_it_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.image.save()
+        self.assertTrue(rendition_storage().exists(rendition_name(self.image.image.name, 160, 'webp')))
+        self.assertEqual(generate_renditions(self.image.image.name), 0)
+
+    def test_unknown_widths_are_not_rendered(self):
+        url = reverse('product-image-rendition', kwargs={'width': 333, 'fmt': 'webp', 'name': self.image.image.name})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), PRODUCT_IMAGE_RENDITIONS_ASYNC=False, MEDIA_BLOB_GRACE_PERIOD=0)
+class ContentAddressedMediaTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.storage = content_addressed_storage()
+        self.category = Category.objects.create(name="Bakery")
+        self.products = [
+            Product.objects.create(name=name, description="", category=self.category, price=1, stock=1)
+            for name in ("Bread", "Bagel")
+        ]
+
+    def upload(self, name, color):
+        buffer = io.BytesIO()
+        Image.new('RGB', (40, 30), color).save(buffer, format='PNG')
+        return SimpleUploadedFile(name, buffer.getvalue())
+
+    def test_duplicate_uploads_share_one_blob(self):
+        first = ProductImage.objects.create(product=self.products[0], image=self.upload('bread.PNG', 'tan'))
+        second = ProductImage.objects.create(product=self.products[1], image=self.upload('copy.png', 'tan'))
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^product_images/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        blob_dir = self.storage.path(posixpath.dirname(first.image.name))
+        self.assertEqual(len(os.listdir(blob_dir)), 1)
+
+    def test_blob_is_deleted_with_its_last_reference(self):
+        images = [
+            ProductImage.objects.create(product=product, image=self.upload('bread.png', 'tan'))
+            for product in self.products
+        ]
+        name = images[0].image.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            images[0].delete()
+        self.assertTrue(self.storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            images[1].delete()
+        self.assertFalse(self.storage.exists(name))
+
+    def test_replacing_a_variant_image_releases_the_old_blob(self):
+        variant = ProductVariant.objects.create(
+            product=self.products[0], price=2, stock=1, image=self.upload('loaf.png', 'brown'),
+        )
+        old = variant.image.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            variant.image = self.upload('loaf.png', 'white')
+            variant.save()
+        self.assertNotEqual(variant.image.name, old)
+        self.assertTrue(self.storage.exists(variant.image.name))
+        self.assertFalse(self.storage.exists(old))
+
+    def test_other_uploads_keep_the_default_storage(self):
+        job = ImportJob.objects.create(file=SimpleUploadedFile('catalog.csv', b'name\n'), original_name='catalog.csv')
+        self.assertEqual(job.file.name, 'product_imports/catalog.csv')
+
+    def test_placeholder_is_never_deleted(self):
+        default_storage.save(PLACEHOLDER_IMAGE, ContentFile(b'placeholder'))
+        placeholder = ProductImage.objects.create(product=self.products[0], image=PLACEHOLDER_IMAGE, is_main=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            placeholder.delete()
+        self.assertTrue(self.storage.exists(PLACEHOLDER_IMAGE))
+
+    @override_settings(MEDIA_BLOB_GRACE_PERIOD=60)
+    def test_blob_uploaded_again_is_kept_for_the_new_row(self):
+        image = ProductImage.objects.create(product=self.products[0], image=self.upload('bread.png', 'tan'))
+        os.utime(self.storage.path(image.image.name), (0, 0))
+        # The same bytes, uploaded for a row whose transaction has not committed yet.
+        self.assertEqual(self.storage.save('product_images/copy.png', self.upload('copy.png', 'tan')), image.image.name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+        self.assertTrue(self.storage.exists(image.image.name))
+
+    def test_renditions_are_deleted_with_their_blob(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = ProductImage.objects.create(product=self.products[0], image=self.upload('bread.png', 'tan'))
+        rendition = rendition_name(image.image.name, 160, 'webp')
+        self.assertTrue(rendition_storage().exists(rendition))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+        self.assertFalse(self.storage.exists(image.image.name))
+        self.assertFalse(rendition_storage().exists(rendition))
+
+    @override_settings(MEDIA_BLOB_GRACE_PERIOD=60)
+    def test_purge_deletes_blobs_orphaned_past_the_grace_period(self):
+        kept = ProductImage.objects.create(product=self.products[0], image=self.upload('bread.png', 'tan'))
+        with self.captureOnCommitCallbacks(execute=True):
+            replaced = ProductImage.objects.create(product=self.products[1], image=self.upload('bagel.png', 'gold'))
+        # Replaced within the grace period, so collect() left the blob and its renditions behind.
+        with self.captureOnCommitCallbacks(execute=True):
+            replaced.delete()
+        orphan = replaced.image.name
+        self.assertTrue(self.storage.exists(orphan))
+
+        out = io.StringIO()
+        call_command('purge_orphan_media', stdout=out)
+        self.assertIn("Done: 0 media blobs purged.", out.getvalue())
+
+        for name in (kept.image.name, orphan):
+            os.utime(self.storage.path(name), (0, 0))
+        call_command('purge_orphan_media', '--batch-size', '1', stdout=out)
+        self.assertIn("Done: 1 media blobs purged.", out.getvalue())
+        self.assertTrue(self.storage.exists(kept.image.name))
+        self.assertFalse(self.storage.exists(orphan))
+        self.assertFalse(rendition_storage().exists(rendition_name(orphan, 160, 'webp')))
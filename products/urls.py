@@ -8,7 +8,11 @@ from .views import (
     VariantAttributeValueViewSet,
     CartViewSet,
     BulkDeleteProductsView,
-    BulkProductUploadView  
+    BulkProductUploadView,
+    ProductExportView,
+    GuestCartView,
+    ImportJobViewSet,
+    product_image_rendition,
 )
 
 router = DefaultRouter()
@@ -18,9 +22,13 @@ router.register(r'variants', ProductVariantViewSet)
 router.register(r'variant-attributes', VariantAttributeViewSet)
 router.register(r'variant-attribute-values', VariantAttributeValueViewSet)
 router.register(r'cart', CartViewSet, basename='cart')
+router.register(r'import-jobs', ImportJobViewSet, basename='import-job')
 
 urlpatterns = [
     path('', include(router.urls)),
     path("bulk-delete/", BulkDeleteProductsView.as_view(), name="bulk-delete-products"),
     path('bulk-upload/', BulkProductUploadView.as_view(), name='bulk-product-upload'),
+    path('export/', ProductExportView.as_view(), name='product-export'),
+    path('guest-cart/', GuestCartView.as_view(), name='guest-cart'),
+    path('renditions/<int:width>/<str:fmt>/<path:name>', product_image_rendition, name='product-image-rendition'),
 ]
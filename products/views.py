@@ -1,48 +1,172 @@
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
 from rest_framework import viewsets
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny, SAFE_METHODS
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from .permissions import IsCustomerOnly
 from rest_framework import filters
-import pandas as pd
-import json
-from django.db import transaction
-from django.db.models import Q
-from django.http import Http404
-from .pagination import CustomProductPagination
-
-from .models import Category, Product, ProductVariant, VariantAttribute, VariantAttributeValue, CartItem, ProductImage
+from django.db.models import Count, Max
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from django.urls import reverse
+from .pagination import CustomProductPagination, ProductCursorPagination
+from .search import get_backend as get_search_backend
+from .facets import get_facets
+from .archive import archive_products
+from .bulk_updates import MAX_ITEMS as BULK_PATCH_MAX_ITEMS, patch_variants
+from . import guest_cart
+from .cart import InvalidCartLines, add_lines
+from .exporter import FILE_TYPES, export_stream
+from .importer import UnsupportedFileType, check_file_type
+from .inventory import InsufficientStock, cart_lines, hold
+from .renditions import FORMATS, InvalidRendition, get_rendition, rendition_storage
+from core.cache import CachedResponseMixin
+from core.conditional import ConditionalGetMixin, latest_change
+
+from .models import Category, Product, ProductVariant, VariantAttribute, VariantAttributeValue, CartItem, ImportJob
 from .serializers import (
     CategorySerializer,
+    BreadcrumbSerializer,
     ProductSerializer,
+    ProductCardSerializer,
     ProductVariantSerializer,
     VariantAttributeSerializer,
     VariantAttributeValueSerializer,
-    CartItemSerializer
+    CartItemSerializer,
+    CartLineSerializer,
+    CartSummaryItemSerializer,
+    ImportJobSerializer,
+    VariantPatchSerializer,
 )
 
-import logging
-logger = logging.getLogger(__name__)
+from core.logs import get_logger, lazy
+logger = get_logger(__name__)
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ConditionalGetMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    cache_namespace = 'categories'
+
+    def get_validators(self):
+        if self.action == 'list':
+            return latest_change(Category.objects.all())
+        return None
 
-class ProductViewSet(viewsets.ModelViewSet):
+    def get_queryset(self):
+        return Category.objects.with_ancestors()
+
+    @action(detail=True, methods=['get'])
+    def breadcrumbs(self, request, pk=None):
+        category = self.get_object()
+        ancestors = category.get_ancestors(include_self=True)
+        return Response(BreadcrumbSerializer(ancestors, many=True).data)
+
+    @action(detail=True, methods=['get'])
+    def descendants(self, request, pk=None):
+        category = self.get_object()
+        descendants = category.get_descendants().with_ancestors()
+        return Response(CategorySerializer(descendants, many=True).data)
+
+class ProductOrderingFilter(filters.OrderingFilter):
+    """Order search results by relevance unless the client asks for another ordering."""
+
+    def get_default_ordering(self, view):
+        ordering = super().get_default_ordering(view)
+        if view.request.query_params.get('search'):
+            return ['-search_rank', *(ordering or [])]
+        return ordering
+
+
+def decimal_param(params, name):
+    """A numeric query parameter as a Decimal, None when absent; 400 when it is not a number."""
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        number = None
+    if number is None or not number.is_finite():
+        raise ValidationError({name: "A valid number is required."})
+    return number
+
+
+class ProductViewSet(ConditionalGetMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     pagination_class = CustomProductPagination 
     permission_classes = [AllowAny]
     parser_classes = (MultiPartParser, FormParser, JSONParser)
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ['name', 'description', 'category__name']
-    ordering_fields = ['price', 'created_at']
+    filter_backends = [ProductOrderingFilter]
+    ordering_fields = ['price', 'created_at', 'rating_avg', 'rating_count']
     ordering = ['-created_at']
     lookup_field = 'slug'  # Default is slug, but we'll support ID too
+    # Actions that serialize full products and therefore get the planned queryset.
+    planned_actions = ('list', 'retrieve', 'retrieve_by_id')
+    cache_namespace = 'products'
+
+    @property
+    def paginator(self):
+        """
+        Page-number pagination (with its exact count) stays the default for
+        the admin UI; ?pagination=cursor switches to keyset pagination.
+        """
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if params.get('pagination') == 'cursor' or 'cursor' in params:
+                self._paginator = ProductCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_response_cache_tags(self):
+        # Product payloads embed the category chain, so every entry also depends on it.
+        if self.action == 'retrieve_by_id':
+            return [f"product:{self.kwargs['id']}", 'categories']
+        if self.action == 'retrieve':
+            lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+            tags = [f'product-slug:{lookup}', 'categories']
+            if lookup.isdigit():
+                tags.append(f'product:{lookup}')
+            return tags
+        return ['products', 'categories']
+
+    def get_validators(self):
+        """
+        Validate product detail from the product's updated_at (bumped by
+        variant, image and rating writes) and its category chain, in one
+        query that never loads the payload.
+        """
+        if self.action == 'retrieve_by_id':
+            lookups = [{'pk': self.kwargs['id']}]
+        elif self.action == 'retrieve':
+            lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+            lookups = [{'slug': lookup}]
+            if lookup.isdigit():
+                lookups.append({'pk': lookup})
+        else:
+            return None
+
+        for lookup in lookups:
+            row = (
+                Product.objects.filter(**lookup)
+                .values('pk', 'updated_at')
+                .annotate(
+                    category_updated=Max('category__ancestor_links__ancestor__updated_at'),
+                    category_depth=Count('category__ancestor_links'),
+                )
+                .first()
+            )
+            if row:
+                last_modified = max(filter(None, [row['updated_at'], row['category_updated']]))
+                return list(row.values()), last_modified
+        return None
 
     def get_object(self):
         """
@@ -66,73 +190,101 @@ class ProductViewSet(viewsets.ModelViewSet):
                     raise Http404(f"No Product matches the given query (ID: {pk}).")
             raise  # Re-raise if not numeric or still not found
 
+    def get_serializer_class(self):
+        if self.action in self.planned_actions and self.request.query_params.get('view') == 'card':
+            return ProductCardSerializer
+        return super().get_serializer_class()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        # Sparse fieldsets only shape reads; writes always get the full serializer.
+        if self.request.method in SAFE_METHODS:
+            for param in ('fields', 'expand'):
+                names = [name.strip() for name in self.request.query_params.get(param, '').split(',')]
+                if any(names):
+                    context[param] = [name for name in names if name]
+        return context
+
+    def get_rendered_fields(self):
+        """Serializer fields a sparse read renders, or None when it renders them all."""
+        if self.request.method not in SAFE_METHODS:
+            return None
+        if not self.request.query_params.get('fields') and self.get_serializer_class().default_fields is None:
+            return None
+        return set(self.get_serializer().fields)
+
     def get_queryset(self):
         queryset = Product.objects.all()
+        if self.action in self.planned_actions:
+            queryset = queryset.for_catalog(fields=self.get_rendered_fields())
         category_id = self.request.query_params.get('category')
         search_query = self.request.query_params.get('search')
-        min_price = self.request.query_params.get('min_price')
-        max_price = self.request.query_params.get('max_price')
+        min_price = decimal_param(self.request.query_params, 'min_price')
+        max_price = decimal_param(self.request.query_params, 'max_price')
         on_sale = self.request.query_params.get('on_sale')
+        min_rating = decimal_param(self.request.query_params, 'min_rating')
         slug = self.request.query_params.get('slug')
 
         if slug:
-            logger.info(f"Filtering by slug: {slug}")
+            logger.debug("products.filter_by_slug", slug=slug)
             queryset = queryset.filter(slug=slug)
             count = queryset.count()
             if count == 0:
-                logger.warning(f"No product found for slug: {slug}")
+                logger.warning("products.slug_not_found", slug=slug)
                 raise Http404(f"No product found for slug: {slug}")
             if count > 1:
-                logger.warning(f"Multiple products found for slug: {slug}, count: {count}")
-                slugs = list(queryset.values_list('slug', flat=True))
-                logger.warning(f"Found slugs: {slugs}")
+                logger.warning(
+                    "products.slug_not_unique", slug=slug, count=count,
+                    slugs=lazy(lambda: list(queryset.values_list('slug', flat=True))),
+                )
 
         if category_id:
-            try:
-                category = Category.objects.get(id=category_id)
-                category_ids = self.get_category_and_subcategories(category)
-                queryset = queryset.filter(category__id__in=category_ids)
-            except Category.DoesNotExist:
-                logger.warning(f"Category {category_id} not found")
-                return Product.objects.none()
+            # One indexed join through the closure table covers every subcategory.
+            queryset = queryset.filter(category__ancestor_links__ancestor_id=category_id)
 
         if search_query:
-            queryset = queryset.filter(
-                Q(name__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(category__name__icontains=search_query)
-            )
+            queryset = get_search_backend().search(queryset, search_query)
 
-        if min_price:
+        if min_price is not None:
             queryset = queryset.filter(price__gte=min_price)
 
-        if max_price:
+        if max_price is not None:
             queryset = queryset.filter(price__lte=max_price)
 
         if on_sale and on_sale.lower() == 'true':
             queryset = queryset.filter(discount__gt=0)
 
-        logger.debug(f"Queryset for slug {slug}: {queryset.values('id', 'slug', 'name')}")
-        return queryset
+        if min_rating is not None:
+            queryset = queryset.filter(rating_avg__gte=min_rating)
 
-    def get_category_and_subcategories(self, category):
-        ids = [category.id]
-        for subcat in category.subcategories.all():
-            ids += self.get_category_and_subcategories(subcat)
-        return ids
+        return queryset
 
     # Keep this for explicit ID-based lookup (via /api/products/products/id/100/)
     @action(detail=True, methods=['get'], url_path='id/(?P<id>[^/.]+)', url_name='by-id')
-    def retrieve_by_id(self, request, id=None):
+    def retrieve_by_id(self, request, id=None, **kwargs):
+        return self.conditional_response(
+            request, lambda: self.serve_cached(request, lambda: self._retrieve_by_id(id))
+        )
+
+    def _retrieve_by_id(self, id):
         try:
-            product = Product.objects.get(id=id)
+            product = self.get_queryset().get(id=id)
             serializer = self.get_serializer(product)
-            logger.info(f"Retrieved product by ID: {id}")
+            logger.debug("products.retrieved_by_id", product_id=id)
             return Response(serializer.data)
         except Product.DoesNotExist:
-            logger.warning(f"No product found for ID: {id}")
+            logger.warning("products.id_not_found", product_id=id)
             raise Http404(f"No product found for ID: {id}")
 
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """Facet counts for the products matching the current filters."""
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(get_facets(queryset, request.query_params))
+
+    def perform_destroy(self, instance):
+        archive_products(Product.objects.filter(pk=instance.pk))
+
     @action(detail=True, methods=['post'])
     def reduce_stock(self, request, pk=None):
         product = self.get_object()
@@ -148,6 +300,37 @@ class ProductVariantViewSet(viewsets.ModelViewSet):
     queryset = ProductVariant.objects.all()
     serializer_class = ProductVariantSerializer
 
+    @action(detail=False, methods=['patch'], url_path='bulk', url_name='bulk')
+    def bulk(self, request):
+        """
+        Patch many variants by SKU in one request: [{sku, price?, stock?, stock_delta?}].
+        Each SKU gets its own result, so one bad line does not fail the batch.
+        """
+        if not isinstance(request.data, list):
+            return Response({"detail": "Invalid format. Expected a list of changes."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > BULK_PATCH_MAX_ITEMS:
+            return Response(
+                {"detail": f"At most {BULK_PATCH_MAX_ITEMS} changes per request."}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results, changes, skus = [], [], set()
+        for item in request.data:
+            serializer = VariantPatchSerializer(data=item)
+            if not serializer.is_valid():
+                sku = item.get('sku') if isinstance(item, dict) else None
+                results.append({"sku": sku, "status": "invalid", "errors": serializer.errors})
+            elif serializer.validated_data['sku'] in skus:
+                results.append({"sku": serializer.validated_data['sku'], "status": "invalid", "errors": ["Duplicate SKU."]})
+            else:
+                skus.add(serializer.validated_data['sku'])
+                changes.append(serializer.validated_data)
+                results.append(None)
+
+        updated, applied = patch_variants(changes) if changes else (0, [])
+        applied = iter(applied)
+        results = [result or next(applied) for result in results]
+        return Response({"updated": updated, "results": results}, status=status.HTTP_200_OK)
+
 class VariantAttributeViewSet(viewsets.ModelViewSet):
     queryset = VariantAttribute.objects.all()
     serializer_class = VariantAttributeSerializer
@@ -161,30 +344,76 @@ class CartViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated, IsCustomerOnly]
 
     def get_queryset(self):
-        logger.info(f"GET /cart/ - User: {self.request.user}, Role: {self.request.user.role}, Token: {self.request.headers.get('Authorization')}")
         if self.request.user.role != 'customer':
-            logger.warning(f"Permission denied for {self.request.user}")
+            logger.warning("cart.permission_denied", user_id=self.request.user.id, role=self.request.user.role)
             raise PermissionDenied("Only customers can access the cart.")
-        logger.info("Returning cart items")
+        logger.debug("cart.listed", user_id=self.request.user.id)
         return CartItem.objects.filter(user=self.request.user)
 
     def perform_create(self, serializer):
         product = serializer.validated_data['product']
         variant = serializer.validated_data.get('variant')
         quantity = serializer.validated_data.get('quantity', 1)
-        existing_item = CartItem.objects.filter(
-            user=self.request.user, product=product, variant=variant
-        ).first()
-        if existing_item:
-            existing_item.quantity += quantity
-            existing_item.save()
-            serializer.instance = existing_item
-        else:
-            serializer.save(user=self.request.user)
+        # Upsert, so a repeated add (a double click) increments the line instead of colliding with it.
+        try:
+            add_lines(self.request.user, {(product.id, variant.id if variant else None): quantity})
+        except InvalidCartLines as e:
+            raise ValidationError({"detail": e.message, "items": e.items})
+        serializer.instance = CartItem.objects.get(user=self.request.user, product=product, variant=variant)
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        Add many lines in one request: [{product_id, variant_id?, quantity?}].
+        Quantities add to what the cart already holds; nothing is added if
+        any line is invalid. Responds with the cart summary.
+        """
+        serializer = CartLineSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        lines = defaultdict(int)
+        for line in serializer.validated_data:
+            lines[(line['product_id'], line.get('variant_id'))] += line['quantity']
+        try:
+            add_lines(request.user, lines)
+        except InvalidCartLines as e:
+            return Response({"detail": e.message, "items": e.items}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.summary_data(), status=status.HTTP_200_OK)
 
     def perform_update(self, serializer):
         serializer.save()
 
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """
+        The cart drawer's read model: lines with a product summary, line
+        totals, stock warnings and the subtotal, in three queries whatever
+        the size of the cart.
+        """
+        return Response(self.summary_data(), status=status.HTTP_200_OK)
+
+    def summary_data(self):
+        items = list(self.get_queryset().with_totals())
+        lines = CartSummaryItemSerializer(items, many=True, context={'request': self.request}).data
+        return {
+            "items": lines,
+            "item_count": sum(item.quantity for item in items),
+            "subtotal": str((items[0].subtotal if items else Decimal(0)).quantize(Decimal('0.01'))),
+            "has_stock_warnings": any(line['stock_warning'] for line in lines),
+        }
+
+    @action(detail=False, methods=['post'])
+    def reserve(self, request):
+        """Hold the stock of every cart line until checkout, for STOCK_RESERVATION_TTL seconds."""
+        cart_items = self.get_queryset()
+        try:
+            reservations = hold(request.user, cart_lines(cart_items))
+        except InsufficientStock as e:
+            return Response({"detail": e.message, "items": e.items}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "items": len(reservations),
+            "expires_at": reservations[0].expires_at if reservations else None,
+        }, status=status.HTTP_200_OK)
+
     def perform_destroy(self, instance):
         instance.delete()
 
@@ -199,11 +428,17 @@ class BulkDeleteProductsView(APIView):
         if not isinstance(ids, list):
             return Response({"detail": "Invalid format. 'ids' should be a list."}, status=400)
 
-        deleted, _ = Product.objects.filter(id__in=ids).delete()
-        return Response({"deleted": deleted}, status=status.HTTP_200_OK)
+        # Archived at once; `manage.py purge_archived_products` deletes them later.
+        archived = archive_products(Product.objects.filter(id__in=ids))
+        return Response({"deleted": archived}, status=status.HTTP_200_OK)
 
 class BulkProductUploadView(APIView):
+    """
+    Store the upload and queue it for the run_import_jobs worker; poll
+    import-jobs/<id>/ for progress and per-row errors. Staff only.
+    """
     parser_classes = [MultiPartParser]
+    permission_classes = [IsAdminUser]
 
     def post(self, request, *args, **kwargs):
         file = request.FILES.get('file')
@@ -212,103 +447,120 @@ class BulkProductUploadView(APIView):
             return Response({"error": "No file uploaded"}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            if file.name.endswith('.csv'):
-                df = pd.read_csv(file)
-            elif file.name.endswith('.xlsx'):
-                df = pd.read_excel(file)
-            else:
-                return Response({"error": "Only CSV or Excel (.xlsx) files are supported"}, status=status.HTTP_400_BAD_REQUEST)
-        except Exception as e:
-            return Response({"error": f"Failed to read file: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+            check_file_type(file.name)
+        except UnsupportedFileType as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        job = ImportJob.objects.create(
+            file=file,
+            original_name=file.name,
+            created_by=request.user,
+        )
+        return Response({
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": request.build_absolute_uri(reverse('import-job-detail', args=[job.id])),
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class GuestCartView(APIView):
+    """
+    The cart of an anonymous visitor, kept in a signed cookie (or the
+    X-Guest-Cart header) instead of the database. GET reads it, POST adds
+    [{product_id, variant_id?, quantity?}], PUT replaces it and DELETE
+    empties it. Logging in merges it into the customer's cart.
+    """
+    permission_classes = [AllowAny]
 
-        success_count = 0
-        error_list = []
+    def cart_response(self, lines, status_code=status.HTTP_200_OK):
+        items = guest_cart.validate(lines)
+        response = Response(status=status_code)
+        token = guest_cart.write(response, {
+            (item['product']['id'], item['variant']['id'] if item['variant'] else None): item['quantity']
+            for item in items
+        })
+        response.data = {
+            "items": items,
+            "item_count": sum(item['quantity'] for item in items),
+            "subtotal": str(sum((Decimal(item['line_total']) for item in items), Decimal('0.00'))),
+            "token": token,
+        }
+        return response
+
+    def posted_lines(self, request):
+        serializer = CartLineSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        lines = defaultdict(int)
+        for line in serializer.validated_data:
+            lines[(line['product_id'], line.get('variant_id'))] += line['quantity']
+        return lines
+
+    def get(self, request):
+        return self.cart_response(guest_cart.read(request))
+
+    def post(self, request):
+        lines = defaultdict(int, guest_cart.read(request))
+        for key, quantity in self.posted_lines(request).items():
+            lines[key] += quantity
+        if len(lines) > guest_cart.MAX_LINES:
+            return Response(
+                {"detail": f"A guest cart holds at most {guest_cart.MAX_LINES} lines."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return self.cart_response(lines)
 
-        with transaction.atomic():
-            for idx, row in df.iterrows():
-                try:
-                    category_name = str(row.get('category')).strip()
-                    if not category_name:
-                        raise ValueError("Category name is missing")
-
-                    category, _ = Category.objects.get_or_create(name=category_name)
-                    has_variants = str(row.get('has_variants')).strip().lower() == 'true'
-
-                    product_data = {
-                        'name': str(row.get('name')).strip(),
-                        'description': str(row.get('description', '')).strip(),
-                        'price': None if has_variants else row.get('price'),
-                        'stock': None if has_variants else int(row.get('stock')) if not pd.isna(row.get('stock')) else None,
-                        'discount': float(row.get('discount')) if not pd.isna(row.get('discount')) else 0,
-                        'unit': row.get('unit', 'PCS'),
-                        'has_variants': has_variants,
-                        'category': category,
-                    }
-
-                    product = Product.objects.create(**product_data)
-
-                    ProductImage.objects.create(
-                        product=product,
-                        image='product_images/no-image.jpg',
-                        is_main=True,
-                        alt_text=product.name
-                    )
-
-                    if has_variants:
-                        variants_json = row.get('variants')
-                        default_variant = None
-                        min_price = float('inf')
-
-                        if variants_json:
-                            try:
-                                variants_data = json.loads(variants_json)
-                                for variant_data in variants_data:
-                                    attributes = variant_data.get('attributes', [])
-                                    stock = variant_data.get('stock')
-                                    price = float(variant_data.get('price'))
-
-                                    variant = ProductVariant.objects.create(
-                                        product=product,
-                                        stock=stock,
-                                        price=price
-                                    )
-
-                                    attribute_objs = []
-                                    for attr_value_str in attributes:
-                                        attr_name, attr_value = attr_value_str.split(':', 1)
-                                        attr_name = attr_name.strip()
-                                        attr_value = attr_value.strip()
-
-                                        attribute_obj, _ = VariantAttribute.objects.get_or_create(name=attr_name)
-                                        attr_obj, _ = VariantAttributeValue.objects.get_or_create(
-                                            attribute=attribute_obj,
-                                            value=attr_value
-                                        )
-                                        attribute_objs.append(attr_obj)
-
-                                    variant.attributes.set(attribute_objs)
-
-                                    if price < min_price:
-                                        min_price = price
-                                        default_variant = variant
-
-                                if default_variant:
-                                    product.default_variant = default_variant
-                                    product.price = default_variant.price
-                                    product.save(update_fields=["default_variant", "price"])
-
-                            except json.JSONDecodeError:
-                                raise ValueError(f"Invalid JSON format in 'variants' field (row {idx+2})")
-
-                    success_count += 1
-
-                except Exception as e:
-                    error_list.append({
-                        "row_number": idx + 2,
-                        "error": str(e)
-                    })
+    def put(self, request):
+        lines = self.posted_lines(request)
+        if len(lines) > guest_cart.MAX_LINES:
+            return Response(
+                {"detail": f"A guest cart holds at most {guest_cart.MAX_LINES} lines."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return self.cart_response(lines)
 
-        return Response({
-            "successfully_created": success_count,
-            "errors": error_list
-        }, status=status.HTTP_201_CREATED)
\ No newline at end of file
+    def delete(self, request):
+        response = Response(status=status.HTTP_204_NO_CONTENT)
+        guest_cart.clear(response)
+        return response
+
+
+class ProductExportView(APIView):
+    """
+    Stream the catalog as CSV (default) or XLSX (?file_type=xlsx) in the
+    columns bulk-upload/ reads, so an export can be edited and re-imported.
+    Staff only.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        file_type = request.query_params.get('file_type', 'csv')
+        if file_type not in FILE_TYPES:
+            return Response({"error": "Only CSV or Excel (.xlsx) files are supported"}, status=status.HTTP_400_BAD_REQUEST)
+
+        logger.info("catalog.export_started", file_type=file_type)
+        response = StreamingHttpResponse(export_stream(file_type), content_type=FILE_TYPES[file_type])
+        response['Content-Disposition'] = f'attachment; filename="products.{file_type}"'
+        return response
+
+
+class ImportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = ImportJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        user = self.request.user
+        if user.is_staff or user.role == 'admin':
+            return ImportJob.objects.all()
+        return ImportJob.objects.filter(created_by=user)
+
+
+@require_GET
+def product_image_rendition(request, width, fmt, name):
+    """Serve a rendition from storage, generating it on the first request."""
+    try:
+        path = get_rendition(name, width, fmt)
+    except (InvalidRendition, OSError):
+        # OSError covers a missing original and files Pillow cannot decode.
+        raise Http404("No such rendition")
+    response = FileResponse(rendition_storage().open(path, 'rb'), content_type=FORMATS[fmt][2])
+    # The path changes whenever the original is replaced.
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
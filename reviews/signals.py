@@ -0,0 +1,68 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from products.models import Product
+from products.signals import invalidate_product
+from .models import Review
+
+
+def clamp_rating(rating):
+    return min(max(int(rating), 1), 5)
+
+
+def apply_rating_change(product_id, added=None, removed=None):
+    """
+    Incrementally update a product's stored rating aggregates: one UPDATE for
+    the counters and one to derive rating_avg from the new histogram.
+    """
+    updates = {}
+    count_delta = 0
+    if added is not None:
+        field = Product.RATING_HISTOGRAM_FIELDS[clamp_rating(added)]
+        updates[field] = F(field) + 1
+        count_delta += 1
+    if removed is not None:
+        field = Product.RATING_HISTOGRAM_FIELDS[clamp_rating(removed)]
+        updates[field] = updates.get(field, F(field)) - 1
+        count_delta -= 1
+    if not updates:
+        return
+
+    products = Product.objects.filter(pk=product_id)
+    with transaction.atomic():
+        products.update(
+            rating_count=F('rating_count') + count_delta, updated_at=timezone.now(), **updates
+        )
+        products.refresh_rating_avg()
+    invalidate_product(product_id)
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, **kwargs):
+    instance._previous = None
+    if instance.pk:
+        instance._previous = (
+            Review.objects.filter(pk=instance.pk).values_list('product_id', 'rating').first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def update_product_rating_on_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if created or previous is None:
+        apply_rating_change(instance.product_id, added=instance.rating)
+        return
+
+    previous_product_id, previous_rating = previous
+    if previous_product_id != instance.product_id:
+        apply_rating_change(previous_product_id, removed=previous_rating)
+        apply_rating_change(instance.product_id, added=instance.rating)
+    elif clamp_rating(previous_rating) != clamp_rating(instance.rating):
+        apply_rating_change(instance.product_id, added=instance.rating, removed=previous_rating)
+
+
+@receiver(post_delete, sender=Review)
+def update_product_rating_on_delete(sender, instance, **kwargs):
+    apply_rating_change(instance.product_id, removed=instance.rating)
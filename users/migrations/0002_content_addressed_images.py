@@ -0,0 +1,19 @@
+# Generated by Django 5.0 on 2026-10-18 03:31
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='profile_picture',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.content_addressed_storage, upload_to='profile_pictures/'),
+        ),
+    ]
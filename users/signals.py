@@ -0,0 +1,4 @@
+from core.storage import track_media
+from .models import CustomUser
+
+track_media(CustomUser, 'profile_picture')